@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5 import QtWidgets, QtCore, QtGui
 
 from pdf_split import PDFSplitterUI
@@ -91,6 +92,8 @@ class HomePage(QtWidgets.QWidget):
             "python-vlc",
             "pillow",
             "pikepdf",
+            "watchdog",
+            "numpy",
             "qbittorrent-api",
             "pptxtopdf",
             "comtypes"
@@ -953,6 +956,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QtWidgets.QApplication(sys.argv)
     win = MainWindow()
     win.show()
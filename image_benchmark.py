@@ -0,0 +1,577 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from PIL import Image
+from PIL import ImageDraw
+from PIL import ImageChops
+from PIL import ImageSequence
+from PIL import ImageStat
+from PIL import ImageOps
+import io
+import math
+import zlib
+import struct
+import platform
+import PIL
+from image_core import (crop_box, draft_for_target, transform_image, compress_image, convert_image,
+                        exif_orientation, metadata_args, ImageBatchEngine)
+from image_tiles import open_unbounded
+
+# Benchmarks for the image tools. Each case runs in a fresh interpreter so
+# its peak RSS is not polluted by the cases that ran before it.
+
+def peak_rss_mb():
+    try:
+        # VmHWM is per address space; ru_maxrss on Linux also counts the parent we were forked from
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reports bytes
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)  # Windows only
+    except (ImportError, AttributeError):
+        return None
+
+def make_photo(path, size, seed=0):
+    """Deterministic photo-like test image (smooth gradients plus fractal detail)."""
+    w, h = size
+    small = (max(1, w // 4), max(1, h // 4))
+    x = -2.0 + (seed % 7) * 0.05
+    detail = Image.effect_mandelbrot(small, (x, -1.2, x + 3.0, 1.2), 100).resize(size, Image.BICUBIC)
+    r = Image.linear_gradient("L").resize(size)
+    b = Image.radial_gradient("L").resize(size)
+    Image.merge("RGB", (r, detail, b)).save(path, quality=92)
+
+def make_animation(path, frames=300, size=(480, 360)):
+    """Deterministic animated GIF: a ball bouncing over a static gradient, with some repeated frames."""
+    w, h = size
+    bg = Image.merge("RGB", (Image.linear_gradient("L").resize(size), Image.new("L", size, 90),
+                             Image.radial_gradient("L").resize(size)))
+    out = []
+    for i in range(frames):
+        frame = bg.copy()
+        t = (i // 2) % 60  # every frame is shown twice, like a 12 fps export in a 24 fps timeline
+        x = int((w - 60) * t / 59)
+        y = int((h - 60) * abs(30 - t) / 30)
+        ImageDraw.Draw(frame).ellipse((x, y, x + 60, y + 60), fill=(240, 200, 40))
+        out.append(frame.quantize(256))
+    out[0].save(path, save_all=True, append_images=out[1:], duration=40, loop=0)
+
+def make_colour_animation(path, size=(64, 64)):
+    """Four flat frames, black, red, green and blue: every colour but black is missing from frame 0."""
+    frames = [Image.new("RGB", size, c) for c in ((0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255))]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=100, loop=0)
+
+# Largest mean-channel difference allowed between a source frame and its output frame
+ANIMATION_COLOUR_TOLERANCE = 6
+
+def frame_colours(path, size=None):
+    """Mean RGB of each distinct frame (consecutive repeats folded, as the tools fold them)."""
+    colours, prev = [], None
+    with Image.open(path) as img:
+        for frame in ImageSequence.Iterator(img):
+            frame = frame.convert("RGB")
+            if size:
+                frame = frame.resize(size, Image.BILINEAR)
+            data = frame.tobytes()
+            if data != prev:
+                colours.append(ImageStat.Stat(frame).mean)
+            prev = data
+    return colours
+
+def make_orientation_marker(path, fmt, orientation, size=(1600, 1000)):
+    """White image with a red block in its stored top-left corner, tagged with orientation."""
+    img = Image.new("RGB", size, "white")
+    img.paste((255, 0, 0), (0, 0, size[0] // 4, size[1] // 4))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    img.save(path, fmt, exif=exif.tobytes())
+
+def marker_corner(path):
+    """(portrait?, corner holding the red block) as a viewer would display the file."""
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    w, h = img.size
+    corners = {"top-left": (w // 10, h // 10), "top-right": (w - 1 - w // 10, h // 10),
+               "bottom-left": (w // 10, h - 1 - h // 10), "bottom-right": (w - 1 - w // 10, h - 1 - h // 10)}
+    red = [name for name, xy in corners.items() if img.getpixel(xy)[0] > 200 and img.getpixel(xy)[1] < 80]
+    return h > w, red
+
+# (output format, metadata policy, resize, memory cap MB) combinations the orientation check
+# converts through; the 1 MB cap sends TIFFs down the banded path and JPEGs (1.6 MB drafted) to a full decode
+ORIENTATION_CHECKS = (("PNG", "icc", None, 512), ("JPG", "keep", None, 512), ("JPG", "icc", (240, 240), 512),
+                      ("JPG", "icc", (240, 240), 1))
+
+def make_screenshot(path, size, seed=0):
+    """Deterministic UI-like PNG: flat panels, buttons and lines of text."""
+    w, h = size
+    img = Image.new("RGB", size, (246, 247, 249))
+    d = ImageDraw.Draw(img)
+    accent = ((seed * 47) % 200, 90 + (seed * 31) % 120, 220 - (seed * 13) % 100)
+    d.rectangle((0, 0, w, 48), fill=(40, 42, 54))
+    d.rectangle((0, 48, 220, h), fill=(230, 232, 236))
+    for i in range(8):
+        d.text((20, 70 + i * 36), f"Sidebar item {i + 1}", fill=(60, 60, 60))
+    for row, y in enumerate(range(80, h - 40, 22)):
+        d.text((250, y), f"Line {row} of document {seed}: the quick brown fox jumps over the lazy dog",
+               fill=(30, 30, 30))
+        if row % 9 == seed % 9:
+            d.rounded_rectangle((w - 220, y - 4, w - 40, y + 22), 6, fill=accent)
+    img.save(path, optimize=False)
+
+def make_alpha_png(path, size, seed=0):
+    """Deterministic RGBA PNG: soft-edged shapes over full transparency, like exported icons."""
+    w, h = size
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    d = ImageDraw.Draw(img)
+    for i in range(6):
+        x = (seed * 97 + i * 151) % (w - w // 4)
+        y = (seed * 53 + i * 89) % (h - h // 4)
+        fill = ((i * 40 + seed * 17) % 256, (i * 90) % 256, (200 - i * 30) % 256, 120 + i * 20)
+        d.ellipse((x, y, x + w // 4, y + h // 4), fill=fill)
+    glow = Image.radial_gradient("L").resize(size).point(lambda v: 255 - v)
+    img.putalpha(ImageChops.multiply(img.getchannel("A"), glow))
+    img.save(path)
+
+def make_huge_tiff(path, size, layout="strips", unit=256):
+    """Deterministic RGB TIFF written band by band, so generating it never needs the whole raster.
+
+    layout is "strips" (unit rows per strip) or "tiles" (unit x unit tiles), Deflate compressed.
+    """
+    w, h = size
+    pattern = Image.effect_mandelbrot((512, 512), (-2.0, -1.2, 1.0, 1.2), 100)
+    xgrad = Image.linear_gradient("L").rotate(90).resize((w, 1))
+    offsets, counts = [], []
+    with open(path, "wb") as f:
+        f.write(b"II*\x00\x00\x00\x00\x00")  # IFD offset is patched in at the end
+        for y0 in range(0, h, unit):
+            rows = unit if layout == "tiles" else min(unit, h - y0)
+            band_w = math.ceil(w / unit) * unit if layout == "tiles" else w
+            b = Image.new("L", (band_w, rows))
+            for x in range(0, band_w, 512):
+                b.paste(pattern, (x, -(y0 % 512)))
+                if y0 % 512 + rows > 512:
+                    b.paste(pattern, (x, 512 - y0 % 512))
+            r = xgrad.resize((band_w, rows))
+            g = Image.new("L", (band_w, rows), int(255 * y0 / h))
+            band = Image.merge("RGB", (r, g, b))
+            pieces = [band] if layout == "strips" else [band.crop((x, 0, x + unit, rows)) for x in range(0, band_w, unit)]
+            for piece in pieces:
+                data = zlib.compress(piece.tobytes(), 1)
+                offsets.append(f.tell())
+                counts.append(len(data))
+                f.write(data)
+        # SHORT=3, LONG=4
+        tags = [(256, 4, [w]), (257, 4, [h]), (258, 3, [8, 8, 8]), (259, 3, [8]), (262, 3, [2]), (277, 3, [3]),
+                (284, 3, [1])]
+        if layout == "tiles":
+            tags += [(322, 4, [unit]), (323, 4, [unit]), (324, 4, offsets), (325, 4, counts)]
+        else:
+            tags += [(273, 4, offsets), (278, 4, [unit]), (279, 4, counts)]
+        f.seek(0, os.SEEK_END)
+        extra = f.tell() + 2 + 12 * len(tags) + 4
+        entries, blobs = [], []
+        for tag, typ, values in tags:
+            blob = struct.pack("<%d%s" % (len(values), "H" if typ == 3 else "L"), *values)
+            if len(blob) <= 4:
+                entries.append(struct.pack("<HHL", tag, typ, len(values)) + blob.ljust(4, b"\x00"))
+            else:
+                entries.append(struct.pack("<HHLL", tag, typ, len(values), extra))
+                blobs.append(blob)
+                extra += len(blob)
+        ifd_offset = f.tell()
+        f.write(struct.pack("<H", len(tags)) + b"".join(entries) + struct.pack("<L", 0) + b"".join(blobs))
+        f.seek(4)
+        f.write(struct.pack("<L", ifd_offset))
+
+def child_resize(args):
+    # args: <mode> <path> <repeat> <crop w:h|none> <resize WxH|none>
+    mode, path, repeat, crop, resize = args
+    crop_ratio = None if crop == "none" else tuple(int(v) for v in crop.split(":"))
+    resize_tuple = None if resize == "none" else tuple(int(v) for v in resize.split("x"))
+    with Image.open(path) as probe:
+        megapixels = probe.size[0] * probe.size[1] / 1e6
+    start = time.perf_counter()
+    for _ in range(int(repeat)):
+        with Image.open(path) as img:
+            if mode == "fused":
+                transform_image(img, crop_ratio, resize_tuple, "JPEG")
+                continue
+            if mode == "draft":
+                draft_for_target(img, crop_ratio, resize_tuple)
+            if crop_ratio:
+                box = crop_box(img.size, crop_ratio)
+                if box:
+                    img = img.crop(box)
+            if resize_tuple:
+                img.thumbnail(resize_tuple, Image.LANCZOS)
+            # Unconditional RGBA round trip and white paste, as convert_images used to do for JPEG
+            img = img.convert("RGBA")
+            bg = Image.new("RGB", img.size, (255, 255, 255))
+            bg.paste(img, mask=img.split()[-1])
+    seconds = (time.perf_counter() - start) / int(repeat)
+    rss = peak_rss_mb()
+    return {
+        "case": f"resize-{mode}",
+        "megapixels": round(megapixels, 2),
+        "seconds": round(seconds, 4),
+        "ms_per_mp": round(seconds * 1000 / megapixels, 3),
+        "peak_rss_mb": rss and round(rss, 1),
+        "rss_mb_per_mp": rss and round(rss / megapixels, 2),
+    }
+
+def child_animation(args):
+    # args: <mode> <path> <outdir>
+    mode, path, outdir = args
+    start = time.perf_counter()
+    if mode == "first-frame":
+        # What both tools used to do: only frame 0 survives
+        with Image.open(path) as img:
+            img.save(os.path.join(outdir, "first.webp"), "WEBP", quality=80)
+        result = {"ok": True, "out": os.path.join(outdir, "first.webp")}
+    elif mode == "compress-gif":
+        result = compress_image(path, outdir, 80)
+    elif mode == "to-webp":
+        result = convert_image(path, outdir, "WEBP")
+    else:  # to-gif-320
+        result = convert_image(path, outdir, "GIF", (320, 320))
+    seconds = time.perf_counter() - start
+    if not result["ok"]:
+        raise SystemExit(result["error"])
+    with Image.open(result["out"]) as out:
+        frames = getattr(out, "n_frames", 1)
+        out_size = out.size
+    error = None
+    if mode != "first-frame":
+        # The output must keep every distinct frame, in its colours
+        want, got = frame_colours(path, out_size), frame_colours(result["out"])
+        if len(want) != len(got):
+            raise SystemExit(f"{mode}: {len(got)} frames written, {len(want)} expected")
+        error = max(abs(a - b) for w, g in zip(want, got) for a, b in zip(w, g))
+        if error > ANIMATION_COLOUR_TOLERANCE:
+            raise SystemExit(f"{mode}: frame colours off by {error:.1f}")
+    rss = peak_rss_mb()
+    return {
+        "case": f"animation-{mode}" + ("-colours" if os.path.basename(path) == "colours.gif" else ""),
+        "seconds": round(seconds, 3),
+        "in_bytes": os.path.getsize(path),
+        "out_bytes": os.path.getsize(result["out"]),
+        "out_frames": frames,
+        "max_colour_error": error and round(error, 1),
+        "peak_rss_mb": rss and round(rss, 1),
+    }
+
+def child_orientation(args):
+    # args: <mode ignore|apply> <metadata none|icc|keep> <path> <repeat> <crop w:h|none> <resize WxH|none>
+    mode, metadata, path, repeat, crop, resize = args
+    name = os.path.splitext(os.path.basename(path))[0]
+    crop_ratio = None if crop == "none" else tuple(int(v) for v in crop.split(":"))
+    resize_tuple = None if resize == "none" else tuple(int(v) for v in resize.split("x"))
+    # Best of repeat: the differences measured here are a few percent, well inside run-to-run noise
+    times = []
+    for _ in range(int(repeat)):
+        start = time.perf_counter()
+        with Image.open(path) as img:
+            # "ignore" + "none" is the convert path before orientation and metadata handling
+            save_args = {}
+            orientation = exif_orientation(img) if mode == "apply" else 1
+            # Same rule as convert_image: full-size outputs that keep EXIF keep the tag instead
+            upright = not (metadata == "keep" and not resize_tuple)
+            if metadata != "none":
+                save_args = metadata_args(img, "JPEG", metadata, upright)
+            out = transform_image(img, crop_ratio, resize_tuple, "JPEG", orientation, upright)
+            out.save(io.BytesIO(), "JPEG", quality=90, optimize=True, **save_args)
+        times.append(time.perf_counter() - start)
+    rss = peak_rss_mb()
+    return {
+        "case": f"orientation-{name}-{mode}-{metadata}",
+        "seconds": round(min(times), 4),
+        "out_size": out.size,
+        "peak_rss_mb": rss and round(rss, 1),
+    }
+
+def child_orientation_check(args):
+    # args: <workdir>
+    workdir, = args
+    failures, checked = [], 0
+    for src_fmt, ext in (("JPEG", "jpg"), ("TIFF", "tif")):
+        for orientation in range(1, 9):
+            path = os.path.join(workdir, f"marker-{orientation}.{ext}")
+            make_orientation_marker(path, src_fmt, orientation)
+            # Pillow's exif_transpose is the reference for how the source displays
+            want = marker_corner(path)
+            for out_format, metadata, resize_tuple, cap in ORIENTATION_CHECKS:
+                outdir = os.path.join(workdir, "oriented")
+                os.makedirs(outdir, exist_ok=True)
+                result = convert_image(path, outdir, out_format, resize_tuple, None, metadata, cap)
+                label = f"{src_fmt} orientation {orientation} -> {out_format}/{metadata}/{resize_tuple}/{cap} MB"
+                if not result["ok"]:
+                    failures.append(f"{label}: {result['error']}")
+                    continue
+                got = marker_corner(result["out"])
+                if got != want:
+                    failures.append(f"{label}: displays {got}, expected {want}")
+                os.remove(result["out"])
+                checked += 1
+            os.remove(path)
+    if failures:
+        raise SystemExit("\n".join(failures))
+    return {"case": "orientation-check", "checked": checked}
+
+def child_tiled(args):
+    # args: <path> <outdir> <memory cap MB> <resize WxH>
+    path, outdir, cap, resize = args
+    start = time.perf_counter()
+    result = convert_image(path, outdir, "JPG", tuple(int(v) for v in resize.split("x")), None, "icc", int(cap))
+    seconds = time.perf_counter() - start
+    if not result["ok"]:
+        raise SystemExit(result["error"])
+    with open_unbounded(path) as src:
+        megapixels = src.size[0] * src.size[1] / 1e6
+    with Image.open(result["out"]) as out:
+        size = out.size
+    rss = peak_rss_mb()
+    return {
+        "case": f"tiled-{os.path.splitext(os.path.basename(path))[0]}",
+        "megapixels": round(megapixels, 1),
+        "seconds": round(seconds, 2),
+        "mp_per_second": round(megapixels / seconds, 1),
+        "out_size": size,
+        "memory_cap_mb": int(cap),
+        "peak_rss_mb": rss and round(rss, 1),
+        "under_cap": rss is not None and rss <= int(cap),
+    }
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(0, math.ceil(len(values) * pct / 100) - 1)] if values else None
+
+def timed_job(func, *args):
+    # Runs in the pool worker, so the worker's own peak RSS can ride back on the result
+    result = func(*args)
+    result["worker_pid"] = os.getpid()
+    result["worker_rss_mb"] = peak_rss_mb()
+    return result
+
+def child_suite(args):
+    # args: <tool> <corpus folder> <workers> <outdir> <memory cap MB> <resize WxH>
+    tool, folder, workers, outdir, cap, resize = args
+    files = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    if tool == "compress":
+        jobs = ((compress_image, f, outdir, 60) for f in files)
+    else:
+        resize_tuple = tuple(int(v) for v in resize.split("x"))
+        jobs = ((convert_image, f, outdir, "WEBP", resize_tuple, None, "icc", int(cap)) for f in files)
+    engine = ImageBatchEngine(int(workers))
+    start = time.perf_counter()
+    results = list(engine.run(timed_job, jobs))
+    seconds = time.perf_counter() - start
+    latencies = sorted(r["seconds"] for r in results)
+    in_mb = sum(os.path.getsize(f) for f in files) / (1024 * 1024)
+    # Parent plus each worker's own peak: an upper bound, since the peaks need not coincide
+    peaks = {r["worker_pid"]: r["worker_rss_mb"] for r in results if r["worker_pid"] != os.getpid()}
+    rss = peak_rss_mb()
+    return {
+        "case": f"{tool}-{os.path.basename(folder)}-w{workers}",
+        "tool": tool,
+        "corpus": os.path.basename(folder),
+        "workers": int(workers),
+        "images": len(files),
+        "failed": sum(not r["ok"] for r in results),
+        "seconds": round(seconds, 3),
+        "images_per_s": round(len(files) / seconds, 2),
+        "mb_per_s": round(in_mb / seconds, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "peak_rss_mb": rss and round(rss + sum(p or 0 for p in peaks.values()), 1),
+    }
+
+CHILD_CASES = {"resize": child_resize, "animation": child_animation, "orientation": child_orientation,
+               "orientation-check": child_orientation_check, "tiled": child_tiled, "suite": child_suite}
+
+def run_child(name, args):
+    print(json.dumps(CHILD_CASES[name](args)))
+
+def spawn(name, *args):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, *map(str, args)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+def bench_resize(opts, workdir):
+    w = int((opts.megapixels * 1e6 * 3 / 2) ** 0.5)
+    path = os.path.join(workdir, "photo.jpg")
+    make_photo(path, (w, w * 2 // 3))
+    results = []
+    # "full" is the original path: full decode, crop, thumbnail, then flatten;
+    # "draft" adds reduced-scale decoding; "fused" is transform_image
+    for mode in ("full", "draft", "fused"):
+        results.append(spawn("resize", mode, path, opts.repeat, opts.crop, opts.resize))
+    return results
+
+def bench_animation(opts, workdir):
+    path = os.path.join(workdir, "anim.gif")
+    make_animation(path, opts.frames)
+    results = []
+    for mode in ("first-frame", "compress-gif", "to-webp", "to-gif-320"):
+        outdir = os.path.join(workdir, mode)
+        os.makedirs(outdir)
+        results.append(spawn("animation", mode, path, outdir))
+    # Colours that only appear after the first frame must survive the shared GIF palette
+    colours = os.path.join(workdir, "colours.gif")
+    make_colour_animation(colours)
+    for mode in ("compress-gif", "to-webp", "to-gif-320"):
+        outdir = os.path.join(workdir, f"{mode}-colours")
+        os.makedirs(outdir)
+        results.append(spawn("animation", mode, colours, outdir))
+    return results
+
+def bench_orientation(opts, workdir):
+    w = int((opts.megapixels * 1e6 * 3 / 2) ** 0.5)
+    upright = os.path.join(workdir, "upright.jpg")
+    make_photo(upright, (w, w * 2 // 3))
+    # Stored sideways with an orientation tag, the way phones write portrait shots
+    rotated = os.path.join(workdir, "rotated.jpg")
+    with Image.open(upright) as img:
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        img.transpose(Image.Transpose.ROTATE_90).save(rotated, quality=92, exif=exif)
+    # Baseline is the old path on an upright file: the same pixels to crop and scale, nothing to rotate
+    results = [spawn("orientation", "ignore", "none", upright, opts.repeat, opts.crop, opts.resize)]
+    for metadata in ("none", "icc", "keep"):
+        results.append(spawn("orientation", "apply", metadata, rotated, opts.repeat, opts.crop, opts.resize))
+    base = results[0]["seconds"]
+    for r in results[1:]:
+        r["overhead_pct"] = round((r["seconds"] - base) / base * 100, 1)
+    # Every orientation, from JPEG and TIFF sources, must display the way the source does
+    results.append(spawn("orientation-check", workdir))
+    return results
+
+def bench_tiled(opts, workdir):
+    w = int((opts.tiff_megapixels * 1e6) ** 0.5)
+    results = []
+    for layout in ("strips", "tiles"):
+        path = os.path.join(workdir, f"scan-{layout}.tif")
+        make_huge_tiff(path, (w, w), layout)
+        results.append(spawn("tiled", path, workdir, opts.memory_cap, opts.resize))
+        os.remove(path)
+    return results
+
+# Which corpora each tool runs on; the compressor has no banded path, so it skips the huge TIFF
+SUITE_TOOLS = {"compress": ("photos", "screenshots", "alpha", "gifs"),
+               "convert": ("photos", "screenshots", "alpha", "gifs", "tiff")}
+
+def make_corpus(kind, folder, opts):
+    """Generate one synthetic corpus; the same options always give byte-identical files."""
+    os.makedirs(folder)
+    n = opts.images
+    if kind == "photos":
+        w = int((opts.photo_megapixels * 1e6 * 3 / 2) ** 0.5)
+        for i in range(n):
+            make_photo(os.path.join(folder, f"photo-{i:03d}.jpg"), (w, w * 2 // 3), seed=i)
+    elif kind == "screenshots":
+        for i in range(n):
+            make_screenshot(os.path.join(folder, f"screen-{i:03d}.png"), (1920, 1080), seed=i)
+    elif kind == "alpha":
+        for i in range(n):
+            make_alpha_png(os.path.join(folder, f"alpha-{i:03d}.png"), (1024, 1024), seed=i)
+    elif kind == "gifs":
+        for i in range(max(1, n // 4)):
+            make_animation(os.path.join(folder, f"anim-{i:03d}.gif"), 60 + i * 20, (320, 240))
+    else:
+        w = int((opts.tiff_megapixels * 1e6) ** 0.5)
+        make_huge_tiff(os.path.join(folder, "scan-000.tif"), (w, w), "strips")
+
+def compare_suite(base, new):
+    """Lines comparing throughput and tail latency of two suite runs, case by case."""
+    before = {r["case"]: r for r in base["results"]}
+    lines = []
+    for r in new["results"]:
+        b = before.get(r["case"])
+        if b:
+            lines.append(f"{r['case']}: {b['images_per_s']} -> {r['images_per_s']} images/s "
+                         f"({(r['images_per_s'] / b['images_per_s'] - 1) * 100:+.1f}%), "
+                         f"p95 {b['p95_ms']} -> {r['p95_ms']} ms")
+    return lines
+
+def bench_suite(opts, workdir):
+    corpus = {}
+    for kind in SUITE_TOOLS["convert"]:
+        folder = os.path.join(workdir, kind)
+        make_corpus(kind, folder, opts)
+        names = sorted(os.listdir(folder))
+        corpus[kind] = {"files": len(names), "bytes": sum(os.path.getsize(os.path.join(folder, n)) for n in names)}
+    results = []
+    for tool, kinds in SUITE_TOOLS.items():
+        for kind in kinds:
+            for workers in opts.workers:
+                outdir = os.path.join(workdir, "out")
+                os.makedirs(outdir)
+                results.append(spawn("suite", tool, os.path.join(workdir, kind), workers, outdir,
+                                     opts.memory_cap, opts.resize))
+                for name in os.listdir(outdir):
+                    os.remove(os.path.join(outdir, name))
+                os.rmdir(outdir)
+    return {
+        "environment": {"python": platform.python_version(), "pillow": PIL.__version__,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "options": {"images": opts.images, "photo_megapixels": opts.photo_megapixels,
+                    "tiff_megapixels": opts.tiff_megapixels, "memory_cap_mb": opts.memory_cap,
+                    "resize": opts.resize, "workers": opts.workers},
+        "corpus": corpus,
+        "results": results,
+    }
+
+BENCHES = {"resize": bench_resize, "animation": bench_animation, "orientation": bench_orientation,
+           "tiled": bench_tiled, "suite": bench_suite}
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        return run_child(sys.argv[2], sys.argv[3:])
+    parser = argparse.ArgumentParser(description="Benchmark the Coke image tools.")
+    parser.add_argument("bench", choices=sorted(BENCHES))
+    parser.add_argument("--megapixels", type=float, default=24)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--crop", default="1:1", help="crop ratio like 16:9, or 'none'")
+    parser.add_argument("--resize", default="320x320", help="bounding box like 1920x1080, or 'none'")
+    parser.add_argument("--frames", type=int, default=300, help="frames in the synthetic GIF (animation)")
+    parser.add_argument("--tiff-megapixels", type=float, default=None,
+                        help="size of the synthetic scan (default 400 for tiled, 150 for suite)")
+    parser.add_argument("--memory-cap", type=int, default=512, help="memory cap in MB (tiled, suite)")
+    parser.add_argument("--images", type=int, default=12, help="images per corpus; a quarter as many GIFs (suite)")
+    parser.add_argument("--photo-megapixels", type=float, default=4, help="size of the corpus photos (suite)")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to run (suite)")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="suite results to compare against (suite)")
+    opts = parser.parse_args()
+    opts.workers = [int(v) for v in opts.workers.split(",")]
+    if opts.tiff_megapixels is None:
+        # 150 MP of 4-byte RGBX pixels is over the default cap, so the suite still takes the banded path
+        opts.tiff_megapixels = 150 if opts.bench == "suite" else 400
+    with tempfile.TemporaryDirectory() as workdir:
+        results = BENCHES[opts.bench](opts, workdir)
+    # Sorted keys keep two runs' files line-for-line diffable
+    text = json.dumps(results, indent=2, sort_keys=True)
+    print(text)
+    if opts.json:
+        with open(opts.json, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if opts.baseline:
+        with open(opts.baseline, encoding="utf-8") as f:
+            print("\n".join(compare_suite(json.load(f), results)), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
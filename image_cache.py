@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+
+# Persistent "skip if unchanged" manifest for the image tools. One manifest
+# lives in each output folder and maps a source file + settings to the
+# output it produced there.
+
+MANIFEST_NAME = ".coke_image_cache.json"
+# Bump when a tool's output for the same settings changes, so old entries are redone
+CACHE_VERSION = 1
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def settings_fingerprint(tool, settings):
+    data = json.dumps({"tool": tool, "version": CACHE_VERSION, "settings": settings}, sort_keys=True)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+class OutputCache:
+    def __init__(self, outdir, tool):
+        self.path = os.path.join(outdir, MANIFEST_NAME)
+        self.tool = tool
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _key(self, src):
+        return f"{self.tool}:{os.path.normcase(os.path.abspath(src))}"
+
+    def lookup(self, src, settings):
+        """Return the existing output path if src is unchanged since it was produced with these settings."""
+        entry = self.entries.get(self._key(src))
+        if entry and self._is_fresh(src, entry, settings_fingerprint(self.tool, settings)):
+            self.hits += 1
+            return entry["out"]
+        self.misses += 1
+        return None
+
+    def _is_fresh(self, src, entry, fingerprint):
+        if entry["settings"] != fingerprint:
+            return False
+        try:
+            st = os.stat(src)
+            out_st = os.stat(entry["out"])
+        except OSError:
+            return False
+        if st.st_size != entry["size"] or out_st.st_size != entry["out_size"]:
+            return False
+        if st.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        # Touched but maybe not modified (copied, re-synced): fall back to the content hash
+        if file_hash(src) != entry["hash"]:
+            return False
+        entry["mtime_ns"] = st.st_mtime_ns
+        self._dirty = True
+        return True
+
+    def record(self, src, settings, outpath):
+        st = os.stat(src)
+        self.entries[self._key(src)] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": file_hash(src),
+            "settings": settings_fingerprint(self.tool, settings),
+            "out": outpath,
+            "out_size": os.path.getsize(outpath),
+        }
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def stats_text(self):
+        return f"Cache: {self.hits} unchanged skipped, {self.misses} processed."
@@ -0,0 +1,192 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+
+# Headless batch runner for the image tools, e.g.
+#   python image_cli.py compress "photos/**/*.jpg" --recursive -o out --quality 70
+#   python image_cli.py convert shots -o out --format webp --resize 1280x720 --crop 16:9
+# Must not import PyQt5. Pillow is only imported once there is work to do.
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff", ".gif")
+
+def find_images(patterns, recursive=False):
+    """Expand globs and folders into a de-duplicated, ordered list of image files."""
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*")
+        for path in glob.iglob(pattern, recursive=recursive):
+            if path.lower().endswith(IMAGE_EXTS) and os.path.isfile(path):
+                found.setdefault(os.path.abspath(path), None)
+    return list(found)
+
+def _parse_pair(text, sep, example):
+    # argparse type: a bad value is a usage error, reported before any work starts
+    if not text or text.lower() == "none":
+        return None
+    parts = text.lower().split(sep)
+    try:
+        w, h = (int(p) for p in parts)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected two whole numbers like {example}, got {text!r}")
+    if w <= 0 or h <= 0:
+        raise argparse.ArgumentTypeError(f"both numbers must be positive, got {text!r}")
+    return w, h
+
+def parse_size(text):
+    return _parse_pair(text, "x", "1280x720")
+
+def parse_ratio(text):
+    return _parse_pair(text, ":", "16:9")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Compress or convert images without the GUI.")
+    sub = parser.add_subparsers(dest="tool", required=True)
+    for name in ("compress", "convert"):
+        p = sub.add_parser(name)
+        p.add_argument("inputs", nargs="+", help="files, folders or glob patterns")
+        p.add_argument("-o", "--output", required=True, help="output folder (created if missing)")
+        p.add_argument("-r", "--recursive", action="store_true", help="descend into folders and match ** in globs")
+        p.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+        p.add_argument("--no-cache", action="store_true", help="redo files even if unchanged since last run")
+        p.add_argument("--dedup", action="store_true",
+                       help="process one copy of identical images and write dedup_report.json to the output, "
+                            "which also lists similar-looking ones")
+        p.add_argument("--json", metavar="PATH", help="write a JSON summary to PATH ('-' for stdout)")
+        p.add_argument("-q", "--quiet", action="store_true", help="no per-file output")
+    compress = sub.choices["compress"]
+    compress.add_argument("--quality", type=int, default=55, help="JPEG/WEBP quality 20-95 (default 55)")
+    compress.add_argument("--target-kb", type=int, default=None, help="search quality to fit this size per file")
+    compress.add_argument("--ssim", type=float, default=None, metavar="FLOOR",
+                          help="search the lowest quality scoring at least this SSIM, e.g. 0.95 (needs NumPy)")
+    compress.add_argument("--no-png-optimize", action="store_true", help="plain re-save for PNGs (no lossless search)")
+    convert = sub.choices["convert"]
+    convert.add_argument("--format", choices=["original", "jpg", "png", "webp", "gif", "auto"], default="original",
+                         help="auto writes whichever of AVIF/WebP/JPEG/PNG comes out smallest per image")
+    convert.add_argument("--auto-all", action="store_true",
+                         help="with --format auto, try every format instead of those suited to the image type")
+    convert.add_argument("--resize", type=parse_size, default=None, help="bounding box like 1280x720")
+    convert.add_argument("--crop", type=parse_ratio, default=None, help="center crop ratio like 16:9")
+    convert.add_argument("--metadata", choices=["icc", "keep", "strip"], default="icc",
+                         help="keep only the color profile (default), keep EXIF too, or strip both")
+    convert.add_argument("--max-memory", type=int, default=512, metavar="MB",
+                         help="per-image decode budget; larger TIFF scans are processed in bands (default 512)")
+    return parser
+
+def run(opts):
+    start = time.perf_counter()
+    files = find_images(opts.inputs, opts.recursive)
+    summary = {"tool": opts.tool, "files": len(files), "succeeded": 0, "failed": 0, "skipped": 0,
+               "in_bytes": 0, "out_bytes": 0, "seconds": 0.0, "errors": []}
+    if files:
+        # Deferred so a run with nothing to do never pays for Pillow and the pool
+        from image_core import (ImageBatchEngine, compress_image, convert_image,
+                                compress_settings, convert_settings, add_auto_stats)
+        from image_cache import OutputCache
+        from image_dedup import find_duplicates, write_report
+        from image_journal import BatchJournal
+        os.makedirs(opts.output, exist_ok=True)
+        if opts.tool == "compress":
+            target_bytes = opts.target_kb * 1024 if opts.target_kb else None
+            func = compress_image
+            settings = compress_settings(opts.quality, target_bytes, not opts.no_png_optimize, opts.ssim)
+            extra = (opts.quality, target_bytes, not opts.no_png_optimize, opts.ssim)
+        else:
+            out_format = None if opts.format == "original" else opts.format.upper()
+            func = convert_image
+            settings = convert_settings(out_format, opts.resize, opts.crop, opts.metadata, not opts.auto_all)
+            extra = (out_format, opts.resize, opts.crop, opts.metadata, opts.max_memory, not opts.auto_all)
+        cache = None if opts.no_cache else OutputCache(opts.output, opts.tool)
+        engine = ImageBatchEngine(opts.workers)
+        if opts.dedup:
+            files, report = find_duplicates(files, engine)
+            write_report(report, opts.output)
+            summary["duplicates"] = report["duplicates"]
+            summary["duplicate_bytes"] = report["bytes_saved"]
+            summary["similar_groups"] = len(report["similar"])
+        # A run killed part way (Ctrl+C, crash) leaves its journal behind; the next run resumes from it
+        journal = BatchJournal(opts.output, opts.tool)
+        resumed = journal.start(settings, files)
+        summary["resumed"] = len(resumed)
+        todo = []
+        for f in files:
+            if f in resumed:
+                summary["succeeded"] += 1
+                if cache:
+                    cache.record(f, settings, resumed[f])
+            elif cache and cache.lookup(f, settings):
+                summary["skipped"] += 1
+            else:
+                todo.append(f)
+
+        def jobs():
+            for f in todo:
+                journal.running(f)
+                yield (f, opts.output) + extra
+
+        finished = False
+        try:
+            for result in engine.run(func, jobs()):
+                if result["ok"]:
+                    summary["succeeded"] += 1
+                    summary["in_bytes"] += result["in_bytes"]
+                    summary["out_bytes"] += result["out_bytes"]
+                    journal.done(result["src"], result["out"])
+                    if result.get("candidates"):
+                        add_auto_stats(summary.setdefault("auto", {}), result)
+                    if cache:
+                        cache.record(result["src"], settings, result["out"])
+                else:
+                    summary["failed"] += 1
+                    summary["errors"].append({"src": result["src"], "error": result["error"]})
+                    journal.failed(result["src"], result["error"])
+                if not opts.quiet:
+                    if result["ok"]:
+                        state = f"{result['in_bytes']} -> {result['out_bytes']} bytes"
+                        if result.get("candidates"):
+                            state += f" as {result['format']}"
+                    else:
+                        state = f"FAILED: {result['error']}"
+                    print(f"{result['src']}: {state} ({result['seconds']:.2f}s)", file=sys.stderr)
+            finished = True
+        finally:
+            journal.close(finished)
+            if cache:
+                cache.save()
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+def main(argv=None):
+    opts = build_parser().parse_args(argv)
+    try:
+        summary = run(opts)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.", file=sys.stderr)
+        return 130
+    if opts.json == "-":
+        print(json.dumps(summary, indent=2))
+    elif opts.json:
+        with open(opts.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if not opts.quiet:
+        print(f"{summary['succeeded']} succeeded, {summary['failed']} failed, "
+              f"{summary['skipped']} unchanged skipped in {summary['seconds']}s.", file=sys.stderr)
+        if summary.get("auto"):
+            from image_core import auto_stats_text
+            print(auto_stats_text(summary["auto"]), file=sys.stderr)
+        if summary.get("resumed"):
+            print(f"Resumed an interrupted run: {summary['resumed']} files were already done.", file=sys.stderr)
+        if opts.dedup:
+            print(f"{summary.get('duplicates', 0)} duplicates skipped "
+                  f"({summary.get('duplicate_bytes', 0) / (1024 * 1024):.1f} MB); "
+                  f"{summary.get('similar_groups', 0)} groups of similar images processed and listed in the report.",
+                  file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,7 +1,187 @@
 import sys
 import os
+import time
+import queue
+import threading
+import multiprocessing
 from PyQt5 import QtWidgets, QtCore
-from PIL import Image
+import image_core
+from image_core import ImageBatchEngine, compress_image, compress_settings, default_workers
+from image_cache import OutputCache
+from image_dedup import find_duplicates, duplicate_of, write_report, report_text
+from image_journal import BatchJournal
+from image_watch import FolderWatcher
+from image_list import ImageListView
+
+class CompressWorker(QtCore.QThread):
+    file_done_signal = QtCore.pyqtSignal(dict)
+    progress_signal = QtCore.pyqtSignal(int)
+    finished_signal = QtCore.pyqtSignal(int, int)
+
+    def __init__(self, files, outdir, quality, workers, target_bytes=None, use_cache=True, png_optimize=True,
+                 ssim_floor=None, dedup=False):
+        super().__init__()
+        self.files = files
+        self.dedup = dedup
+        self.dedup_report = None
+        self.outdir = outdir
+        self.quality = quality
+        self.target_bytes = target_bytes
+        self.png_optimize = png_optimize
+        self.ssim_floor = ssim_floor
+        self.saved_bytes = 0
+        self.engine = ImageBatchEngine(workers)
+        self.cache = OutputCache(outdir, "compress") if use_cache else None
+        self.probes = 0
+        self.encode_seconds = 0.0
+        self.resumed = 0
+        self.cancelled = False
+
+    def run(self):
+        ok, fail = 0, 0
+        settings = compress_settings(self.quality, self.target_bytes, self.png_optimize, self.ssim_floor)
+        files = self.files
+        if self.dedup:
+            files, self.dedup_report = find_duplicates(files, self.engine)
+            write_report(self.dedup_report, self.outdir)
+            for src, keep in duplicate_of(self.dedup_report).items():
+                self.file_done_signal.emit({"src": src, "out": None, "ok": True, "duplicate_of": keep})
+        skipped = len(self.files) - len(files)
+        # Picks up where an interrupted run with the same settings stopped
+        journal = BatchJournal(self.outdir, "compress")
+        resumed = journal.start(settings, files)
+        todo = []
+        for f in files:
+            if f in resumed:
+                ok += 1
+                self.resumed += 1
+                if self.cache:
+                    self.cache.record(f, settings, resumed[f])
+                self.file_done_signal.emit({"src": f, "out": resumed[f], "ok": True, "resumed": True})
+                continue
+            out = self.cache.lookup(f, settings) if self.cache else None
+            if out:
+                ok += 1
+                self.file_done_signal.emit({"src": f, "out": out, "ok": True, "cached": True})
+            else:
+                todo.append(f)
+
+        def jobs():
+            for f in todo:
+                if self.cancelled:
+                    return
+                journal.running(f)
+                yield f, self.outdir, self.quality, self.target_bytes, self.png_optimize, self.ssim_floor
+
+        for result in self.engine.run(compress_image, jobs()):
+            self.probes += result["probes"]
+            self.encode_seconds += result["encode_seconds"]
+            if result["ok"]:
+                ok += 1
+                journal.done(result["src"], result["out"])
+                self.saved_bytes += result["in_bytes"] - result["out_bytes"]
+                if self.cache:
+                    self.cache.record(result["src"], settings, result["out"])
+            else:
+                fail += 1
+                journal.failed(result["src"], result["error"])
+            self.file_done_signal.emit(result)
+            self.progress_signal.emit(int((ok + fail + skipped) / len(self.files) * 100))
+        journal.close(finished=not self.cancelled)
+        if self.cache:
+            self.cache.save()
+        self.progress_signal.emit(100)
+        self.finished_signal.emit(ok, fail)
+
+    def stop(self):
+        self.cancelled = True
+        self.engine.stop()
+
+class WatchWorker(QtCore.QThread):
+    file_done_signal = QtCore.pyqtSignal(dict)
+    status_signal = QtCore.pyqtSignal(str)
+    finished_signal = QtCore.pyqtSignal(int, int)
+
+    def __init__(self, folder, outdir, quality, workers, target_bytes=None, use_cache=True, png_optimize=True,
+                 ssim_floor=None):
+        super().__init__()
+        self.folder = folder
+        self.outdir = outdir
+        self.quality = quality
+        self.target_bytes = target_bytes
+        self.png_optimize = png_optimize
+        self.ssim_floor = ssim_floor
+        self.engine = ImageBatchEngine(workers)
+        self.cache = OutputCache(outdir, "compress") if use_cache else None
+        self.watcher = FolderWatcher(folder)
+        # Bounded hand-off to the pool: once it is full, new files wait in the watcher
+        self.jobs = queue.Queue(maxsize=self.engine.max_pending * 2)
+        self._lock = threading.Lock()
+        self._stop_requested = False
+        self.ok = 0
+        self.fail = 0
+
+    def run(self):
+        settings = compress_settings(self.quality, self.target_bytes, self.png_optimize, self.ssim_floor)
+        self.watcher.start()
+        feeder = threading.Thread(target=self._feed, args=(settings,), daemon=True)
+        feeder.start()
+        self._report()
+        for result in self.engine.run_queue(compress_image, self.jobs):
+            with self._lock:
+                if result["ok"]:
+                    self.ok += 1
+                    if self.cache:
+                        self.cache.record(result["src"], settings, result["out"])
+                        # Save now and then so a crash does not lose the whole session
+                        if self.ok % 25 == 0:
+                            self.cache.save()
+                else:
+                    self.fail += 1
+            self.file_done_signal.emit(result)
+            self._report()
+        self.watcher.stop()
+        feeder.join()
+        if self.cache:
+            self.cache.save()
+        self.finished_signal.emit(self.ok, self.fail)
+
+    def _feed(self, settings):
+        while not self._stop_requested:
+            for f in self.watcher.ready_files():
+                with self._lock:
+                    out = self.cache.lookup(f, settings) if self.cache else None
+                    if out:
+                        self.ok += 1
+                if out:
+                    self.file_done_signal.emit({"src": f, "out": out, "ok": True, "cached": True})
+                    continue
+                if not self._put((f, self.outdir, self.quality, self.target_bytes, self.png_optimize, self.ssim_floor)):
+                    return
+            time.sleep(0.5)
+        try:
+            self.jobs.put_nowait(None)
+        except queue.Full:
+            pass  # the engine was stopped as well and will not read it
+
+    def _put(self, job):
+        # Blocks while the pool is saturated; that is the backpressure on the watcher
+        while not self._stop_requested:
+            try:
+                self.jobs.put(job, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _report(self):
+        self.status_signal.emit(
+            f"Watching ({self.watcher.backend}): {self.ok} done, {self.fail} failed, "
+            f"{self.jobs.qsize()} queued.")
+
+    def stop(self):
+        self._stop_requested = True
+        self.engine.stop()
 
 class ImageCompressorUI(QtWidgets.QWidget):
     def __init__(self):
@@ -10,6 +190,7 @@ class ImageCompressorUI(QtWidgets.QWidget):
         self.resize(800, 600)
         self.image_files = []
         self.output_dir = None
+        self.worker = None
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.setContentsMargins(32, 32, 32, 32)
@@ -29,9 +210,9 @@ class ImageCompressorUI(QtWidgets.QWidget):
         layout.addWidget(title)
 
         # File list
-        self.file_list = QtWidgets.QListWidget()
+        self.file_list = ImageListView()
         self.file_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 background: #181a20;
                 color: #f8f8f2;
                 font-size: 18px;
@@ -39,7 +220,7 @@ class ImageCompressorUI(QtWidgets.QWidget):
                 border-radius: 10px;
                 padding: 8px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background: #bd93f9;
                 color: #23272f;
                 border-radius: 8px;
@@ -105,6 +286,55 @@ class ImageCompressorUI(QtWidgets.QWidget):
 
         layout.addLayout(quality_row)
 
+        # Target size row: search each file's quality to fit a size budget
+        target_row = QtWidgets.QHBoxLayout()
+        self.target_check = QtWidgets.QCheckBox("Target size per file (JPG/WEBP):")
+        self.target_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        self.target_check.toggled.connect(self.on_target_toggled)
+        target_row.addWidget(self.target_check)
+        self.target_spin = QtWidgets.QSpinBox()
+        self.target_spin.setRange(10, 50000)
+        self.target_spin.setValue(500)
+        self.target_spin.setSuffix(" KB")
+        self.target_spin.setEnabled(False)
+        self.target_spin.setStyleSheet("background: #282a36; color: #b4aaff; font-size: 17px; border-radius: 7px; padding: 2px 8px;")
+        target_row.addWidget(self.target_spin)
+        target_row.addStretch(1)
+        self.skip_check = QtWidgets.QCheckBox("Skip unchanged images")
+        self.skip_check.setChecked(True)
+        self.skip_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        target_row.addWidget(self.skip_check)
+        layout.addLayout(target_row)
+
+        # Perceptual row: search each file's quality for the smallest output that still looks the same
+        ssim_row = QtWidgets.QHBoxLayout()
+        self.ssim_check = QtWidgets.QCheckBox("Perceptual quality (JPG/WEBP), minimum SSIM:")
+        self.ssim_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        self.ssim_check.toggled.connect(self.on_ssim_toggled)
+        ssim_row.addWidget(self.ssim_check)
+        self.ssim_spin = QtWidgets.QDoubleSpinBox()
+        self.ssim_spin.setRange(0.900, 0.999)
+        self.ssim_spin.setDecimals(3)
+        self.ssim_spin.setSingleStep(0.005)
+        self.ssim_spin.setValue(0.950)
+        self.ssim_spin.setEnabled(False)
+        self.ssim_spin.setStyleSheet("background: #282a36; color: #b4aaff; font-size: 17px; border-radius: 7px; padding: 2px 8px;")
+        ssim_row.addWidget(self.ssim_spin)
+        ssim_row.addStretch(1)
+        layout.addLayout(ssim_row)
+        if image_core.np is None:
+            self.ssim_check.setEnabled(False)
+            self.ssim_check.setToolTip("Install NumPy to enable perceptual quality (pip install numpy).")
+
+        self.png_check = QtWidgets.QCheckBox("Optimize PNGs losslessly (palette + zlib search, slower)")
+        self.png_check.setChecked(True)
+        self.png_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        layout.addWidget(self.png_check)
+
+        self.dedup_check = QtWidgets.QCheckBox("Skip duplicate images (compress one copy, write dedup_report.json)")
+        self.dedup_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        layout.addWidget(self.dedup_check)
+
         # Connect slider snap
         self.quality_slider.valueChanged.connect(self.on_slider_quality_change)
         self.status = QtWidgets.QLabel("")
@@ -124,17 +354,60 @@ class ImageCompressorUI(QtWidgets.QWidget):
         output_row.addWidget(browse_btn)
         layout.addLayout(output_row)
 
+        # Worker count row
+        workers_row = QtWidgets.QHBoxLayout()
+        workers_label = QtWidgets.QLabel("Workers:")
+        workers_label.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        workers_row.addWidget(workers_label)
+        self.workers_spin = QtWidgets.QSpinBox()
+        self.workers_spin.setRange(1, max(64, default_workers()))
+        self.workers_spin.setValue(default_workers())
+        self.workers_spin.setStyleSheet("background: #282a36; color: #b4aaff; font-size: 17px; border-radius: 7px; padding: 2px 8px;")
+        workers_row.addWidget(self.workers_spin)
+        workers_row.addStretch(1)
+        layout.addLayout(workers_row)
+
+        # Hot folder row: compress new images as they are dropped into a folder
+        watch_row = QtWidgets.QHBoxLayout()
+        self.watch_path = QtWidgets.QLineEdit()
+        self.watch_path.setPlaceholderText("Hot folder to watch for new images")
+        self.watch_path.setStyleSheet("background: #181a20; color: #b4aaff; font-size: 17px; border-radius: 7px; border: 1.5px solid #bd93f9; padding-left: 10px;")
+        watch_row.addWidget(self.watch_path, 1)
+        watch_browse_btn = QtWidgets.QPushButton("Browse")
+        watch_browse_btn.setStyleSheet(button_style)
+        watch_browse_btn.setFixedHeight(32)
+        watch_browse_btn.setFixedWidth(100)
+        watch_browse_btn.clicked.connect(self.select_watch_folder)
+        watch_row.addWidget(watch_browse_btn)
+        self.watch_btn = QtWidgets.QPushButton("Start Watching")
+        self.watch_btn.setStyleSheet(button_style)
+        self.watch_btn.setFixedHeight(32)
+        self.watch_btn.setFixedWidth(170)
+        self.watch_btn.clicked.connect(self.toggle_watch)
+        watch_row.addWidget(self.watch_btn)
+        layout.addLayout(watch_row)
+
         # Compress button
-        compress_btn = QtWidgets.QPushButton("Compress Images")
-        compress_btn.setStyleSheet("""
+        self.compress_btn = QtWidgets.QPushButton("Compress Images")
+        self.compress_btn.setStyleSheet("""
             QPushButton {
                 font-size: 22px; background: #bd93f9; color: #23272f; font-weight: bold; border-radius: 8px;
             }
             QPushButton:hover { background: #b4aaff; }
         """)
-        compress_btn.setFixedHeight(48)
-        compress_btn.clicked.connect(self.compress_images)
-        layout.addWidget(compress_btn)
+        self.compress_btn.setFixedHeight(48)
+        self.compress_btn.clicked.connect(self.compress_images)
+        layout.addWidget(self.compress_btn)
+
+        self.progress = QtWidgets.QProgressBar(self)
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        self.progress.setFixedHeight(25)
+        self.progress.setStyleSheet("""
+            QProgressBar { background: #23272f; border: 1px solid #44475a; border-radius: 8px; color: #d6bfff; font-size: 15px; }
+            QProgressBar::chunk { background: #bd93f9; border-radius: 8px; }
+        """)
+        layout.addWidget(self.progress)
 
         layout.addWidget(self.status)
 
@@ -144,27 +417,21 @@ class ImageCompressorUI(QtWidgets.QWidget):
 
     def add_files(self):
         files, _ = QtWidgets.QFileDialog.getOpenFileNames(
-            self, "Select image files", "", "Images (*.png *.jpg *.jpeg *.webp *.bmp *.tiff *.gif)"
+            self, "Select image files", "", "Images (*.png *.jpg *.jpeg *.webp *.bmp *.tif *.tiff *.gif)"
         )
-        added_png = False
-        for f in files:
-            if f and f not in self.get_current_files():
-                self.file_list.addItem(f)
-                if f.lower().endswith('.png'):
-                    added_png = True
-        if added_png:
+        added = self.file_list.add_files(files)
+        if any(f.lower().endswith('.png') for f in added):
             self.png_warning.setText(
-                "Note: For smaller PNG files, convert to JPG/WebP or resize, both in the Image Converter."
+                "Note: PNGs are optimized losslessly. For much smaller files, convert to JPG/WebP in the Image Converter."
             )
         else:
             self.png_warning.setText("")
 
     def get_current_files(self):
-        return [self.file_list.item(i).text() for i in range(self.file_list.count())]
+        return self.file_list.files()
 
     def remove_selected(self):
-        for item in self.file_list.selectedItems():
-            self.file_list.takeItem(self.file_list.row(item))
+        self.file_list.remove_selected()
 
     def select_output_folder(self):
         path = QtWidgets.QFileDialog.getExistingDirectory(
@@ -173,6 +440,13 @@ class ImageCompressorUI(QtWidgets.QWidget):
         if path:
             self.output_path.setText(path)
 
+    def select_watch_folder(self):
+        path = QtWidgets.QFileDialog.getExistingDirectory(
+            self, "Select folder to watch", ""
+        )
+        if path:
+            self.watch_path.setText(path)
+
     def on_slider_quality_change(self, v):
         # Snap to nearest multiple of 5, within 20–95
         snapped = round((v - 20) / 5) * 5 + 20
@@ -183,7 +457,27 @@ class ImageCompressorUI(QtWidgets.QWidget):
         self.quality_value.setText(str(snapped))
         self.status.setText("")
 
+    def on_target_toggled(self, checked):
+        self.target_spin.setEnabled(checked)
+        if checked:
+            self.ssim_check.setChecked(False)
+        self.quality_slider.setEnabled(not (checked or self.ssim_check.isChecked()))
+        self.status.setText("")
+
+    def on_ssim_toggled(self, checked):
+        self.ssim_spin.setEnabled(checked)
+        if checked:
+            self.target_check.setChecked(False)
+        self.quality_slider.setEnabled(not (checked or self.target_check.isChecked()))
+        self.status.setText("")
+
     def compress_images(self):
+        if isinstance(self.worker, CompressWorker) and self.worker.isRunning():
+            # The button reads "Cancel" while a batch runs
+            self.worker.stop()
+            self.compress_btn.setEnabled(False)
+            self.status.setText("Cancelling, finishing images in progress...")
+            return
         files = self.get_current_files()
         outdir = self.output_path.text().strip()
         quality = int(self.quality_value.text())
@@ -193,28 +487,114 @@ class ImageCompressorUI(QtWidgets.QWidget):
         if not outdir or not os.path.isdir(outdir):
             self.status.setText("Please select a valid output folder.")
             return
-        ok, fail = 0, 0
-        for f in files:
-            try:
-                with Image.open(f) as img:
-                    ext = os.path.splitext(f)[1].lower()
-                    fname = os.path.basename(f)
-                    name, ext = os.path.splitext(fname)
-                    outname = f"{name}_compressed{ext}"
-                    outpath = os.path.join(outdir, outname)
-                    save_args = {}
-                    if ext in [".jpg", ".jpeg", ".webp"]:
-                        save_args["quality"] = quality
-                        save_args["optimize"] = True
-                    if ext in [".jpg", ".jpeg"]:
-                        save_args["progressive"] = True
-                    img.save(outpath, **save_args)
-                    ok += 1
-            except Exception as e:
-                fail += 1
-        self.status.setText(f"Compression finished. {ok} succeeded, {fail} failed.")
+        self.file_list.clear_status()
+        self.compress_btn.setText("Cancel")
+        self.watch_btn.setEnabled(False)
+        self.progress.setValue(0)
+        self.status.setText(f"Compressing {len(files)} images...")
+        target_bytes = self.target_spin.value() * 1024 if self.target_check.isChecked() else None
+        ssim_floor = self.ssim_spin.value() if self.ssim_check.isChecked() else None
+        self.worker = CompressWorker(files, outdir, quality, self.workers_spin.value(), target_bytes,
+                                     self.skip_check.isChecked(), self.png_check.isChecked(), ssim_floor,
+                                     self.dedup_check.isChecked())
+        self.worker.file_done_signal.connect(self.on_file_done)
+        self.worker.progress_signal.connect(self.progress.setValue)
+        self.worker.finished_signal.connect(self.on_compress_finished)
+        self.worker.start()
+
+    def on_file_done(self, result):
+        if self.file_list.add_files([result["src"]]):
+            # Hot folder files show up in the list as they are processed
+            self.file_list.scroll_to_file(result["src"])
+        if result.get("duplicate_of"):
+            self.file_list.set_status(result["src"], "#f1fa8c", f"Duplicate of {result['duplicate_of']}, skipped")
+        elif result.get("resumed"):
+            self.file_list.set_status(result["src"], "#8be9fd", f"Done in the interrupted run:\n{result['out']}")
+        elif result.get("cached"):
+            self.file_list.set_status(result["src"], "#8be9fd", f"Unchanged, kept existing output:\n{result['out']}")
+        elif result["ok"]:
+            if result["src"].lower().endswith(".png"):
+                how = f"{result['probes']} PNG candidates"
+            else:
+                how = f"quality {result['quality']}, {result['probes']} probes"
+                if result["ssim"] is not None:
+                    how += f", SSIM {result['ssim']:.3f}"
+            self.file_list.set_status(result["src"], "#50fa7b",
+                                      f"{result['in_bytes'] // 1024} KB -> {result['out_bytes'] // 1024} KB "
+                                      f"({how}) in {result['seconds']:.2f}s")
+        else:
+            self.file_list.set_status(result["src"], "#ff5555", result["error"])
+
+    def on_compress_finished(self, ok, fail):
+        self.compress_btn.setText("Compress Images")
+        self.compress_btn.setEnabled(True)
+        self.watch_btn.setEnabled(True)
+        if self.worker.cancelled:
+            msg = f"Compression cancelled. {ok} succeeded, {fail} failed; compress again to resume."
+        else:
+            msg = f"Compression finished. {ok} succeeded, {fail} failed."
+        if self.worker.resumed:
+            msg += f" Resumed: {self.worker.resumed} already done."
+        if self.worker.saved_bytes:
+            msg += f" Saved {self.worker.saved_bytes / (1024 * 1024):.1f} MB."
+        if self.worker.ssim_floor and ok + fail:
+            msg += (f"\nPerceptual search: {self.worker.probes / (ok + fail):.1f} probes/file, "
+                    f"{self.worker.encode_seconds:.1f}s total encode time.")
+        elif self.worker.target_bytes and ok + fail:
+            msg += (f"\nTarget size search: {self.worker.probes / (ok + fail):.1f} probes/file, "
+                    f"{self.worker.encode_seconds:.1f}s total encode time.")
+        if self.worker.cache:
+            msg += "\n" + self.worker.cache.stats_text()
+        if self.worker.dedup_report:
+            msg += "\n" + report_text(self.worker.dedup_report)
+        self.status.setText(msg)
+
+    def toggle_watch(self):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.watch_btn.setEnabled(False)
+            self.status.setText("Stopping, finishing images in progress...")
+            return
+        folder = self.watch_path.text().strip()
+        outdir = self.output_path.text().strip()
+        if not folder or not os.path.isdir(folder):
+            self.status.setText("Please select a valid folder to watch.")
+            return
+        if not outdir or not os.path.isdir(outdir):
+            self.status.setText("Please select a valid output folder.")
+            return
+        if os.path.normcase(os.path.abspath(folder)) == os.path.normcase(os.path.abspath(outdir)):
+            self.status.setText("The output folder must be different from the watched folder.")
+            return
+        target_bytes = self.target_spin.value() * 1024 if self.target_check.isChecked() else None
+        ssim_floor = self.ssim_spin.value() if self.ssim_check.isChecked() else None
+        self.worker = WatchWorker(folder, outdir, int(self.quality_value.text()), self.workers_spin.value(),
+                                  target_bytes, self.skip_check.isChecked(), self.png_check.isChecked(),
+                                  ssim_floor)
+        self.worker.file_done_signal.connect(self.on_file_done)
+        self.worker.status_signal.connect(self.status.setText)
+        self.worker.finished_signal.connect(self.on_watch_finished)
+        self.compress_btn.setEnabled(False)
+        self.watch_btn.setText("Stop Watching")
+        self.worker.start()
+
+    def on_watch_finished(self, ok, fail):
+        self.compress_btn.setEnabled(True)
+        self.watch_btn.setEnabled(True)
+        self.watch_btn.setText("Start Watching")
+        msg = f"Stopped watching. {ok} succeeded, {fail} failed."
+        if self.worker.cache:
+            msg += "\n" + self.worker.cache.stats_text()
+        self.status.setText(msg)
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QtWidgets.QApplication(sys.argv)
     win = ImageCompressorUI()
     win.show()
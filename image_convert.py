@@ -1,13 +1,107 @@
 import sys
 import os
 from PyQt5 import QtWidgets, QtCore
-from PIL import Image
+from image_cache import OutputCache
+from image_core import ImageBatchEngine, convert_image, convert_settings, add_auto_stats, auto_stats_text
+from image_tiles import DEFAULT_MEMORY_CAP_MB
+from image_dedup import find_duplicates, duplicate_of, write_report, report_text
+from image_journal import BatchJournal
+from image_list import ImageListView
+
+class ConvertWorker(QtCore.QThread):
+    file_done_signal = QtCore.pyqtSignal(dict)
+    progress_signal = QtCore.pyqtSignal(int)
+    finished_signal = QtCore.pyqtSignal(int, int)
+
+    def __init__(self, files, outdir, out_format, resize_tuple, crop_ratio, metadata, auto_by_kind=True,
+                 use_cache=True, dedup=False):
+        super().__init__()
+        self.files = files
+        self.outdir = outdir
+        self.out_format = out_format
+        self.resize_tuple = resize_tuple
+        self.crop_ratio = crop_ratio
+        self.metadata = metadata
+        self.auto_by_kind = auto_by_kind
+        self.dedup = dedup
+        self.dedup_report = None
+        self.engine = ImageBatchEngine()
+        self.cache = OutputCache(outdir, "convert") if use_cache else None
+        self.auto_stats = {}
+        self.error_msgs = []
+        self.resumed = 0
+        self.cancelled = False
+
+    def run(self):
+        ok, fail = 0, 0
+        settings = convert_settings(self.out_format, self.resize_tuple, self.crop_ratio, self.metadata,
+                                    self.auto_by_kind)
+        files = self.files
+        if self.dedup:
+            files, self.dedup_report = find_duplicates(files, self.engine)
+            write_report(self.dedup_report, self.outdir)
+            for src, keep in duplicate_of(self.dedup_report).items():
+                self.file_done_signal.emit({"src": src, "out": None, "ok": True, "duplicate_of": keep})
+        skipped = len(self.files) - len(files)
+        # Picks up where an interrupted or cancelled run with the same settings stopped
+        journal = BatchJournal(self.outdir, "convert")
+        resumed = journal.start(settings, files)
+        todo = []
+        for f in files:
+            if f in resumed:
+                ok += 1
+                self.resumed += 1
+                if self.cache:
+                    self.cache.record(f, settings, resumed[f])
+                self.file_done_signal.emit({"src": f, "out": resumed[f], "ok": True, "resumed": True})
+                continue
+            out = self.cache.lookup(f, settings) if self.cache else None
+            if out:
+                ok += 1
+                self.file_done_signal.emit({"src": f, "out": out, "ok": True, "cached": True})
+            else:
+                todo.append(f)
+
+        def jobs():
+            for f in todo:
+                if self.cancelled:
+                    return
+                journal.running(f)
+                yield (f, self.outdir, self.out_format, self.resize_tuple, self.crop_ratio, self.metadata,
+                       DEFAULT_MEMORY_CAP_MB, self.auto_by_kind)
+
+        for result in self.engine.run(convert_image, jobs()):
+            if result["ok"]:
+                ok += 1
+                add_auto_stats(self.auto_stats, result)
+                journal.done(result["src"], result["out"])
+                if self.cache:
+                    self.cache.record(result["src"], settings, result["out"])
+            else:
+                fail += 1
+                journal.failed(result["src"], result["error"])
+                msg = f"{os.path.basename(result['src'])}: {result['error']}"
+                if self.out_format == "JPG":
+                    msg += " (PNG/WEBP may have transparency (alpha channel) or unsupported mode for JPG.)"
+                self.error_msgs.append(msg)
+            self.file_done_signal.emit(result)
+            self.progress_signal.emit(int((ok + fail + skipped) / len(self.files) * 100))
+        journal.close(finished=not self.cancelled)
+        if self.cache:
+            self.cache.save()
+        self.progress_signal.emit(100)
+        self.finished_signal.emit(ok, fail)
+
+    def stop(self):
+        self.cancelled = True
+        self.engine.stop()
 
 class ImageConverterUI(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Coke Image Converter")
         self.resize(800, 600)
+        self.worker = None
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.setContentsMargins(32, 32, 32, 32)
@@ -27,9 +121,9 @@ class ImageConverterUI(QtWidgets.QWidget):
         layout.addWidget(title)
 
         # File list
-        self.file_list = QtWidgets.QListWidget()
+        self.file_list = ImageListView()
         self.file_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 background: #181a20;
                 color: #f8f8f2;
                 font-size: 18px;
@@ -37,7 +131,7 @@ class ImageConverterUI(QtWidgets.QWidget):
                 border-radius: 10px;
                 padding: 8px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background: #bd93f9;
                 color: #23272f;
                 border-radius: 8px;
@@ -74,7 +168,7 @@ class ImageConverterUI(QtWidgets.QWidget):
         convrow.addWidget(fmt_label)
         self.format_combo = QtWidgets.QComboBox()
         self.format_combo.addItems([
-            "Original format", "JPG", "PNG", "WEBP"
+            "Original format", "JPG", "PNG", "WEBP", "GIF", "Auto (smallest)"
         ])
         self.format_combo.setStyleSheet("""
             QComboBox { background: #282a36; color: #b4aaff; font-size: 18px; border-radius: 7px; padding: 4px 16px; }
@@ -125,6 +219,44 @@ class ImageConverterUI(QtWidgets.QWidget):
         convrow.addStretch(1)
         layout.addLayout(convrow)
 
+        # Metadata policy; EXIF rotation is always applied to the pixels
+        meta_row = QtWidgets.QHBoxLayout()
+        meta_label = QtWidgets.QLabel("Metadata:")
+        meta_label.setStyleSheet("font-size: 16px; color: #f8f8f2;")
+        meta_row.addWidget(meta_label)
+        self.meta_combo = QtWidgets.QComboBox()
+        self.meta_combo.addItems([
+            "Keep color profile only",
+            "Keep all (EXIF + color profile)",
+            "Strip all"
+        ])
+        self.meta_combo.setStyleSheet("""
+            QComboBox { background: #282a36; color: #b4aaff; font-size: 16px; border-radius: 7px; padding: 4px 10px; }
+            QComboBox QAbstractItemView { background: #282a36; color: #b4aaff; }
+        """)
+        meta_row.addWidget(self.meta_combo)
+        self.meta_combo.currentIndexChanged.connect(self.clear_status)
+        meta_row.addStretch(1)
+        layout.addLayout(meta_row)
+
+        self.skip_check = QtWidgets.QCheckBox("Skip unchanged images")
+        self.skip_check.setChecked(True)
+        self.skip_check.setStyleSheet("font-size: 16px; color: #f8f8f2;")
+        layout.addWidget(self.skip_check)
+
+        self.dedup_check = QtWidgets.QCheckBox("Skip duplicate images (convert one copy, write dedup_report.json)")
+        self.dedup_check.setStyleSheet("font-size: 16px; color: #f8f8f2;")
+        layout.addWidget(self.dedup_check)
+
+        # Racing every format is slow on large photos (lossless candidates especially)
+        self.auto_kind_check = QtWidgets.QCheckBox("Auto: only try formats suited to each image (photo or graphic)")
+        self.auto_kind_check.setChecked(True)
+        self.auto_kind_check.setEnabled(False)
+        self.auto_kind_check.setStyleSheet("font-size: 16px; color: #f8f8f2;")
+        layout.addWidget(self.auto_kind_check)
+        self.format_combo.currentTextChanged.connect(
+            lambda text: self.auto_kind_check.setEnabled(text.startswith("Auto")))
+
         # Output folder
         output_row = QtWidgets.QHBoxLayout()
         self.output_path = QtWidgets.QLineEdit()
@@ -140,16 +272,26 @@ class ImageConverterUI(QtWidgets.QWidget):
         layout.addLayout(output_row)
 
         # Convert button
-        convert_btn = QtWidgets.QPushButton("Convert Images")
-        convert_btn.setStyleSheet("""
+        self.convert_btn = QtWidgets.QPushButton("Convert Images")
+        self.convert_btn.setStyleSheet("""
             QPushButton {
                 font-size: 22px; background: #bd93f9; color: #23272f; font-weight: bold; border-radius: 8px;
             }
             QPushButton:hover { background: #b4aaff; }
         """)
-        convert_btn.setFixedHeight(48)
-        convert_btn.clicked.connect(self.convert_images)
-        layout.addWidget(convert_btn)
+        self.convert_btn.setFixedHeight(48)
+        self.convert_btn.clicked.connect(self.convert_images)
+        layout.addWidget(self.convert_btn)
+
+        self.progress = QtWidgets.QProgressBar(self)
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        self.progress.setFixedHeight(25)
+        self.progress.setStyleSheet("""
+            QProgressBar { background: #23272f; border: 1px solid #44475a; border-radius: 8px; color: #d6bfff; font-size: 15px; }
+            QProgressBar::chunk { background: #bd93f9; border-radius: 8px; }
+        """)
+        layout.addWidget(self.progress)
 
         # Status
         self.status = QtWidgets.QLabel("")
@@ -166,19 +308,16 @@ class ImageConverterUI(QtWidgets.QWidget):
     def add_files(self):
         self.clear_status()
         files, _ = QtWidgets.QFileDialog.getOpenFileNames(
-            self, "Select image files", "", "Images (*.png *.jpg *.jpeg *.webp *.bmp *.tiff *.gif)"
+            self, "Select image files", "", "Images (*.png *.jpg *.jpeg *.webp *.bmp *.tif *.tiff *.gif)"
         )
-        for f in files:
-            if f and f not in self.get_current_files():
-                self.file_list.addItem(f)
+        self.file_list.add_files(files)
 
     def get_current_files(self):
-        return [self.file_list.item(i).text() for i in range(self.file_list.count())]
+        return self.file_list.files()
 
     def remove_selected(self):
         self.clear_status()
-        for item in self.file_list.selectedItems():
-            self.file_list.takeItem(self.file_list.row(item))
+        self.file_list.remove_selected()
 
     def select_output_folder(self):
         self.clear_status()
@@ -211,88 +350,79 @@ class ImageConverterUI(QtWidgets.QWidget):
         }
         return crop_map[self.crop_combo.currentIndex()]
 
-    def crop_center(self, img, target_ratio):
-        w, h = img.size
-        trw, trh = target_ratio
-        # If aspect ratio matches (allow for rounding), do nothing
-        if abs((w / h) - (trw / trh)) < 1e-4:
-            return img
-        if w * trh > h * trw:
-            # Width is too big, crop sides
-            new_w = int(h * trw / trh)
-            left = (w - new_w) // 2
-            box = (left, 0, left + new_w, h)
-        else:
-            # Height is too big, crop top/bottom
-            new_h = int(w * trh / trw)
-            top = (h - new_h) // 2
-            box = (0, top, w, top + new_h)
-        return img.crop(box)
+    def get_metadata_policy(self):
+        return ["icc", "keep", "strip"][self.meta_combo.currentIndex()]
 
     def convert_images(self):
+        if self.worker and self.worker.isRunning():
+            # The button reads "Cancel" while a batch runs
+            self.worker.stop()
+            self.convert_btn.setEnabled(False)
+            self.status.setText("Cancelling, finishing images in progress...")
+            return
         files = self.get_current_files()
         outdir = self.output_path.text().strip()
         fmtidx = self.format_combo.currentIndex()
-        resize_tuple = self.get_resize_tuple()
-        crop_ratio = self.get_crop_ratio()
-        ok, fail = 0, 0
-        error_msgs = []
         if not files:
             self.status.setText("Please add images.")
             return
         if not outdir or not os.path.isdir(outdir):
             self.status.setText("Please select a valid output folder.")
             return
-        for f in files:
-            try:
-                with Image.open(f) as img:
-                    # Crop first if needed
-                    if crop_ratio:
-                        img = self.crop_center(img, crop_ratio)
-                    # Then resize if needed
-                    if resize_tuple:
-                        img.thumbnail(resize_tuple, Image.LANCZOS)
-                    # Figure out output format & file extension
-                    if fmtidx == 0:
-                        out_ext = os.path.splitext(f)[1].lower().replace('.', '')
-                        out_fmt_save = img.format if img.format else out_ext.upper()
-                    else:
-                        out_fmt = self.format_combo.currentText().upper()
-                        if out_fmt == "JPG":
-                            out_ext = "jpg"
-                            out_fmt_save = "JPEG"
-                        else:
-                            out_ext = out_fmt.lower()
-                            out_fmt_save = out_fmt
-                    fname = os.path.basename(f)
-                    name, _ = os.path.splitext(fname)
-                    outname = f"{name}_converted.{out_ext}"
-                    outpath = os.path.join(outdir, outname)
-                    save_args = {}
-                    if out_fmt_save in ["JPEG", "WEBP"]:
-                        save_args["quality"] = 90
-                        save_args["optimize"] = True
-                    # Robust flatten for JPEG (PNG/WEBP → JPEG)
-                    if out_fmt_save == "JPEG":
-                        img = img.convert("RGBA")
-                        bg = Image.new("RGB", img.size, (255, 255, 255))
-                        bg.paste(img, mask=img.split()[-1])
-                        img = bg
-                    img.save(outpath, out_fmt_save, **save_args)
-                    if not os.path.isfile(outpath) or os.path.getsize(outpath) == 0:
-                        raise Exception("Output file missing or empty")
-                    ok += 1
-            except Exception as e:
-                fail += 1
-                msg = f"{os.path.basename(f)}: {str(e)}"
-                if fmtidx > 0 and self.format_combo.currentText().upper() in ["JPG"]:
-                    msg += " (PNG/WEBP may have transparency (alpha channel) or unsupported mode for JPG.)"
-                error_msgs.append(msg)
-        msg = f"Conversion finished. {ok} succeeded, {fail} failed."
-        if error_msgs:
-            msg += "\n" + "\n".join(error_msgs)
+        out_format = self.format_combo.currentText() if fmtidx > 0 else None
+        if out_format and out_format.startswith("Auto"):
+            out_format = "AUTO"
+        self.file_list.clear_status()
+        self.convert_btn.setText("Cancel")
+        self.progress.setValue(0)
+        self.status.setText(f"Converting {len(files)} images...")
+        self.worker = ConvertWorker(files, outdir, out_format, self.get_resize_tuple(), self.get_crop_ratio(),
+                                    self.get_metadata_policy(), self.auto_kind_check.isChecked(),
+                                    self.skip_check.isChecked(), self.dedup_check.isChecked())
+        self.worker.file_done_signal.connect(self.on_file_done)
+        self.worker.progress_signal.connect(self.progress.setValue)
+        self.worker.finished_signal.connect(self.on_convert_finished)
+        self.worker.start()
+
+    def on_file_done(self, result):
+        if result.get("duplicate_of"):
+            self.file_list.set_status(result["src"], "#f1fa8c", f"Duplicate of {result['duplicate_of']}, skipped")
+        elif result.get("resumed"):
+            self.file_list.set_status(result["src"], "#8be9fd", f"Done in the interrupted run:\n{result['out']}")
+        elif result.get("cached"):
+            self.file_list.set_status(result["src"], "#8be9fd", f"Unchanged, kept existing output:\n{result['out']}")
+        elif result["ok"]:
+            self.file_list.set_status(result["src"], "#50fa7b",
+                                      f"{result['in_bytes'] // 1024} KB -> {result['out_bytes'] // 1024} KB "
+                                      f"({result['format']}) in {result['seconds']:.2f}s")
+        else:
+            self.file_list.set_status(result["src"], "#ff5555", result["error"])
+
+    def on_convert_finished(self, ok, fail):
+        self.convert_btn.setText("Convert Images")
+        self.convert_btn.setEnabled(True)
+        if self.worker.cancelled:
+            msg = f"Conversion cancelled. {ok} succeeded, {fail} failed; convert again to resume."
+        else:
+            msg = f"Conversion finished. {ok} succeeded, {fail} failed."
+        if self.worker.resumed:
+            msg += f" Resumed: {self.worker.resumed} already done in an interrupted run."
+        if self.worker.cache:
+            msg += "\n" + self.worker.cache.stats_text()
+        if self.worker.dedup_report:
+            msg += "\n" + report_text(self.worker.dedup_report)
+        if self.worker.auto_stats:
+            msg += "\n" + auto_stats_text(self.worker.auto_stats)
+        if self.worker.error_msgs:
+            msg += "\n" + "\n".join(self.worker.error_msgs)
         self.status.setText(msg)
 
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
     win = ImageConverterUI()
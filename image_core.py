@@ -0,0 +1,768 @@
+import io
+import os
+import math
+import time
+import queue
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image, ImageChops, ImageSequence, features
+from image_tiles import DEFAULT_MEMORY_CAP_MB, TiffBands, decoded_bytes, open_unbounded, within_bomb_limit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Qt-free image processing core. Everything here must stay importable (and
+# picklable) from worker processes, so no PyQt5 imports in this module.
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def compressed_path(src, outdir):
+    name, ext = os.path.splitext(os.path.basename(src))
+    return os.path.join(outdir, f"{name}_compressed{ext}")
+
+def converted_path(src, outdir, out_ext):
+    name, _ = os.path.splitext(os.path.basename(src))
+    return os.path.join(outdir, f"{name}_converted.{out_ext}")
+
+@contextlib.contextmanager
+def atomic_output(outpath):
+    """Yield a temp path next to outpath that replaces it only once the block succeeds.
+
+    A crash or cancel mid-encode never leaves a truncated output under the real name.
+    """
+    root, ext = os.path.splitext(outpath)
+    # Same folder (so os.replace is atomic) and same extension (so Pillow picks the same format)
+    tmp = os.path.join(os.path.dirname(outpath), f".{os.path.basename(root)}.{os.getpid()}.tmp{ext}")
+    try:
+        yield tmp
+        os.replace(tmp, outpath)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def compress_settings(quality, target_bytes=None, png_optimize=True, ssim_floor=None):
+    # What the output cache fingerprints: quality is irrelevant once it is searched for
+    searched = ssim_floor or target_bytes
+    return {"quality": None if searched else quality, "target_bytes": None if ssim_floor else target_bytes,
+            "png_optimize": png_optimize, "ssim_floor": ssim_floor}
+
+def convert_settings(out_format=None, resize_tuple=None, crop_ratio=None, metadata="icc", auto_by_kind=True):
+    settings = {"format": out_format, "resize": resize_tuple, "crop": crop_ratio, "metadata": metadata}
+    if out_format == "AUTO":
+        settings["auto_by_kind"] = auto_by_kind
+    return settings
+
+def crop_box(size, ratio):
+    """Centered box with the given aspect ratio, or None if size already matches it."""
+    w, h = size
+    trw, trh = ratio
+    # If aspect ratio matches (allow for rounding), do nothing
+    if abs((w / h) - (trw / trh)) < 1e-4:
+        return None
+    if w * trh > h * trw:
+        # Width is too big, crop sides
+        new_w = int(h * trw / trh)
+        left = (w - new_w) // 2
+        return (left, 0, left + new_w, h)
+    # Height is too big, crop top/bottom
+    new_h = int(w * trh / trw)
+    top = (h - new_h) // 2
+    return (0, top, w, top + new_h)
+
+def fit_size(size, bound):
+    # Same rule as Image.thumbnail: shrink to fit inside bound, keep aspect, never upscale
+    w, h = size
+    bw, bh = bound
+    if w <= bw and h <= bh:
+        return size
+    scale = min(bw / w, bh / h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+def draft_request(size, crop_ratio, resize_tuple, reducing_gap=2.0):
+    """The decode size draft_for_target asks for: reducing_gap x the planned output, in source terms."""
+    w, h = size
+    box = crop_box(size, crop_ratio) if crop_ratio else None
+    bw, bh = (box[2] - box[0], box[3] - box[1]) if box else (w, h)
+    out_w, out_h = fit_size((bw, bh), resize_tuple)
+    # Keep reducing_gap x the final size so the LANCZOS pass still has detail to work with
+    return math.ceil(w * out_w / bw * reducing_gap), math.ceil(h * out_h / bh * reducing_gap)
+
+def draft_scale(size, request):
+    """The DCT scale (8, 4, 2 or 1) a JPEG draft for request decodes at, picked as Pillow's draft() does."""
+    fits = min(size[0] // request[0], size[1] // request[1])
+    return next((s for s in (8, 4, 2) if fits >= s), 1)
+
+def draft_for_target(img, crop_ratio, resize_tuple, reducing_gap=2.0):
+    """Plan the output size from the header and let JPEG decode at the smallest DCT scale that covers it."""
+    if not resize_tuple or img.format != "JPEG":
+        return
+    img.draft(None, draft_request(img.size, crop_ratio, resize_tuple, reducing_gap))
+
+def planned_decode_bytes(img, crop_ratio=None, resize_tuple=None, orientation=1):
+    """What transform_image will allocate to decode img, at the draft scale it will actually get."""
+    if not resize_tuple or img.format != "JPEG":
+        return decoded_bytes(img.size, img.mode)
+    if ORIENTATION_TRANSPOSE.get(orientation) in SWAPS_AXES:
+        # transform_image plans on the stored pixels with the axes swapped
+        crop_ratio = crop_ratio[::-1] if crop_ratio else None
+        resize_tuple = resize_tuple[::-1]
+    scale = draft_scale(img.size, draft_request(img.size, crop_ratio, resize_tuple))
+    w, h = img.size
+    return decoded_bytes((-(-w // scale), -(-h // scale)), img.mode)
+
+# EXIF orientation -> the transpose that makes the stored pixels display upright
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+EXIF_ORIENTATION = 0x0112
+
+def exif_orientation(img):
+    try:
+        return int(img.getexif().get(EXIF_ORIENTATION, 1))
+    except Exception:
+        return 1
+
+def orients_on_load(img):
+    """True when Pillow's plugin turns img upright itself (TIFF): img.size is already
+    the displayed size and load() rotates the pixels as the tag asks."""
+    return img.format == "TIFF"
+
+# keep: EXIF and ICC, icc: only the color profile, strip: neither
+METADATA_POLICIES = ("icc", "keep", "strip")
+
+def metadata_args(img, fmt, policy="icc", upright=True):
+    """Save arguments carrying the source's metadata under policy; img is the opened source.
+
+    upright says the pixels were rotated as the orientation tag asks, so the tag is reset.
+    """
+    if fmt == "GIF":
+        return {}
+    args = {"icc_profile": img.info.get("icc_profile") if policy != "strip" else None, "exif": b""}
+    if policy == "keep":
+        exif = img.getexif()
+        orientation = exif.get(EXIF_ORIENTATION)
+        if orientation is not None and upright:
+            # The tag must not rotate the pixels a second time
+            exif[EXIF_ORIENTATION] = 1
+        args["exif"] = exif.tobytes() if exif else b""
+        if orientation is not None:
+            exif[EXIF_ORIENTATION] = orientation
+    return args
+
+def has_alpha(img):
+    return img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or (img.mode == "P" and "transparency" in img.info)
+
+SWAPS_AXES = (Image.Transpose.TRANSPOSE, Image.Transpose.TRANSVERSE,
+              Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270)
+# Modes each output format can store as-is; anything else (CMYK, YCbCr, ...) is converted first.
+# GIF quantizes RGB/RGBA itself, but only from those modes.
+SAVE_MODES = {"JPEG": ("RGB", "L", "CMYK"), "AVIF": ("RGB", "RGBA"), "WEBP": ("RGB", "RGBA"),
+              "PNG": ("1", "L", "LA", "I", "I;16", "P", "RGB", "RGBA"), "GIF": ("1", "L", "P", "RGB", "RGBA")}
+
+def flatten_for(img, out_fmt):
+    if out_fmt == "JPEG" and has_alpha(img):
+        # JPEG has no alpha: flatten onto white, but only when there is alpha to flatten
+        rgba = img.convert("RGBA")
+        bg = Image.new("RGB", rgba.size, (255, 255, 255))
+        bg.paste(rgba, mask=rgba.getchannel("A"))
+        img = bg
+    elif out_fmt in SAVE_MODES and img.mode not in SAVE_MODES[out_fmt]:
+        img = img.convert("RGBA" if has_alpha(img) and out_fmt != "JPEG" else "RGB")
+    return img
+
+def transform_image(img, crop_ratio=None, resize_tuple=None, out_fmt=None, orientation=1, upright=True):
+    """Crop, resize, orient and flatten as one planned pass over a freshly opened image.
+
+    crop_ratio and resize_tuple are in displayed (EXIF-oriented) terms. With
+    upright=False the result keeps the stored orientation, for outputs that
+    carry the orientation tag over.
+    """
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose in SWAPS_AXES:
+        # Plan on the stored pixels with the axes swapped; only the small result gets transposed
+        crop_ratio = crop_ratio[::-1] if crop_ratio else None
+        resize_tuple = resize_tuple[::-1] if resize_tuple else None
+    draft_for_target(img, crop_ratio, resize_tuple)
+    box = crop_box(img.size, crop_ratio) if crop_ratio else None
+    src_size = (box[2] - box[0], box[3] - box[1]) if box else img.size
+    out_size = fit_size(src_size, resize_tuple) if resize_tuple else src_size
+    if out_size != src_size:
+        if img.mode in ("1", "P"):
+            # Palette/bilevel images would be resized nearest-neighbour; expand them first
+            img = img.convert("RGBA" if has_alpha(img) else "RGB")
+        # The crop is folded into resize's box, so no full-size cropped copy is made
+        img = img.resize(out_size, Image.LANCZOS, box=box, reducing_gap=2.0)
+    elif box:
+        img = img.crop(box)
+    if transpose is not None and upright:
+        img = img.transpose(transpose)
+    return flatten_for(img, out_fmt)
+
+def transform_banded(bands, crop_ratio=None, resize_tuple=None, out_fmt=None, orientation=1,
+                     max_memory_mb=DEFAULT_MEMORY_CAP_MB):
+    """transform_image for a TiffBands source: the same plan, decoded and reduced one band at a time."""
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose in SWAPS_AXES:
+        crop_ratio = crop_ratio[::-1] if crop_ratio else None
+        resize_tuple = resize_tuple[::-1] if resize_tuple else None
+    size = (bands.width, bands.height)
+    box = (crop_box(size, crop_ratio) if crop_ratio else None) or (0, 0) + size
+    src_size = (box[2] - box[0], box[3] - box[1])
+    out_size = fit_size(src_size, resize_tuple) if resize_tuple else src_size
+    if decoded_bytes(out_size, bands.mode) > max_memory_mb * 1024 * 1024 // 4:
+        raise ValueError(f"{out_size[0]}x{out_size[1]} output does not fit the {max_memory_mb} MB memory limit; "
+                         "choose a smaller size")
+    # Like resize(reducing_gap=2.0): integer box reduction first, LANCZOS for the rest
+    factor = max(1, int(min(src_size[0] / out_size[0], src_size[1] / out_size[1]) / 2.0))
+    img = bands.reduce(box, factor, max_memory_mb * 1024 * 1024 // 4)
+    if img.size != out_size:
+        img = img.resize(out_size, Image.LANCZOS)
+    if transpose is not None:
+        img = img.transpose(transpose)
+    return flatten_for(img, out_fmt)
+
+def is_animated(img):
+    return getattr(img, "is_animated", False) and getattr(img, "n_frames", 1) > 1
+
+def iter_frames(img, fn=None):
+    """Yield RGBA frames one source frame at a time, folding repeats into the previous frame's duration."""
+    prev = None
+    for frame in ImageSequence.Iterator(img):
+        duration = frame.info.get("duration", 100)
+        out = frame.convert("RGBA")
+        if fn:
+            out = fn(out)
+        if prev is not None and ImageChops.difference(prev, out).getbbox(alpha_only=False) is None:
+            prev.info["duration"] += duration
+            continue
+        if prev is not None:
+            yield prev
+        out.info["duration"] = duration
+        prev = out
+    if prev is not None:
+        yield prev
+
+# Frames the shared GIF palette is built from, spread evenly over the animation
+GIF_PALETTE_SAMPLES = 16
+GIF_PALETTE_PIXELS = 4_000_000
+
+def save_animation(img, outpath, fmt, fn=None, quality=80):
+    """Re-encode an animated GIF/WebP as fmt ("GIF" or "WEBP"), applying fn to each frame."""
+    loop = img.info.get("loop", 0)
+    if fmt == "WEBP" and fn is None:
+        # Pillow's WebP writer seeks through the source itself, so nothing is materialized;
+        # one cheap pass first to collect the per-frame timing
+        durations = [frame.info.get("duration", 100) for frame in ImageSequence.Iterator(img)]
+        img.seek(0)
+        img.save(outpath, "WEBP", save_all=True, duration=durations, loop=loop, quality=quality, method=4)
+        return
+    frames = iter_frames(img, fn)
+    first = next(frames)
+    if fmt == "WEBP":
+        # The WebP writer lists append_images up front; frames are already at output size here
+        rest = list(frames)
+        first.save(outpath, "WEBP", save_all=True, append_images=rest,
+                   duration=[f.info["duration"] for f in [first] + rest],
+                   loop=loop, quality=quality, method=4)
+        return
+    # Pillow's GIF writer collects every frame before writing, so they are listed here too
+    frames = [first] + list(frames)
+    if all(f.getchannel("A").getextrema() == (255, 255) for f in frames) and "transparency" not in img.info:
+        # One palette for every frame keeps unchanged areas identical, so the GIF
+        # writer's bounding-box diffs stay small. It is built from frames across
+        # the whole animation, so colours that only appear later survive
+        step = max(1, len(frames) // GIF_PALETTE_SAMPLES)
+        sample = frames[::step][:GIF_PALETTE_SAMPLES]
+        # Nearest-neighbour shrinking keeps the sheet small without inventing blended colours
+        scale = min(1.0, (GIF_PALETTE_PIXELS / (first.width * first.height * len(sample))) ** 0.5)
+        w, h = max(1, int(first.width * scale)), max(1, int(first.height * scale))
+        sheet = Image.new("RGB", (w, h * len(sample)))
+        for i, f in enumerate(sample):
+            sheet.paste(f.convert("RGB").resize((w, h), Image.NEAREST), (0, h * i))
+        shared = sheet.quantize(256, method=Image.Quantize.MEDIANCUT)
+        for i, f in enumerate(frames):
+            q = f.convert("RGB").quantize(palette=shared, dither=Image.Dither.NONE)
+            q.info["duration"] = f.info["duration"]
+            frames[i] = q
+    frames[0].save(outpath, "GIF", save_all=True, append_images=frames[1:], loop=loop, optimize=True)
+
+# Formats whose size can be steered with the quality setting
+QUALITY_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP"}
+
+def encode_to_target(img, fmt, target_bytes, save_args=None, lo=20, hi=95):
+    """Bisect quality for the highest setting whose encoded size fits target_bytes."""
+    save_args = save_args or {}
+    probes = {}
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        buf = io.BytesIO()
+        img.save(buf, fmt, quality=mid, **save_args)
+        probes[mid] = buf.getvalue()
+        if len(probes[mid]) <= target_bytes:
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    fitting = [q for q, data in probes.items() if len(data) <= target_bytes]
+    # Nothing fits: fall back to the lowest quality we tried (the smallest output)
+    quality = max(fitting) if fitting else min(probes)
+    return quality, probes[quality], len(probes)
+
+class SsimReference:
+    """Luma statistics of the source image, computed once and scored against every probe.
+
+    SSIM is taken on a luma plane reduced so its long side is at most max_side,
+    with a window x window box filter built from summed-area tables.
+    """
+
+    C1 = (0.01 * 255) ** 2
+    C2 = (0.03 * 255) ** 2
+
+    def __init__(self, img, max_side=512, window=7):
+        if np is None:
+            raise RuntimeError("SSIM mode needs NumPy (pip install numpy)")
+        self.factor = max(1, math.ceil(max(img.size) / max_side))
+        x = self._luma(img)
+        self.window = max(1, min(window, *x.shape))
+        self.mu_x = self._box(x)
+        self.var_x = self._box(x * x) - self.mu_x ** 2
+        self.x = x
+
+    def _luma(self, img):
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("RGB")
+        if self.factor > 1:
+            img = img.reduce(self.factor)
+        return np.asarray(img.convert("L"), dtype=np.float64)
+
+    def _box(self, a):
+        k = self.window
+        s = np.zeros((a.shape[0] + 1, a.shape[1] + 1))
+        np.cumsum(np.cumsum(a, axis=0), axis=1, out=s[1:, 1:])
+        return (s[k:, k:] - s[:-k, k:] - s[k:, :-k] + s[:-k, :-k]) / (k * k)
+
+    def score(self, data):
+        """Mean SSIM of encoded bytes against the reference."""
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format == "JPEG":
+                # Decode straight to the Y plane, skipping chroma upsampling and color conversion
+                img.draft("L", img.size)
+            y = self._luma(img)
+        mu_y = self._box(y)
+        var_y = self._box(y * y) - mu_y ** 2
+        cov = self._box(self.x * y) - self.mu_x * mu_y
+        num = (2 * self.mu_x * mu_y + self.C1) * (2 * cov + self.C2)
+        den = (self.mu_x ** 2 + mu_y ** 2 + self.C1) * (self.var_x + var_y + self.C2)
+        return float((num / den).mean())
+
+def encode_to_ssim(img, fmt, ssim_floor, save_args=None, lo=20, hi=95):
+    """Bisect quality for the lowest setting whose output still scores ssim_floor or better."""
+    save_args = save_args or {}
+    reference = SsimReference(img)
+    probes = {}
+    scores = {}
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        buf = io.BytesIO()
+        img.save(buf, fmt, quality=mid, **save_args)
+        probes[mid] = buf.getvalue()
+        scores[mid] = reference.score(probes[mid])
+        if scores[mid] >= ssim_floor:
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    passing = [q for q, score in scores.items() if score >= ssim_floor]
+    # Nothing reaches the floor: fall back to the highest quality we tried (the closest match)
+    quality = min(passing) if passing else max(probes)
+    return quality, probes[quality], len(probes), scores[quality]
+
+# zlib strategies Pillow accepts as compress_type: default, filtered, huffman only, RLE
+PNG_STRATEGIES = (0, 1, 2, 3)
+
+def png_variants(img):
+    """Pixel-identical candidates for a PNG: the image itself, minus unused alpha, plus an exact palette."""
+    if img.mode not in ("RGB", "RGBA"):
+        return [img]
+    if img.mode == "RGBA" and img.getchannel("A").getextrema() == (255, 255):
+        img = img.convert("RGB")
+    variants = [img]
+    colors = img.getcolors(256)
+    if colors is None:
+        return variants
+    if img.mode == "RGB":
+        # Every color is in the palette, so the nearest-color mapping is exact
+        rgbs = [rgb for _, rgb in colors]
+        palette = Image.new("P", (1, 1))
+        palette.putpalette([c for rgb in rgbs for c in rgb])
+        pal = img.quantize(palette=palette, dither=Image.Dither.NONE)
+        # An RGB tRNS colour becomes its palette index; one no pixel uses has nothing to mark
+        key = pal.info.pop("transparency", None)
+        if isinstance(key, tuple) and tuple(key[:3]) in rgbs:
+            pal.info["transparency"] = rgbs.index(tuple(key[:3]))
+        variants.append(pal)
+    else:
+        pal = img.quantize(colors=len(colors), method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        # The octree is not guaranteed to keep every RGBA color apart; only use it if it did
+        if ImageChops.difference(pal.convert("RGBA"), img).getbbox(alpha_only=False) is None:
+            variants.append(pal)
+    return variants
+
+def optimize_png(img, strategies=PNG_STRATEGIES):
+    """Encode every variant/strategy pair at level 9 and return (smallest bytes, candidates tried)."""
+    img.load()
+    # Only the ICC profile and transparency are carried over; text, time and EXIF chunks are dropped
+    icc = img.info.get("icc_profile")
+    best = None
+    tried = 0
+    for variant in png_variants(img):
+        for strategy in strategies:
+            buf = io.BytesIO()
+            variant.save(buf, "PNG", compress_level=9, compress_type=strategy, icc_profile=icc)
+            tried += 1
+            if best is None or buf.tell() < len(best):
+                best = buf.getvalue()
+    return best, tried
+
+def compress_image(src, outdir, quality, target_bytes=None, png_optimize=True, ssim_floor=None):
+    """Compress one file, returning a plain result dict (cheap to send back from a worker).
+
+    ssim_floor takes precedence over target_bytes for JPEG/WEBP sources.
+    """
+    result = {"src": src, "out": None, "ok": False, "in_bytes": 0, "out_bytes": 0, "seconds": 0.0,
+              "error": "", "quality": quality, "probes": 0, "encode_seconds": 0.0, "ssim": None}
+    start = time.perf_counter()
+    try:
+        result["in_bytes"] = os.path.getsize(src)
+        outpath = compressed_path(src, outdir)
+        ext = os.path.splitext(src)[1].lower()
+        with Image.open(src) as img, atomic_output(outpath) as tmp:
+            save_args = {}
+            if ext in QUALITY_FORMATS:
+                save_args["optimize"] = True
+            if ext in [".jpg", ".jpeg"]:
+                save_args["progressive"] = True
+            if ext in (".gif", ".webp") and is_animated(img):
+                enc_start = time.perf_counter()
+                save_animation(img, tmp, "GIF" if ext == ".gif" else "WEBP", quality=quality)
+                result["encode_seconds"] = time.perf_counter() - enc_start
+                result["probes"] = 1
+            elif png_optimize and ext == ".png":
+                enc_start = time.perf_counter()
+                data, result["probes"] = optimize_png(img)
+                result["encode_seconds"] = time.perf_counter() - enc_start
+                if len(data) >= result["in_bytes"]:
+                    # Already tighter than anything we found: keep the original bytes
+                    with open(src, "rb") as f:
+                        data = f.read()
+                with open(tmp, "wb") as out:
+                    out.write(data)
+            elif (ssim_floor or target_bytes) and ext in QUALITY_FORMATS:
+                # Decode once; every probe below only pays for an encode
+                img.load()
+                if QUALITY_FORMATS[ext] == "JPEG" and img.mode not in ("RGB", "L", "CMYK"):
+                    img = img.convert("RGB")
+                enc_start = time.perf_counter()
+                if ssim_floor:
+                    result["quality"], data, result["probes"], result["ssim"] = encode_to_ssim(
+                        img, QUALITY_FORMATS[ext], ssim_floor, save_args)
+                else:
+                    result["quality"], data, result["probes"] = encode_to_target(
+                        img, QUALITY_FORMATS[ext], target_bytes, save_args)
+                result["encode_seconds"] = time.perf_counter() - enc_start
+                with open(tmp, "wb") as out:
+                    out.write(data)
+            else:
+                if ext in QUALITY_FORMATS:
+                    save_args["quality"] = quality
+                enc_start = time.perf_counter()
+                img.save(tmp, **save_args)
+                result["encode_seconds"] = time.perf_counter() - enc_start
+                result["probes"] = 1
+        result["out"] = outpath
+        result["out_bytes"] = os.path.getsize(outpath)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+# "Auto (smallest)" candidates: name -> (Pillow format, extension, save arguments).
+# The lossy settings are roughly equivalent to the fixed-format converter's quality 90.
+AUTO_CANDIDATES = {
+    "AVIF": ("AVIF", "avif", {"quality": 70}),
+    "WEBP": ("WEBP", "webp", {"quality": 90}),
+    "JPEG": ("JPEG", "jpg", {"quality": 90, "optimize": True}),
+    "PNG": ("PNG", "png", {"optimize": True}),
+    "WEBP lossless": ("WEBP", "webp", {"lossless": True}),
+}
+AUTO_BY_KIND = {"photo": ("AVIF", "WEBP", "JPEG"), "graphic": ("PNG", "WEBP lossless")}
+LOSSLESS_CANDIDATES = ("PNG", "WEBP lossless")
+# Lossy candidates scoring below this SSIM against the converted pixels are not eligible
+AUTO_SSIM_FLOOR = 0.98
+AVIF_SUPPORTED = features.check("avif")
+KIND_SAMPLE = 128
+KIND_MAX_COLORS = 1024
+
+def image_kind(img):
+    """"graphic" for flat-color images (screenshots, logos, charts), else "photo".
+
+    Decided from the color histogram of a small nearest-neighbour sample, which
+    keeps exact colors: graphics have few of them, dominated by a handful.
+    """
+    scale = KIND_SAMPLE / max(img.size)
+    sample = img if scale >= 1 else img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                                               Image.NEAREST)
+    if sample.mode not in ("RGB", "RGBA"):
+        sample = sample.convert("RGBA" if has_alpha(sample) else "RGB")
+    colors = sample.getcolors(KIND_MAX_COLORS)
+    if colors is None:
+        return "photo"
+    top = sum(sorted(count for count, _ in colors)[-16:])
+    return "graphic" if top >= 0.6 * sample.width * sample.height else "photo"
+
+def auto_candidates(img, by_kind=True):
+    """Candidate names to race for img; by_kind limits them to the ones suited to photos or graphics."""
+    names = AUTO_BY_KIND[image_kind(img)] if by_kind else tuple(AUTO_CANDIDATES)
+    # JPEG would flatten transparency away
+    return [n for n in names if (n != "AVIF" or AVIF_SUPPORTED) and (n != "JPEG" or not has_alpha(img))]
+
+def _auto_ready(img, fmt):
+    if img.mode in SAVE_MODES[fmt]:
+        # save() keeps its arguments on the Image object, so concurrent encodes each need their own
+        return img.copy()
+    return flatten_for(img, fmt)
+
+def encode_smallest(img, candidates, meta_args, ssim_floor=AUTO_SSIM_FLOOR):
+    """Encode img as every candidate at once, in memory; returns (winner, data, per-candidate stats).
+
+    Pillow's encoders release the GIL, so a thread per candidate runs them in
+    parallel. The winner is the smallest candidate that is lossless or scores
+    ssim_floor (checked only when NumPy is available); if none qualifies, the
+    best scoring one wins. A candidate whose encoder fails drops out of the race;
+    the error is raised only if every candidate fails. meta_args maps Pillow
+    format to metadata save arguments.
+    """
+    # Decode once up front; the encoder threads would otherwise race to load a lazy image
+    img.load()
+    lossy = [n for n in candidates if n not in LOSSLESS_CANDIDATES]
+    reference = SsimReference(img) if np is not None and lossy else None
+
+    def encode(name):
+        fmt, _, args = AUTO_CANDIDATES[name]
+        start = time.perf_counter()
+        buf = io.BytesIO()
+        try:
+            _auto_ready(img, fmt).save(buf, fmt, **args, **meta_args.get(fmt, {}))
+            data = buf.getvalue()
+            score = reference.score(data) if reference and name in lossy else None
+        except Exception as e:
+            return name, e, time.perf_counter() - start, None
+        return name, data, time.perf_counter() - start, score
+
+    with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+        results = list(pool.map(encode, candidates))
+    encoded = [e for e in results if not isinstance(e[1], Exception)]
+    if not encoded:
+        raise ValueError("; ".join(f"{name}: {error}" for name, error, _, _ in results))
+    stats = {name: {"bytes": len(data), "seconds": seconds, "ssim": score}
+             for name, data, seconds, score in encoded}
+    eligible = [e for e in encoded if e[3] is None or e[3] >= ssim_floor]
+    if eligible:
+        name, data, _, _ = min(eligible, key=lambda e: len(e[1]))
+    else:
+        name, data, _, _ = max(encoded, key=lambda e: e[3])
+    return name, data, stats
+
+def add_auto_stats(stats, result):
+    """Fold one result's race into stats: {name: {"tried", "won", "seconds", "bytes"}}."""
+    for name, c in (result.get("candidates") or {}).items():
+        s = stats.setdefault(name, {"tried": 0, "won": 0, "seconds": 0.0, "bytes": 0})
+        s["tried"] += 1
+        s["won"] += name == result["format"]
+        s["seconds"] += c["seconds"]
+        s["bytes"] += c["bytes"]
+    return stats
+
+def auto_stats_text(stats):
+    return "Auto: " + ", ".join(f"{name} won {s['won']}/{s['tried']} ({s['seconds'] / s['tried']:.2f}s/image)"
+                                for name, s in sorted(stats.items(), key=lambda i: -i[1]["won"]))
+
+def convert_image(src, outdir, out_format=None, resize_tuple=None, crop_ratio=None, metadata="icc",
+                  max_memory_mb=DEFAULT_MEMORY_CAP_MB, auto_by_kind=True):
+    """Convert one file; out_format is "JPG", "PNG", "WEBP", "GIF" or None to keep the original format.
+
+    out_format "AUTO" races AUTO_CANDIDATES and writes the smallest (see encode_smallest);
+    auto_by_kind limits the race to the candidates suited to the image. Animations become
+    animated WebP. metadata is one of METADATA_POLICIES. EXIF orientation is always applied
+    to the pixels. TIFFs that would decode to more than max_memory_mb are streamed in bands.
+    """
+    result = {"src": src, "out": None, "ok": False, "in_bytes": 0, "out_bytes": 0,
+              "seconds": 0.0, "error": "", "format": None, "candidates": None}
+    start = time.perf_counter()
+    try:
+        result["in_bytes"] = os.path.getsize(src)
+        # Over the memory cap a TIFF is decoded in bands; anything else is decoded whole,
+        # up to the decompression-bomb limit Image.open would have applied
+        with open_unbounded(src) as img:
+            bands = band_error = None
+            orientation = exif_orientation(img)
+            if planned_decode_bytes(img, crop_ratio, resize_tuple, orientation) > max_memory_mb * 1024 * 1024:
+                try:
+                    bands = TiffBands(src, img)
+                except ValueError as e:
+                    band_error = e
+            if bands is None and not within_bomb_limit(img.size):
+                raise ValueError(f"{img.size[0]}x{img.size[1]} image exceeds Pillow's decompression-bomb limit"
+                                 + (f" and {band_error}" if band_error else ""))
+            # Bands are decoded from the raw strips, so only they still need the tag applied
+            loaded_upright = bands is None and orients_on_load(img)
+            if loaded_upright:
+                orientation = 1
+            # Figure out output format & file extension
+            auto = out_format is not None and out_format.upper() == "AUTO"
+            if auto and is_animated(img):
+                out_format, auto = "WEBP", False
+            if auto:
+                # Picked after encoding; nothing here depends on it but the JPEG flatten
+                out_ext = out_fmt_save = "AUTO"
+            elif out_format is None:
+                out_ext = os.path.splitext(src)[1].lower().replace('.', '')
+                out_fmt_save = img.format if img.format else out_ext.upper()
+            elif out_format.upper() == "JPG":
+                out_ext = "jpg"
+                out_fmt_save = "JPEG"
+            else:
+                out_ext = out_format.lower()
+                out_fmt_save = out_format.upper()
+            outpath = converted_path(src, outdir, out_ext) if not auto else None
+            save_args = {}
+            if out_fmt_save in ["JPEG", "WEBP"]:
+                save_args["quality"] = 90
+                save_args["optimize"] = True
+            if is_animated(img) and out_fmt_save in ("GIF", "WEBP"):
+                fn = None
+                if crop_ratio or resize_tuple:
+                    fn = lambda frame: transform_image(frame, crop_ratio, resize_tuple)
+                with atomic_output(outpath) as tmp:
+                    save_animation(img, tmp, out_fmt_save, fn, quality=save_args.get("quality", 80))
+                result["format"] = out_fmt_save
+            else:
+                # Rotating a full-size output costs about as much as decoding it. When EXIF
+                # is kept anyway, a full-size JPEG keeps its orientation tag instead; the
+                # crop is still planned the way the photo displays. Pixels that are upright
+                # either way (TIFF, banded) always get the tag reset.
+                upright = (bands is not None or loaded_upright
+                           or not (metadata == "keep" and not resize_tuple and out_fmt_save == "JPEG"))
+                if auto:
+                    meta = {fmt: metadata_args(img, fmt, metadata, upright)
+                            for fmt, _, _ in AUTO_CANDIDATES.values()}
+                else:
+                    save_args.update(metadata_args(img, out_fmt_save, metadata, upright))
+                if bands:
+                    img = transform_banded(bands, crop_ratio, resize_tuple, out_fmt_save, orientation, max_memory_mb)
+                else:
+                    # Crop, resize, orientation and JPEG flatten in one planned pass
+                    img = transform_image(img, crop_ratio, resize_tuple, out_fmt_save, orientation, upright)
+                if auto:
+                    name, data, result["candidates"] = encode_smallest(img, auto_candidates(img, auto_by_kind), meta)
+                    out_fmt_save, out_ext, _ = AUTO_CANDIDATES[name]
+                    outpath = converted_path(src, outdir, out_ext)
+                    with atomic_output(outpath) as tmp, open(tmp, "wb") as f:
+                        f.write(data)
+                else:
+                    with atomic_output(outpath) as tmp:
+                        img.save(tmp, out_fmt_save, **save_args)
+                result["format"] = name if auto else out_fmt_save
+        if not os.path.isfile(outpath) or os.path.getsize(outpath) == 0:
+            raise Exception("Output file missing or empty")
+        result["out"] = outpath
+        result["out_bytes"] = os.path.getsize(outpath)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+class ImageBatchEngine:
+    """Runs image jobs across a process pool and yields results as they finish."""
+
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or default_workers())
+        # Keep a couple of jobs queued per worker so no core sits idle,
+        # without submitting (and holding results for) the whole batch at once.
+        self.max_pending = self.workers * 2
+        self._stop_requested = False
+
+    def stop(self):
+        self._stop_requested = True
+
+    def run(self, func, jobs):
+        # jobs is an iterable of argument tuples for func
+        self._stop_requested = False
+        jobs = iter(jobs)
+        if self.workers == 1:
+            # No pool for a single worker: avoids process spawn cost on small runs
+            for args in jobs:
+                if self._stop_requested:
+                    break
+                yield func(*args)
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(func, *args) for args in itertools.islice(jobs, self.max_pending)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if fut.cancelled():
+                        continue
+                    yield fut.result()
+                    if not self._stop_requested:
+                        for args in itertools.islice(jobs, 1):
+                            pending.add(pool.submit(func, *args))
+                if self._stop_requested:
+                    self._cancel_queued(pending)
+
+    def _cancel_queued(self, pending):
+        # Jobs the pool has not started yet are dropped, so a stop only waits for
+        # the encodes already running (about one image per worker)
+        for fut in pending:
+            fut.cancel()
+
+    def run_queue(self, func, jobs):
+        """Like run(), but pulls argument tuples from a queue.Queue until it gets None.
+
+        At most max_pending jobs are taken off the queue at a time, so a bounded
+        queue gives the producer backpressure instead of piling up work.
+        """
+        self._stop_requested = False
+        closed = False
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            while pending or not closed:
+                while not closed and len(pending) < self.max_pending:
+                    try:
+                        # Only block for new work when nothing is in flight
+                        args = jobs.get(timeout=0.5) if not pending else jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if args is None:
+                        closed = True
+                    else:
+                        pending.add(pool.submit(func, *args))
+                if self._stop_requested:
+                    closed = True
+                    self._cancel_queued(pending)
+                if not pending:
+                    continue
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if not fut.cancelled():
+                        yield fut.result()
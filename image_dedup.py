@@ -0,0 +1,214 @@
+import os
+import json
+import time
+from PIL import Image
+from image_cache import file_hash
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Duplicate pre-pass for the image tools: exact copies are found by content
+# hash, re-exports and resized copies by a 64-bit perceptual hash (pHash with
+# NumPy, dHash without). Only exact copies are skipped, since one output serves
+# them all; look-alikes can differ in content (two screenshots of the same
+# window), so they are listed in the report and still processed.
+
+REPORT_NAME = "dedup_report.json"
+# Max differing bits out of 64 for two images to count as near-duplicates
+DEFAULT_THRESHOLD = 4
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+_dct_matrix = None
+
+def _dct(n):
+    global _dct_matrix
+    if _dct_matrix is None or _dct_matrix.shape[0] != n:
+        k = np.arange(n)[:, None]
+        m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        m[0] /= np.sqrt(2.0)
+        _dct_matrix = m
+    return _dct_matrix
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+def _reduced_luma(img, size):
+    # JPEGs decode at 1/8 scale in grayscale here, so even huge photos cost a few ms
+    img.draft("L", (size * 2, size * 2))
+    return img.convert("L").resize((size, size), Image.BOX, reducing_gap=2.0)
+
+def dhash(img):
+    """Difference hash: does brightness rise left to right, on a 9x8 luma grid."""
+    small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX)
+    if np is not None:
+        a = np.asarray(small, dtype=np.int16)
+        return _bits_to_int((a[:, 1:] > a[:, :-1]).ravel())
+    px = list(small.getdata())
+    w = HASH_SIZE + 1
+    return _bits_to_int(px[r * w + c + 1] > px[r * w + c] for r in range(HASH_SIZE) for c in range(HASH_SIZE))
+
+def phash(img):
+    """DCT hash: low frequencies of a 32x32 luma plane compared against their median."""
+    a = np.asarray(img.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.BOX), dtype=np.float64)
+    d = _dct(PHASH_SIZE)
+    low = (d @ a @ d.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is overall brightness; leave it out of the median
+    return _bits_to_int(low > np.median(low[1:]))
+
+def fingerprint_image(src):
+    """Exact and perceptual hashes for one file, as a plain dict (cheap to send back from a worker)."""
+    result = {"src": src, "ok": False, "bytes": 0, "hash": None, "phash": None, "error": ""}
+    try:
+        result["bytes"] = os.path.getsize(src)
+        result["hash"] = file_hash(src)
+        with Image.open(src) as img:
+            small = _reduced_luma(img, PHASH_SIZE)
+        result["phash"] = phash(small) if np is not None else dhash(small)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class BandIndex:
+    """Banded (multi-index) lookup for hashes within a Hamming radius.
+
+    The 64 bits are cut into radius + 1 bands. Two hashes that differ in at most
+    radius bits must agree exactly on at least one band, so a query only
+    compares against the buckets it shares a band with.
+    """
+
+    def __init__(self, radius, bits=64):
+        self.radius = radius
+        width = bits // (radius + 1)
+        self.bands = [(i * width, bits - i * width if i == radius else width) for i in range(radius + 1)]
+        self.buckets = [{} for _ in self.bands]
+        self.values = {}
+
+    def _keys(self, value):
+        return [(value >> shift) & ((1 << width) - 1) for shift, width in self.bands]
+
+    def add(self, value, item):
+        self.values[item] = value
+        for buckets, key in zip(self.buckets, self._keys(value)):
+            buckets.setdefault(key, []).append(item)
+
+    def search(self, value):
+        found = []
+        seen = set()
+        for buckets, key in zip(self.buckets, self._keys(value)):
+            for item in buckets.get(key, ()):
+                if item not in seen:
+                    seen.add(item)
+                    if hamming(value, self.values[item]) <= self.radius:
+                        found.append(item)
+        return found
+
+def group_duplicates(prints, threshold=DEFAULT_THRESHOLD):
+    """Group fingerprints of the same image; returns lists of indexes into prints, largest file first."""
+    parent = list(range(len(prints)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+
+    by_hash = {}
+    index = BandIndex(threshold)
+    for i, p in enumerate(prints):
+        if not p["ok"]:
+            continue
+        first = by_hash.setdefault(p["hash"], i)
+        if first != i:
+            union(first, i)
+            continue
+        # Only one file per exact hash goes into the index
+        for j in index.search(p["phash"]):
+            union(j, i)
+        index.add(p["phash"], i)
+    groups = {}
+    for i, p in enumerate(prints):
+        if p["ok"]:
+            groups.setdefault(find(i), []).append(i)
+    return [sorted(g, key=lambda i: (-prints[i]["bytes"], i)) for g in groups.values() if len(g) > 1]
+
+def find_duplicates(files, engine, threshold=DEFAULT_THRESHOLD):
+    """Fingerprint files on an ImageBatchEngine and return (files to process, dedup report).
+
+    Only byte-identical copies are left out; look-alikes are listed under "similar" and kept.
+    Files that cannot be fingerprinted are kept, so the tool reports its own error for them.
+    """
+    start = time.perf_counter()
+    prints = {}
+    for result in engine.run(fingerprint_image, ((f,) for f in files)):
+        prints[result["src"]] = result
+    # Anything missing was not reached before the engine was stopped
+    prints = [prints.get(f) or {"src": f, "ok": False, "error": "not checked"} for f in files]
+    skip = set()
+    report_groups = []
+    similar = []
+    for g in group_duplicates(prints, threshold):
+        copies = {}
+        for i in g:
+            copies.setdefault(prints[i]["hash"], []).append(prints[i])
+        for same in copies.values():
+            if len(same) < 2:
+                continue
+            keep, dups = same[0], same[1:]
+            skip.update(d["src"] for d in dups)
+            report_groups.append({
+                "keep": keep["src"],
+                "duplicates": [{"src": d["src"], "bytes": d["bytes"], "exact": True, "distance": 0} for d in dups],
+                "bytes_saved": sum(d["bytes"] for d in dups),
+            })
+        if len(copies) > 1:
+            # Look-alikes with different bytes: reported, not skipped
+            base = prints[g[0]]
+            similar.append([{"src": same[0]["src"], "bytes": same[0]["bytes"],
+                             "distance": hamming(same[0]["phash"], base["phash"])} for same in copies.values()])
+    report = {
+        "files": len(files),
+        "groups": report_groups,
+        "duplicates": len(skip),
+        "similar": similar,
+        "bytes_saved": sum(g["bytes_saved"] for g in report_groups),
+        "hash": "phash" if np is not None else "dhash",
+        "threshold": threshold,
+        "seconds": round(time.perf_counter() - start, 3),
+        "errors": [{"src": p["src"], "error": p["error"]} for p in prints if not p["ok"]],
+    }
+    return [f for f in files if f not in skip], report
+
+def duplicate_of(report):
+    """Map each skipped file to the file kept in its place."""
+    return {d["src"]: g["keep"] for g in report["groups"] for d in g["duplicates"]}
+
+def write_report(report, outdir):
+    path = os.path.join(outdir, REPORT_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+def report_text(report):
+    text = (f"Duplicates: {report['duplicates']} skipped in {len(report['groups'])} groups, "
+            f"{report['bytes_saved'] / (1024 * 1024):.1f} MB not processed.")
+    if report["similar"]:
+        text += (f" {sum(len(g) for g in report['similar'])} similar-looking images in {len(report['similar'])} "
+                 f"groups were processed; see {REPORT_NAME}.")
+    return text
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+from image_cache import settings_fingerprint
+
+# Append-only record of a batch run, kept in the output folder while the run
+# is unfinished. If the app dies or the run is cancelled, the next run with
+# the same settings skips every item the journal says is done.
+
+def journal_path(outdir, tool):
+    return os.path.join(outdir, f".coke_{tool}_journal.jsonl")
+
+class BatchJournal:
+    def __init__(self, outdir, tool):
+        self.path = journal_path(outdir, tool)
+        self.tool = tool
+        self._f = None
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                break  # torn last line from a crash mid-write
+        return events
+
+    def start(self, settings, files):
+        """Open the journal for a run; returns {src: out} for items an interrupted run already finished."""
+        fingerprint = settings_fingerprint(self.tool, settings)
+        events = self._read()
+        done = {}
+        if events and events[0].get("event") == "start" and events[0].get("settings") == fingerprint:
+            wanted = set(files)
+            for e in events:
+                if e.get("event") == "done" and e["src"] in wanted:
+                    done[e["src"]] = e
+                elif e.get("event") in ("running", "failed"):
+                    done.pop(e.get("src"), None)
+        resumed = {src: e["out"] for src, e in done.items() if self._still_valid(e)}
+        if resumed:
+            self._f = open(self.path, "a", encoding="utf-8")
+            self._write({"event": "resume", "time": time.time(), "files": len(files)})
+        else:
+            # Nothing usable: start over with a fresh journal
+            self._f = open(self.path, "w", encoding="utf-8")
+            self._write({"event": "start", "time": time.time(), "tool": self.tool,
+                         "settings": fingerprint, "files": len(files)})
+        self._f.writelines(json.dumps({"event": "queued", "src": f}) + "\n" for f in files if f not in resumed)
+        self._f.flush()
+        return resumed
+
+    def _still_valid(self, e):
+        try:
+            st = os.stat(e["src"])
+            return (os.path.getsize(e["out"]) == e["out_size"]
+                    and (st.st_size, st.st_mtime_ns) == (e["size"], e["mtime_ns"]))
+        except (OSError, KeyError):
+            return False
+
+    def _write(self, event):
+        # One flushed line per event, so a crash loses at most the line being written
+        self._f.write(json.dumps(event) + "\n")
+        self._f.flush()
+
+    def running(self, src):
+        self._write({"event": "running", "src": src})
+
+    def done(self, src, out):
+        st = os.stat(src)
+        self._write({"event": "done", "src": src, "out": out, "out_size": os.path.getsize(out),
+                     "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+
+    def failed(self, src, error):
+        self._write({"event": "failed", "src": src, "error": error})
+
+    def close(self, finished):
+        """finished=True removes the journal; otherwise it stays so the next run can resume."""
+        if self._f is None:
+            return
+        self._write({"event": "finished" if finished else "stopped", "time": time.time()})
+        self._f.close()
+        self._f = None
+        if finished:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,191 @@
+import os
+import hashlib
+from collections import OrderedDict
+from PyQt5 import QtWidgets, QtCore, QtGui
+from PIL import Image
+
+# Model/view file list with lazily loaded thumbnails, shared by the image tools.
+# Handles very large batches: de-dup is a set lookup, inserts are one batch,
+# and thumbnails are only made for rows the view actually paints.
+
+THUMB_SIZE = 48
+
+def get_thumbnail_cache_path():
+    folder = os.path.join(os.path.expanduser("~"), ".coke_media_center", "thumbnails")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+class ThumbnailSignals(QtCore.QObject):
+    ready_signal = QtCore.pyqtSignal(str, QtGui.QImage)
+
+class ThumbnailTask(QtCore.QRunnable):
+    def __init__(self, path, cache_dir, signals):
+        super().__init__()
+        self.path = path
+        self.cache_dir = cache_dir
+        self.signals = signals
+
+    def run(self):
+        try:
+            st = os.stat(self.path)
+            key = hashlib.sha1(f"{self.path}|{st.st_mtime_ns}|{st.st_size}|{THUMB_SIZE}".encode()).hexdigest()
+            cached = os.path.join(self.cache_dir, key + ".png")
+            image = QtGui.QImage(cached) if os.path.exists(cached) else QtGui.QImage()
+            if image.isNull():
+                with Image.open(self.path) as img:
+                    # thumbnail() drafts JPEGs, so big photos are never fully decoded here
+                    img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+                    img = img.convert("RGBA")
+                    img.save(cached, "PNG")
+                    data = img.tobytes("raw", "RGBA")
+                    image = QtGui.QImage(data, img.width, img.height, QtGui.QImage.Format_RGBA8888).copy()
+        except Exception:
+            image = QtGui.QImage()
+        self.signals.ready_signal.emit(self.path, image)
+
+class ImageListModel(QtCore.QAbstractListModel):
+    def __init__(self, max_thumb_bytes=64 * 1024 * 1024, parent=None):
+        super().__init__(parent)
+        self._paths = []
+        self._rows = {}                 # path -> row, doubles as the de-dup index
+        self._status = {}               # path -> (color, tooltip)
+        self._thumbs = OrderedDict()    # path -> (QIcon, bytes), least recently used first
+        self._thumb_bytes = 0
+        self.max_thumb_bytes = max_thumb_bytes
+        self._requested = set()
+        self._priority = 0
+        self.cache_dir = get_thumbnail_cache_path()
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(4, QtCore.QThread.idealThreadCount())))
+        self.signals = ThumbnailSignals()
+        self.signals.ready_signal.connect(self.on_thumbnail_ready)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._paths)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self._paths[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return path
+        if role == QtCore.Qt.DecorationRole:
+            entry = self._thumbs.get(path)
+            if entry is not None:
+                self._thumbs.move_to_end(path)
+                return entry[0]
+            self._request_thumbnail(path)
+            return None
+        if role == QtCore.Qt.ForegroundRole and path in self._status:
+            return QtGui.QBrush(QtGui.QColor(self._status[path][0]))
+        if role == QtCore.Qt.ToolTipRole and path in self._status:
+            return self._status[path][1]
+        return None
+
+    def _request_thumbnail(self, path):
+        if path in self._requested:
+            return
+        self._requested.add(path)
+        # Newest request first, so rows scrolled into view beat ones scrolled past
+        self._priority += 1
+        self.pool.start(ThumbnailTask(path, self.cache_dir, self.signals), self._priority)
+
+    def on_thumbnail_ready(self, path, image):
+        self._requested.discard(path)
+        row = self._rows.get(path)
+        if row is None or image.isNull():
+            return
+        self._thumbs[path] = (QtGui.QIcon(QtGui.QPixmap.fromImage(image)), image.sizeInBytes())
+        self._thumb_bytes += image.sizeInBytes()
+        while self._thumb_bytes > self.max_thumb_bytes and len(self._thumbs) > 1:
+            _, (_, nbytes) = self._thumbs.popitem(last=False)
+            self._thumb_bytes -= nbytes
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def add_paths(self, paths):
+        new = []
+        seen = set()
+        for p in paths:
+            if p and p not in self._rows and p not in seen:
+                seen.add(p)
+                new.append(p)
+        if new:
+            first = len(self._paths)
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(new) - 1)
+            for i, p in enumerate(new):
+                self._rows[p] = first + i
+            self._paths.extend(new)
+            self.endInsertRows()
+        return new
+
+    def remove_rows(self, rows):
+        drop = set(rows)
+        if not drop:
+            return
+        self.beginResetModel()
+        for r in drop:
+            path = self._paths[r]
+            self._status.pop(path, None)
+            # Removed rows give their thumbnail budget back to the rows still listed
+            entry = self._thumbs.pop(path, None)
+            if entry is not None:
+                self._thumb_bytes -= entry[1]
+        self._paths = [p for i, p in enumerate(self._paths) if i not in drop]
+        self._rows = {p: i for i, p in enumerate(self._paths)}
+        self.endResetModel()
+
+    def paths(self):
+        return list(self._paths)
+
+    def row_of(self, path):
+        return self._rows.get(path)
+
+    def set_status(self, path, color, tooltip=""):
+        row = self._rows.get(path)
+        if row is None:
+            return
+        self._status[path] = (color, tooltip)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [QtCore.Qt.ForegroundRole, QtCore.Qt.ToolTipRole])
+
+    def clear_status(self):
+        self._status.clear()
+        if self._paths:
+            self.dataChanged.emit(self.index(0), self.index(len(self._paths) - 1),
+                                  [QtCore.Qt.ForegroundRole, QtCore.Qt.ToolTipRole])
+
+class ImageListView(QtWidgets.QListView):
+    """QListView + ImageListModel with the small API the image tools need."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.list_model = ImageListModel(parent=self)
+        self.setModel(self.list_model)
+        # Uniform rows let the view skip measuring every item, which is what keeps 100k rows instant
+        self.setUniformItemSizes(True)
+        self.setIconSize(QtCore.QSize(THUMB_SIZE, THUMB_SIZE))
+        self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+
+    def add_files(self, paths):
+        return self.list_model.add_paths(paths)
+
+    def files(self):
+        return self.list_model.paths()
+
+    def count(self):
+        return self.list_model.rowCount()
+
+    def remove_selected(self):
+        self.list_model.remove_rows(index.row() for index in self.selectedIndexes())
+
+    def set_status(self, path, color, tooltip=""):
+        self.list_model.set_status(path, color, tooltip)
+
+    def clear_status(self):
+        self.list_model.clear_status()
+
+    def scroll_to_file(self, path):
+        row = self.list_model.row_of(path)
+        if row is not None:
+            self.scrollTo(self.list_model.index(row))
@@ -0,0 +1,177 @@
+import io
+import math
+import struct
+from PIL import Image, TiffImagePlugin, TiffTags
+
+# Band-by-band decoding for scans too big to hold in memory. A TIFF stores its
+# pixels as independent strips or tiles, so a band of rows can be decoded on
+# its own: the strips it needs are copied into a small in-memory TIFF that
+# Pillow (and libtiff, for compressed files) decodes like any other image.
+
+DEFAULT_MEMORY_CAP_MB = 512
+# Rows per virtual strip when an uncompressed TIFF is stored as one huge strip
+RAW_STRIP_ROWS = 64
+
+# Tags that say how strips/tiles decode; EXIF, XMP, ICC etc. stay out of the band files
+STRUCTURE_TAGS = (256, 257, 258, 259, 262, 266, 277, 278, 284, 317, 320, 322, 323,
+                  338, 339, 347, 529, 530, 531, 532)
+STRIP_OFFSETS, STRIP_BYTE_COUNTS = 273, 279
+TILE_OFFSETS, TILE_BYTE_COUNTS = 324, 325
+
+def open_unbounded(path):
+    """Image.open without the decompression-bomb guard, for images that can be decoded in bands.
+
+    Callers check decoded_bytes() themselves, and within_bomb_limit() for
+    anything they decode whole.
+
+    Image.MAX_IMAGE_PIXELS is left alone, since other threads (the GUI's
+    thumbnail pool) open files under it. An image over the limit is opened by
+    its format's plugin directly instead, which is where Image.open checks it.
+    """
+    try:
+        return Image.open(path)
+    except Image.DecompressionBombError:
+        pass
+    Image.init()
+    with open(path, "rb") as f:
+        prefix = f.read(16)
+    for fmt in Image.ID:
+        factory, accept = Image.OPEN[fmt]
+        ok = accept(prefix) if accept else True
+        if not ok or isinstance(ok, str):
+            continue
+        try:
+            return factory(path)
+        except (SyntaxError, IndexError, TypeError, struct.error):
+            continue
+    raise Image.UnidentifiedImageError(f"cannot identify image file {path!r}")
+
+def within_bomb_limit(size):
+    """Whether Image.open would have opened an image this size (up to twice MAX_IMAGE_PIXELS)."""
+    return not Image.MAX_IMAGE_PIXELS or size[0] * size[1] <= 2 * Image.MAX_IMAGE_PIXELS
+
+def decoded_bytes(size, mode):
+    """What Pillow allocates for a fully decoded image of this size and mode."""
+    if mode in ("1", "L", "P"):
+        per_pixel = 1
+    elif mode.startswith("I;16"):
+        per_pixel = 2
+    else:
+        per_pixel = 4
+    return size[0] * size[1] * per_pixel
+
+class TiffBands:
+    """Decodes a TIFF one band of rows at a time.
+
+    Raises ValueError if the file's layout does not allow it: planar
+    (non-interleaved) samples, or a compressed image stored as a single strip.
+    """
+
+    def __init__(self, path, img):
+        if img.format != "TIFF":
+            raise ValueError("only TIFF files can be processed in bands")
+        tags = img.tag_v2
+        if tags.get(284, 1) != 1:
+            raise ValueError("planar TIFFs cannot be processed in bands")
+        self.path = path
+        self.mode = img.mode
+        # Stored dimensions: Pillow reports img.size already turned by the orientation tag,
+        # but strips run down the stored rows. transform_banded rotates the result.
+        self.width, self.height = tags[256], tags[257]
+        self.tags = {t: (tags[t], tags.tagtype[t]) for t in STRUCTURE_TAGS if t in tags}
+        self.tiled = TILE_OFFSETS in tags
+        if self.tiled:
+            self.unit_height = tags[323]
+            self.across = math.ceil(self.width / tags[322])
+            self.offsets, self.counts = tags[TILE_OFFSETS], tags[TILE_BYTE_COUNTS]
+            return
+        rows = min(tags.get(278, self.height), self.height)
+        offsets, counts = tags[STRIP_OFFSETS], tags[STRIP_BYTE_COUNTS]
+        if rows > RAW_STRIP_ROWS:
+            if tags.get(259, 1) != 1:
+                if len(offsets) == 1:
+                    raise ValueError("compressed single-strip TIFFs cannot be processed in bands")
+            else:
+                # Uncompressed rows sit back to back, so big strips can be cut into small virtual ones
+                bits = self.tags[258][0] if 258 in self.tags else 1
+                row_bytes = math.ceil(self.width * (sum(bits) if isinstance(bits, tuple) else bits) / 8)
+                step = next(d for d in range(RAW_STRIP_ROWS, 0, -1) if rows % d == 0)
+                offsets = [offsets[y // rows] + (y % rows) * row_bytes for y in range(0, self.height, step)]
+                counts = [min(step, self.height - y) * row_bytes for y in range(0, self.height, step)]
+                rows = step
+        self.unit_height = rows
+        self.offsets, self.counts = offsets, counts
+
+    def band(self, y0, y1):
+        """Decode whole strips/tiles covering rows y0..y1; returns (first row, image)."""
+        first = y0 // self.unit_height
+        last = min(math.ceil(y1 / self.unit_height), math.ceil(self.height / self.unit_height))
+        top = first * self.unit_height
+        rows = min(last * self.unit_height, self.height) - top
+        if self.tiled:
+            units = [r * self.across + c for r in range(first, last) for c in range(self.across)]
+        else:
+            units = list(range(first, last))
+        with open(self.path, "rb") as f:
+            chunks = []
+            for u in units:
+                f.seek(self.offsets[u])
+                chunks.append(f.read(self.counts[u]))
+        data = self._band_file(rows, chunks)
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return top, img
+
+    def _band_file(self, rows, chunks):
+        ifd = TiffImagePlugin.ImageFileDirectory_v2()
+        for tag, (value, tagtype) in self.tags.items():
+            ifd[tag] = value
+            ifd.tagtype[tag] = tagtype
+        ifd[257] = rows
+        ifd.tagtype[257] = TiffTags.LONG
+        if not self.tiled:
+            ifd[278] = self.unit_height
+            ifd.tagtype[278] = TiffTags.LONG
+        offset_tag, count_tag = (TILE_OFFSETS, TILE_BYTE_COUNTS) if self.tiled else (STRIP_OFFSETS, STRIP_BYTE_COUNTS)
+        starts = [0]
+        for chunk in chunks[:-1]:
+            starts.append(starts[-1] + len(chunk))
+        ifd[count_tag] = tuple(len(c) for c in chunks)
+        ifd.tagtype[count_tag] = TiffTags.LONG
+        header = b"II*\x00" + struct.pack("<L", 8)
+        if self.tiled:
+            # Pillow only relocates strip offsets, so tile offsets are made absolute in two passes
+            ifd[offset_tag] = tuple(starts)
+            ifd.tagtype[offset_tag] = TiffTags.LONG
+            base = len(header) + len(ifd.tobytes(len(header)))
+            ifd[offset_tag] = tuple(base + s for s in starts)
+        else:
+            # tobytes() shifts strip offsets to just past the directory it writes
+            ifd[offset_tag] = tuple(starts)
+            ifd.tagtype[offset_tag] = TiffTags.LONG
+        return header + ifd.tobytes(len(header)) + b"".join(chunks)
+
+    def reduce(self, box, factor, max_band_bytes):
+        """Decode box band by band, box-averaging each band by factor; never holds more than one band."""
+        left, top, right, bottom = box
+        # Decoded band, its cropped copy and the compressed strips all live at once
+        row_cost = decoded_bytes((self.width, 1), self.mode) * 3
+        band_rows = max(factor, max_band_bytes // max(1, row_cost) // factor * factor)
+        out = None
+        y = top
+        while y < bottom:
+            y1 = min(y + band_rows, bottom)
+            band_top, band = self.band(y, y1)
+            part = band.crop((left, y - band_top, right, y1 - band_top))
+            del band
+            if part.mode in ("1", "P"):
+                part = part.convert("RGBA" if "transparency" in part.info else "RGB")
+            elif part.mode.startswith("I;16"):
+                part = part.convert("I")
+            if factor > 1:
+                part = part.reduce(factor)
+            if out is None:
+                out = Image.new(part.mode, (math.ceil((right - left) / factor), math.ceil((bottom - top) / factor)))
+            out.paste(part, (0, (y - top) // factor))
+            y = y1
+        return out
@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff", ".gif")
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+class FolderWatcher:
+    """Reports image files dropped into a folder once they have stopped changing.
+
+    Uses watchdog (inotify / ReadDirectoryChangesW) when it is installed,
+    otherwise polls the folder with os.scandir.
+    """
+
+    def __init__(self, folder, settle_seconds=2.0, poll_interval=1.0, extensions=IMAGE_EXTS):
+        self.folder = folder
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.extensions = extensions
+        self._lock = threading.Lock()
+        self._candidates = {}   # path -> (size, mtime_ns, time the signature was last seen changing)
+        self._reported = {}     # path -> mtime_ns it was reported at
+        self._observer = None
+        self._poll_thread = None
+        self._stop_requested = False
+
+    @property
+    def backend(self):
+        return "watchdog" if self._observer else "polling"
+
+    def start(self):
+        self._stop_requested = False
+        # Pick up whatever is already in the folder
+        self._scan()
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.folder, recursive=False)
+            self._observer.start()
+        else:
+            self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self._poll_thread.start()
+
+    def stop(self):
+        self._stop_requested = True
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._poll_thread:
+            self._poll_thread.join()
+            self._poll_thread = None
+
+    def notify(self, path):
+        if not path.lower().endswith(self.extensions):
+            return
+        with self._lock:
+            # Signature is filled in on the next ready_files() pass
+            self._candidates.setdefault(path, (None, None, time.monotonic()))
+
+    def _scan(self):
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(self.extensions):
+                continue
+            try:
+                mtime_ns = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+            # Only files that are new or changed since they were reported become candidates
+            if self._reported.get(entry.path) != mtime_ns:
+                self.notify(entry.path)
+
+    def _poll_loop(self):
+        while not self._stop_requested:
+            time.sleep(self.poll_interval)
+            self._scan()
+
+    def ready_files(self):
+        """Return candidates whose size and mtime have been stable for settle_seconds."""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            candidates = list(self._candidates.items())
+        for path, (size, mtime_ns, since) in candidates:
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Deleted or renamed away before it settled
+                with self._lock:
+                    self._candidates.pop(path, None)
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                with self._lock:
+                    self._candidates[path] = (st.st_size, st.st_mtime_ns, now)
+                continue
+            if now - since < self.settle_seconds or st.st_size == 0:
+                continue
+            try:
+                # Writers on Windows hold the file exclusively until they are done
+                with open(path, "rb"):
+                    pass
+            except OSError:
+                continue
+            with self._lock:
+                self._candidates.pop(path, None)
+            if self._reported.get(path) != st.st_mtime_ns:
+                self._reported[path] = st.st_mtime_ns
+                ready.append(path)
+        return ready
@@ -0,0 +1,577 @@
+import io
+import os
+import sys
+import json
+import time
+import bisect
+import argparse
+import tempfile
+import subprocess
+from PIL import Image, ImageDraw
+from image_benchmark import peak_rss_mb
+from pdf_core import (StreamingPdfWriter, PdfMergeEngine, PdfSplitEngine, PdfCompressEngine, every_n_groups,
+                      split_output_path, probe_pdf, compress_pdf, find_ghostscript)
+
+# Benchmarks for the PDF tools. Like image_benchmark.py, each case runs in a
+# fresh interpreter so its peak RSS is its own.
+
+def make_logo():
+    buf = io.BytesIO()
+    Image.radial_gradient("L").resize((120, 120)).convert("RGB").save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+def make_paper(scan_size=(850, 1100)):
+    return Image.effect_mandelbrot(scan_size, (-2.0, -1.2, 1.0, 1.2), 60)
+
+def make_scan_pdf(path, pages=2, seed=0, logo=None, paper=None):
+    """Deterministic "scanned" PDF: a unique JPEG page image each, plus a logo and font shared by every file."""
+    paper = paper or make_paper()
+    scan_size = paper.size
+    with open(path, "wb") as f:
+        w = StreamingPdfWriter(f)
+        root = w.reserve()
+        font = w.add_object(b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica>>")
+        logo = logo or make_logo()
+        logo_num = w.add_object(b"<</Type /XObject /Subtype /Image /Width 120 /Height 120 /ColorSpace /DeviceRGB "
+                                b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d>>\nstream\n" % len(logo)
+                                + logo + b"\nendstream")
+        kids = []
+        for p in range(pages):
+            # Shifted paper texture plus printed text, so no two scans encode the same
+            scan = paper.rotate(0, translate=((seed * 37 + p * 11) % 200 - 100, (seed * 17) % 100 - 50))
+            draw = ImageDraw.Draw(scan)
+            draw.rectangle((50, 50, 250, 80), fill=255)
+            draw.text((60, 60), f"File {seed} page {p + 1}", fill=0)
+            buf = io.BytesIO()
+            scan.save(buf, "JPEG", quality=70)
+            data = buf.getvalue()
+            image = w.add_object(b"<</Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                                 b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d>>\nstream\n"
+                                 % (scan_size[0], scan_size[1], len(data)) + data + b"\nendstream")
+            text = b"q 612 0 0 792 0 0 cm /Scan Do Q q 40 0 0 40 556 736 cm /Logo Do Q " \
+                   b"BT /F1 10 Tf 36 20 Td (File %d page %d) Tj ET" % (seed, p + 1)
+            content = w.add_object(b"<</Length %d>>\nstream\n" % len(text) + text + b"\nendstream")
+            kids.append(w.add_object(
+                b"<</Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                b"/Resources <</Font <</F1 %d 0 R>> /XObject <</Scan %d 0 R /Logo %d 0 R>>>>>>"
+                % (root, content, font, image, logo_num)))
+        w.write_object(root, b"<</Type /Pages /Count %d /Kids [%s]>>"
+                       % (len(kids), b" ".join(b"%d 0 R" % k for k in kids)))
+        w.finish(w.add_object(b"<</Type /Catalog /Pages %d 0 R>>" % root))
+
+def make_scan_set(folder, files, pages, scan_size=(850, 1100)):
+    logo = make_logo()
+    paper = make_paper(scan_size)
+    paths = []
+    for i in range(files):
+        path = os.path.join(folder, f"scan-{i:05d}.pdf")
+        make_scan_pdf(path, pages, seed=i, logo=logo, paper=paper)
+        paths.append(path)
+    return paths
+
+def child_merge(args):
+    # args: <mode merger|stream> <output> <input folder>
+    mode, output, folder = args
+    files = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    start = time.perf_counter()
+    if mode == "merger":
+        # What PDFMergeUI.merge_pdfs used to do: everything in one PdfMerger, written at the end
+        from PyPDF2 import PdfMerger
+        merger = PdfMerger()
+        for f in files:
+            merger.append(f)
+        merger.write(output)
+        merger.close()
+        extra = {}
+    else:
+        engine = PdfMergeEngine()
+        for _ in engine.run(files, output):
+            pass
+        extra = {"shared_objects": engine.shared_objects, "shared_mb": round(engine.shared_bytes / 1048576, 2)}
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+    return {
+        "case": f"merge-{mode}",
+        "files": len(files),
+        "seconds": round(seconds, 2),
+        "files_per_s": round(len(files) / seconds, 1),
+        "out_mb": round(os.path.getsize(output) / 1048576, 1),
+        "peak_rss_mb": rss and round(rss, 1),
+        **extra,
+    }
+
+def child_split(args):
+    # args: <mode reparse|engine> <source> <outdir> <pages per output> <workers>
+    mode, src, outdir, per_file, workers = args
+    from PyPDF2 import PdfReader, PdfWriter
+    total = len(PdfReader(src).pages)
+    groups = every_n_groups(total, int(per_file))
+    jobs = [(g, split_output_path(os.path.join(outdir, "part.pdf"), i + 1)) for i, g in enumerate(groups)]
+    start = time.perf_counter()
+    if mode == "reparse":
+        # What PDFSplitterUI.split_pdf does once per output: open, parse, copy the pages, write
+        for pages, output in jobs:
+            with open(src, "rb") as f:
+                pdf = PdfReader(f)
+                writer = PdfWriter()
+                for p in pages:
+                    writer.add_page(pdf.pages[p])
+                with open(output, "wb") as out:
+                    writer.write(out)
+    else:
+        for result in PdfSplitEngine(int(workers)).run(src, jobs):
+            if not result["ok"]:
+                raise SystemExit(result["error"])
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+    return {
+        "case": f"split-{mode}" + (f"-w{workers}" if mode == "engine" else ""),
+        "outputs": len(jobs),
+        "pages": total,
+        "seconds": round(seconds, 2),
+        "pages_per_s": round(total / seconds, 1),
+        "peak_rss_mb": rss and round(rss, 1),
+    }
+
+def child_probe(args):
+    # args: <mode reader|probe> <source>
+    mode, src = args
+    start = time.perf_counter()
+    if mode == "reader":
+        # What PDFSplitterUI.select_pdf used to do on the UI thread
+        from PyPDF2 import PdfReader
+        with open(src, "rb") as f:
+            pages = len(PdfReader(f).pages)
+    else:
+        info = probe_pdf(src)
+        pages = info["pages"]
+        if info["probe"] != "xref":
+            raise SystemExit(f"{src}: probe fell back to a full parse")
+    seconds = time.perf_counter() - start
+    cached = time.perf_counter()
+    if mode == "probe":
+        probe_pdf(src)
+    rss = peak_rss_mb()
+    return {
+        "case": f"probe-{mode}-{os.path.splitext(os.path.basename(src))[0]}",
+        "mb": round(os.path.getsize(src) / 1048576, 1),
+        "pages": pages,
+        "ms": round(seconds * 1000, 2),
+        **({"cached_ms": round((time.perf_counter() - cached) * 1000, 3)} if mode == "probe" else {}),
+        "peak_rss_mb": rss and round(rss, 1),
+    }
+
+def child_compress(args):
+    # args: <backend> <preset> <input folder> <outdir> <workers>
+    backend, preset, folder, outdir, workers = args
+    files = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    engine = PdfCompressEngine(int(workers), backend)
+    start = time.perf_counter()
+    results = list(engine.run([(f, os.path.join(outdir, os.path.basename(f))) for f in files], preset))
+    seconds = time.perf_counter() - start
+    failed = [r["error"] for r in results if not r["ok"]]
+    if failed:
+        raise SystemExit(failed[0])
+    in_bytes, out_bytes = sum(r["in_bytes"] for r in results), sum(r["out_bytes"] for r in results)
+    rss = peak_rss_mb()
+    return {
+        "case": f"compress-{engine.backend}-{preset}-w{workers}",
+        "files": len(files),
+        "seconds": round(seconds, 2),
+        "file_seconds_p50": round(sorted(r["seconds"] for r in results)[len(results) // 2], 2),
+        "in_mb": round(in_bytes / 1048576, 1),
+        "out_mb": round(out_bytes / 1048576, 1),
+        "ratio": round(out_bytes / in_bytes, 3),
+        "peak_rss_mb": rss and round(rss, 1),
+    }
+
+def child_optimize(args):
+    # args: <mode full|ghostscript|optimize> <source> <output> <workers>
+    mode, src, output, workers = args
+    start = time.perf_counter()
+    extra = {}
+    if mode == "full":
+        # Every image on every page decoded and re-encoded, then every stream recompressed:
+        # the per-page pass the pikepdf compressor made before it used pdf_optimize
+        import pikepdf
+        with pikepdf.open(src) as pdf:
+            for page in pdf.pages:
+                max_width = round(float(page.mediabox[2]) / 72 * 150)
+                for image in page.get_images().values():
+                    img = pikepdf.PdfImage(image).as_pil_image()
+                    if img.width > max_width:
+                        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+                    buf = io.BytesIO()
+                    img.save(buf, "JPEG", quality=60, optimize=True)
+                    image.write(buf.getvalue(), filter=pikepdf.Name.DCTDecode)
+                    image.Width, image.Height = img.size
+            pdf.save(output, recompress_flate=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    elif mode == "ghostscript":
+        result = compress_pdf(src, output, "ebook", "ghostscript", find_ghostscript())
+        if not result["ok"]:
+            raise SystemExit(result["error"])
+    else:
+        from pdf_optimize import optimize_pdf
+        stats = optimize_pdf(src, output, 150, 60, int(workers))
+        extra = {k: stats[k] for k in ("images", "duplicates", "resampled", "kept", "skipped")}
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+    return {
+        "case": f"optimize-{mode}" + (f"-w{workers}" if mode == "optimize" else ""),
+        "seconds": round(seconds, 2),
+        "in_mb": round(os.path.getsize(src) / 1048576, 1),
+        "out_mb": round(os.path.getsize(output) / 1048576, 1),
+        "peak_rss_mb": rss and round(rss, 1),
+        **extra,
+    }
+
+def make_dedup_pdf():
+    """In-memory pikepdf.Pdf whose images share their pixel bytes but not always their nested streams.
+
+    Returns (pdf, {resource name: byte that name's soft mask or lookup table must still hold}).
+    """
+    import pikepdf
+    pdf = pikepdf.new()
+    pixels = bytes(range(256))
+
+    def stream(data, **entries):
+        return pdf.make_indirect(pikepdf.Stream(pdf, data, Type=pikepdf.Name.XObject, Subtype=pikepdf.Name.Image,
+                                                Width=16, Height=16, BitsPerComponent=8, **entries))
+
+    def masked(alpha):
+        return stream(pixels * 3, ColorSpace=pikepdf.Name.DeviceRGB,
+                      SMask=stream(bytes([alpha]) * 256, ColorSpace=pikepdf.Name.DeviceGray))
+
+    def indexed(colour):
+        lookup = pdf.make_indirect(pikepdf.Stream(pdf, bytes([colour]) * 6))
+        return stream(bytes(i % 2 for i in range(256)),
+                      ColorSpace=pikepdf.Array([pikepdf.Name.Indexed, pikepdf.Name.DeviceRGB, 1, lookup]))
+
+    # Clear and Opaque differ only in their soft mask; Opaque2 is a true copy of Opaque
+    xobjects = {"/Clear": masked(0x00), "/Opaque": masked(0xFF), "/Opaque2": masked(0xFF),
+                "/Black": indexed(0x00), "/White": indexed(0xFF)}
+    page = pdf.add_blank_page(page_size=(612, 792))
+    page.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(xobjects))
+    page.Contents = pdf.make_stream(b"".join(b"q 100 0 0 100 %d 600 cm %s Do Q " % (i * 110, name.encode())
+                                             for i, name in enumerate(xobjects)))
+    return pdf, {"/Clear": 0x00, "/Opaque": 0xFF, "/Opaque2": 0xFF, "/Black": 0x00, "/White": 0xFF}
+
+def child_optimize_dedup(args):
+    # Images differing only in a nested stream (soft mask, indexed lookup) must not be merged
+    from pdf_optimize import optimize_images
+    pdf, want = make_dedup_pdf()
+    stats = optimize_images(pdf, workers=1)
+    xobjects = pdf.pages[0].Resources.XObject
+    failures = []
+    for name, byte in want.items():
+        image = xobjects[name]
+        nested = image.SMask if "/SMask" in image else image.ColorSpace[3]
+        if nested.read_bytes()[0] != byte:
+            failures.append(f"{name} now draws with {nested.read_bytes()[0]:#04x}, expected {byte:#04x}")
+    if stats["duplicates"] != 1:
+        failures.append(f"{stats['duplicates']} duplicates merged, expected 1 (Opaque2)")
+    if failures:
+        raise SystemExit("\n".join(failures))
+    return {"case": "optimize-dedup", "images": stats["images"], "duplicates": stats["duplicates"]}
+
+def first_page_end(path):
+    """(offset where the last object page 1 needs ends, linearized?) for a finished PDF.
+
+    Page 1's objects are everything reachable from it (not through /Parent or
+    /Annots), plus the catalog. Linearized files put them all up front (their
+    /E); otherwise the catalog and xref at the end make a viewer wait for it.
+    """
+    import pikepdf
+    size = os.path.getsize(path)
+    with pikepdf.open(path) as pdf:
+        table = pdf.get_xref_table()
+        starts = sorted(e.offset for e in table.values() if e.type == 1)
+
+        def end_of(objgen):
+            entry = table[objgen]
+            if entry.type == 2:
+                entry = table[(entry.obj_stream_number, 0)]
+            i = bisect.bisect_right(starts, entry.offset)
+            return starts[i] if i < len(starts) else size
+
+        needed = {pdf.Root.objgen}
+        stack = [pdf.pages[0].obj]
+        while stack:
+            obj = stack.pop()
+            if getattr(obj, "is_indirect", False):
+                if obj.objgen in needed:
+                    continue
+                needed.add(obj.objgen)
+            if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+                stack.extend(v for k, v in obj.items() if k not in ("/Parent", "/Annots"))
+            elif isinstance(obj, pikepdf.Array):
+                stack.extend(obj)
+        return max(end_of(g) for g in needed if g in table), pdf.is_linearized
+
+def child_output(args):
+    # args: <merge|split> <compact 0|1> <linearize 0|1> <input folder or source> <output folder>
+    kind, compact, linearize, src, outdir = args
+    compact, linearize = compact == "1", linearize == "1"
+    start = time.perf_counter()
+    if kind == "merge":
+        files = sorted(os.path.join(src, name) for name in os.listdir(src))
+        outputs = [os.path.join(outdir, "merged.pdf")]
+        for _ in PdfMergeEngine(compact, linearize).run(files, outputs[0]):
+            pass
+    else:
+        from PyPDF2 import PdfReader
+        groups = every_n_groups(len(PdfReader(src).pages), 10)
+        jobs = [(g, split_output_path(os.path.join(outdir, "part.pdf"), i + 1)) for i, g in enumerate(groups)]
+        outputs = [output for _, output in jobs]
+        for result in PdfSplitEngine(1, compact, linearize).run(src, jobs):
+            if not result["ok"]:
+                raise SystemExit(result["error"])
+    seconds = time.perf_counter() - start
+    ends = [first_page_end(output) for output in outputs]
+    size = sum(os.path.getsize(output) for output in outputs)
+    for output in outputs:
+        os.remove(output)
+    return {
+        "case": f"{kind}-" + ("compact" if compact else "plain") + ("-linearized" if linearize else ""),
+        "outputs": len(outputs),
+        "seconds": round(seconds, 2),
+        "bytes": size,
+        # Split: summed over the parts; merge: the one output
+        "first_page_end": sum(end for end, _ in ends),
+        "linearized": all(lin for _, lin in ends),
+    }
+
+def child_ui(args):
+    # args: <mode blocking|worker|cancel> <output> <input folder>
+    # A 60 Hz timer stands in for the window repainting; its tick gaps are the UI's frame times
+    mode, output, folder = args
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtCore, QtWidgets
+    from pdf_merge import MergeWorker
+    app = QtWidgets.QApplication([])
+    files = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+    ticks, updates, state = [], [0], {}
+    timer = QtCore.QTimer()
+    timer.setTimerType(QtCore.Qt.PreciseTimer)
+    timer.timeout.connect(lambda: ticks.append(time.perf_counter()))
+
+    def finished(ok, msg):
+        state.update(ok=ok, end=time.perf_counter())
+        app.quit()
+
+    def start():
+        state["start"] = time.perf_counter()
+        if mode == "blocking":
+            # What PDFMergeUI.merge_pdfs did before the merge moved off the GUI thread
+            for _ in PdfMergeEngine().run(files, output):
+                pass
+            finished(True, "")
+            return
+        worker = state["worker"] = MergeWorker(files, output)
+        worker.progress_signal.connect(lambda done, total: updates.__setitem__(0, updates[0] + 1))
+        worker.finished_signal.connect(finished)
+        if mode == "cancel":
+            def cancel():
+                state["cancel"] = time.perf_counter()
+                worker.stop()
+            # Cancel half way, whatever the machine's speed
+            worker.progress_signal.connect(lambda done, total: total and done >= total // 2
+                                           and "cancel" not in state and cancel())
+        worker.start()
+
+    timer.start(16)
+    QtCore.QTimer.singleShot(0, start)
+    app.exec_()
+    timer.stop()
+    if "worker" in state:
+        state["worker"].wait()
+    gaps = sorted(b - a for a, b in zip(ticks, ticks[1:]) if a >= state["start"]) or [state["end"] - state["start"]]
+    seconds = state["end"] - state["start"]
+    leftovers = [name for name in os.listdir(os.path.dirname(output)) if name.endswith(".tmp")]
+    result = {
+        "case": f"ui-{mode}",
+        "files": len(files),
+        "seconds": round(seconds, 2),
+        # A blocked event loop never ticks: the whole merge is one frame
+        "frames_per_s": round(len(gaps) / seconds, 1) if len(gaps) > 1 else round(1 / seconds, 2),
+        "frame_p50_ms": round(gaps[len(gaps) // 2] * 1000, 1),
+        "frame_p99_ms": round(gaps[min(len(gaps) - 1, len(gaps) * 99 // 100)] * 1000, 1),
+        "frame_max_ms": round(gaps[-1] * 1000, 1),
+        "progress_updates": updates[0],
+    }
+    if mode == "cancel":
+        result.update(cancel_ms=round((state["end"] - state["cancel"]) * 1000, 1),
+                      output_exists=os.path.exists(output), temp_files_left=len(leftovers))
+    elif os.path.exists(output):
+        os.remove(output)
+    return result
+
+def child_append(args):
+    # args: <mode merger|stream|append> <archive> <new pages> <output>
+    mode, archive, addition, output = args
+    before = os.path.getsize(archive)
+    start = time.perf_counter()
+    if mode == "merger":
+        # What PDFMergeUI.merge_pdfs used to do: the whole archive goes through PdfMerger again
+        from PyPDF2 import PdfMerger
+        merger = PdfMerger()
+        merger.append(archive)
+        merger.append(addition)
+        merger.write(output)
+        merger.close()
+    elif mode == "stream":
+        for _ in PdfMergeEngine().run([archive, addition], output):
+            pass
+    else:
+        for _ in PdfMergeEngine().append(archive, [addition]):
+            pass
+        output = archive
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+    size = os.path.getsize(output)
+    result = {
+        "case": f"append-{mode}",
+        "archive_mb": round(before / 1048576, 1),
+        "seconds": round(seconds, 3),
+        "written_mb": round((size - before if mode == "append" else size) / 1048576, 2),
+        "pages": probe_pdf(output)["pages"],
+        "peak_rss_mb": rss and round(rss, 1),
+    }
+    if output != archive:
+        os.remove(output)
+    return result
+
+CHILD_CASES = {"merge": child_merge, "split": child_split, "probe": child_probe, "compress": child_compress,
+               "optimize": child_optimize, "optimize-dedup": child_optimize_dedup, "output": child_output,
+               "ui": child_ui, "append": child_append}
+
+def run_child(name, args):
+    print(json.dumps(CHILD_CASES[name](args)))
+
+def spawn(name, *args):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, *map(str, args)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+def bench_merge(opts, workdir):
+    folder = os.path.join(workdir, "inputs")
+    os.makedirs(folder)
+    make_scan_set(folder, opts.files, opts.pages)
+    results = []
+    for mode in ("merger", "stream"):
+        output = os.path.join(workdir, f"{mode}.pdf")
+        results.append(spawn("merge", mode, output, folder))
+        os.remove(output)
+    return results
+
+def bench_split(opts, workdir):
+    src = os.path.join(workdir, "book.pdf")
+    make_scan_pdf(src, opts.split_pages, seed=1)
+    outdir = os.path.join(workdir, "parts")
+    os.makedirs(outdir)
+    results = [spawn("split", "reparse", src, outdir, opts.per_file, 1)]
+    for workers in opts.workers:
+        results.append(spawn("split", "engine", src, outdir, opts.per_file, workers))
+    return results
+
+def bench_probe(opts, workdir):
+    src = os.path.join(workdir, "classic.pdf")
+    make_scan_pdf(src, opts.probe_pages, seed=2)
+    sources = [src]
+    try:
+        import pikepdf
+    except ImportError:
+        pikepdf = None
+    if pikepdf:
+        # The same document with an xref stream and object streams, and linearized
+        for name, kwargs in (("objstm", {"object_stream_mode": pikepdf.ObjectStreamMode.generate}),
+                             ("linearized", {"linearize": True})):
+            with pikepdf.open(src) as pdf:
+                pdf.save(os.path.join(workdir, f"{name}.pdf"), **kwargs)
+            sources.append(os.path.join(workdir, f"{name}.pdf"))
+    return [spawn("probe", mode, path) for path in sources for mode in ("reader", "probe")]
+
+def bench_compress(opts, workdir):
+    folder = os.path.join(workdir, "inputs")
+    os.makedirs(folder)
+    make_scan_set(folder, opts.compress_files, opts.compress_pages)
+    outdir = os.path.join(workdir, "out")
+    os.makedirs(outdir)
+    return [spawn("compress", opts.backend, opts.preset, folder, outdir, workers) for workers in opts.workers]
+
+def bench_optimize(opts, workdir):
+    # 300 dpi scans, so every page image is twice the 150 dpi target
+    src = os.path.join(workdir, "scans.pdf")
+    make_scan_pdf(src, opts.optimize_pages, seed=4, paper=make_paper((2550, 3300)))
+    output = os.path.join(workdir, "out.pdf")
+    modes = ["full"] + (["ghostscript"] if find_ghostscript() else [])
+    results = [spawn("optimize", mode, src, output, 1) for mode in modes]
+    results += [spawn("optimize", "optimize", src, output, workers) for workers in opts.workers]
+    return results + [spawn("optimize-dedup")]
+
+def bench_output(opts, workdir):
+    folder = os.path.join(workdir, "inputs")
+    os.makedirs(folder)
+    # A small --scan-size makes text-like pages, where object overhead dominates
+    scan_size = tuple(int(v) for v in opts.scan_size.split("x"))
+    make_scan_set(folder, opts.files, opts.pages, scan_size)
+    book = os.path.join(workdir, "book.pdf")
+    make_scan_pdf(book, opts.split_pages, seed=1, paper=make_paper(scan_size))
+    outdir = os.path.join(workdir, "out")
+    os.makedirs(outdir)
+    results = []
+    for kind, src in (("merge", folder), ("split", book)):
+        for compact, linearize in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            results.append(spawn("output", kind, compact, linearize, src, outdir))
+    return results
+
+def bench_ui(opts, workdir):
+    folder = os.path.join(workdir, "inputs")
+    os.makedirs(folder)
+    make_scan_set(folder, max(1, opts.ui_pages // opts.pages), opts.pages)
+    outdir = os.path.join(workdir, "out")
+    os.makedirs(outdir)
+    output = os.path.join(outdir, "merged.pdf")
+    return [spawn("ui", mode, output, folder) for mode in ("blocking", "worker", "cancel")]
+
+def bench_append(opts, workdir):
+    archive = os.path.join(workdir, "archive.pdf")
+    make_scan_pdf(archive, opts.archive_pages, seed=5)
+    addition = os.path.join(workdir, "new.pdf")
+    make_scan_pdf(addition, opts.append_pages, seed=6)
+    output = os.path.join(workdir, "out.pdf")
+    results = [spawn("append", mode, archive, addition, output) for mode in ("merger", "stream")]
+    # Appending changes the archive, so it runs last; again to show repeated appends stay cheap
+    return results + [spawn("append", "append", archive, addition, output) for _ in range(3)]
+
+BENCHES = {"merge": bench_merge, "split": bench_split, "probe": bench_probe, "compress": bench_compress,
+           "optimize": bench_optimize, "output": bench_output, "ui": bench_ui, "append": bench_append}
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        return run_child(sys.argv[2], sys.argv[3:])
+    parser = argparse.ArgumentParser(description="Benchmark the Coke PDF tools.")
+    parser.add_argument("bench", choices=sorted(BENCHES))
+    parser.add_argument("--files", type=int, default=3000, help="synthetic input PDFs (merge, output)")
+    parser.add_argument("--pages", type=int, default=2, help="pages per input PDF (merge, output, ui)")
+    parser.add_argument("--ui-pages", type=int, default=5000, help="pages merged while timing the event loop (ui)")
+    parser.add_argument("--split-pages", type=int, default=2000, help="pages in the document to split (split, output)")
+    parser.add_argument("--per-file", type=int, default=10, help="pages per output file (split)")
+    parser.add_argument("--scan-size", default="850x1100", help="page image pixels, WxH (output)")
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker counts to run (split, compress, optimize)")
+    parser.add_argument("--compress-files", type=int, default=24, help="synthetic input PDFs (compress)")
+    parser.add_argument("--compress-pages", type=int, default=20, help="pages per input PDF (compress)")
+    parser.add_argument("--backend", default="auto", help="auto, ghostscript or pikepdf (compress)")
+    parser.add_argument("--preset", default="ebook", help="compression preset (compress)")
+    parser.add_argument("--optimize-pages", type=int, default=40, help="300 dpi scanned pages (optimize)")
+    parser.add_argument("--probe-pages", type=int, default=1200, help="pages in the document to probe, ~48 KB each (probe)")
+    parser.add_argument("--archive-pages", type=int, default=4000, help="pages in the archive, ~48 KB each (append)")
+    parser.add_argument("--append-pages", type=int, default=10, help="pages appended to the archive (append)")
+    opts = parser.parse_args()
+    opts.workers = [int(v) for v in opts.workers.split(",")]
+    with tempfile.TemporaryDirectory() as workdir:
+        results = BENCHES[opts.bench](opts, workdir)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
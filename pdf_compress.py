@@ -0,0 +1,301 @@
+import sys
+import os
+import multiprocessing
+from PyQt5 import QtWidgets, QtCore
+from pdf_core import PdfCompressEngine, COMPRESS_PRESETS, compress_backends, compressed_output_paths
+from pdf_jobs import PdfJobWorker
+
+BACKEND_LABELS = {"auto": "Auto", "ghostscript": "Ghostscript", "pikepdf": "Built-in (pikepdf)"}
+
+class CompressWorker(PdfJobWorker):
+    # Per-file page (Ghostscript) or image (built-in) counts, for the file list rows
+    page_signal = QtCore.pyqtSignal(str, int, int)
+
+    def __init__(self, files, outdir, preset, engine):
+        super().__init__(engine)
+        self.files = files
+        self.outdir = outdir
+        self.preset = preset
+        self.in_bytes = 0
+        self.out_bytes = 0
+        self.ok = 0
+        self.failed = 0
+
+    def results(self):
+        # Progress is counted in files: the backends report pages or images, not both
+        self.total = len(self.files)
+        jobs = list(zip(self.files, compressed_output_paths(self.files, self.outdir)))
+        for result in self.engine.run(jobs, self.preset, progress=self.page_signal.emit):
+            if result["ok"]:
+                self.ok += 1
+                self.in_bytes += result["in_bytes"]
+                self.out_bytes += result["out_bytes"]
+            else:
+                self.failed += 1
+            self.advance()
+            yield result
+
+    def summary(self):
+        head = "Compression cancelled." if self.cancelled else "Compression finished."
+        msg = f"{head} {self.ok} succeeded, {self.failed} failed in {self.seconds:.1f}s."
+        if self.in_bytes:
+            msg += (f"\n{self.in_bytes / 1048576:.1f} MB -> {self.out_bytes / 1048576:.1f} MB "
+                    f"(saved {(self.in_bytes - self.out_bytes) / 1048576:.1f} MB).")
+        return not self.failed, msg
+
+class PDFCompressorUI(QtWidgets.QWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Coke PDF Compressor")
+        self.resize(800, 600)
+        self.worker = None
+        self.items = {}
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(32, 32, 32, 32)
+        layout.setSpacing(22)
+
+        button_style = """
+            QPushButton {
+                font-size: 18px; background: #bd93f9; color: #23272f; font-weight: bold; border-radius: 7px;
+            }
+            QPushButton:hover { background: #b4aaff; }
+        """
+        combo_style = "background: #282a36; color: #b4aaff; font-size: 17px; border-radius: 7px; padding: 2px 8px;"
+
+        # Title
+        title = QtWidgets.QLabel("PDF Compressor")
+        title.setStyleSheet("font-size: 40px; color: #b4aaff; font-weight: bold;")
+        title.setAlignment(QtCore.Qt.AlignCenter)
+        layout.addWidget(title)
+
+        # File list; each row shows its page progress and then its result
+        self.file_list = QtWidgets.QListWidget()
+        self.file_list.setStyleSheet("""
+            QListWidget {
+                background: #181a20;
+                color: #f8f8f2;
+                font-size: 18px;
+                border: none;
+                border-radius: 10px;
+                padding: 8px;
+            }
+            QListWidget::item:selected {
+                background: #bd93f9;
+                color: #23272f;
+                border-radius: 8px;
+            }
+        """)
+        layout.addWidget(self.file_list, 1)
+
+        # Add & Remove buttons row
+        btn_row = QtWidgets.QHBoxLayout()
+        add_btn = QtWidgets.QPushButton("Add PDFs")
+        add_btn.setStyleSheet(button_style)
+        add_btn.setFixedHeight(38)
+        add_btn.clicked.connect(self.add_files)
+        btn_row.addWidget(add_btn)
+
+        remove_btn = QtWidgets.QPushButton("Remove Selected")
+        remove_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 18px; background: #44475a; color: #f8f8f2; font-weight: bold; border-radius: 7px;
+            }
+            QPushButton:hover { background: #bd93f9; }
+        """)
+        remove_btn.setFixedHeight(38)
+        remove_btn.clicked.connect(self.remove_selected)
+        btn_row.addWidget(remove_btn)
+        layout.addLayout(btn_row)
+
+        # Quality preset, backend and worker count row
+        options_row = QtWidgets.QHBoxLayout()
+        quality_label = QtWidgets.QLabel("Quality:")
+        quality_label.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        options_row.addWidget(quality_label)
+        self.preset_combo = QtWidgets.QComboBox()
+        for key, (label, *_) in COMPRESS_PRESETS.items():
+            self.preset_combo.addItem(label, key)
+        self.preset_combo.setCurrentIndex(self.preset_combo.findData("ebook"))
+        self.preset_combo.setStyleSheet(combo_style)
+        options_row.addWidget(self.preset_combo)
+
+        engine_label = QtWidgets.QLabel("Engine:")
+        engine_label.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        options_row.addWidget(engine_label)
+        self.backend_combo = QtWidgets.QComboBox()
+        available = compress_backends()
+        for key in ["auto"] + available:
+            self.backend_combo.addItem(BACKEND_LABELS[key], key)
+        self.backend_combo.setStyleSheet(combo_style)
+        options_row.addWidget(self.backend_combo)
+
+        workers_label = QtWidgets.QLabel("Workers:")
+        workers_label.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        options_row.addWidget(workers_label)
+        self.workers_spin = QtWidgets.QSpinBox()
+        self.workers_spin.setRange(1, max(64, os.cpu_count() or 1))
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        self.workers_spin.setStyleSheet(combo_style)
+        options_row.addWidget(self.workers_spin)
+        options_row.addStretch(1)
+        layout.addLayout(options_row)
+
+        self.status = QtWidgets.QLabel("")
+        self.status.setStyleSheet("font-size: 18px; color: #d6bfff;")
+        self.status.setWordWrap(True)
+        if "ghostscript" not in available:
+            self.status.setText("Ghostscript not found in PATH; using the built-in compressor "
+                                "(recompresses images and streams)." if available else
+                                "Install Ghostscript or pikepdf (pip install pikepdf) to compress PDFs.")
+
+        # Output folder
+        output_row = QtWidgets.QHBoxLayout()
+        self.output_path = QtWidgets.QLineEdit()
+        self.output_path.setPlaceholderText("Output folder for compressed PDFs")
+        self.output_path.setStyleSheet("background: #181a20; color: #b4aaff; font-size: 17px; border-radius: 7px; border: 1.5px solid #bd93f9; padding-left: 10px;")
+        output_row.addWidget(self.output_path, 1)
+        browse_btn = QtWidgets.QPushButton("Browse")
+        browse_btn.setStyleSheet(button_style)
+        browse_btn.setFixedHeight(32)
+        browse_btn.setFixedWidth(100)
+        browse_btn.clicked.connect(self.select_output_folder)
+        output_row.addWidget(browse_btn)
+        layout.addLayout(output_row)
+
+        # Compress button
+        self.compress_btn = QtWidgets.QPushButton("Compress PDFs")
+        self.compress_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 22px; background: #bd93f9; color: #23272f; font-weight: bold; border-radius: 8px;
+            }
+            QPushButton:hover { background: #b4aaff; }
+        """)
+        self.compress_btn.setFixedHeight(48)
+        self.compress_btn.clicked.connect(self.compress_pdfs)
+        layout.addWidget(self.compress_btn)
+
+        self.progress = QtWidgets.QProgressBar(self)
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        self.progress.setFixedHeight(25)
+        self.progress.setStyleSheet("""
+            QProgressBar { background: #23272f; border: 1px solid #44475a; border-radius: 8px; color: #d6bfff; font-size: 15px; }
+            QProgressBar::chunk { background: #bd93f9; border-radius: 8px; }
+        """)
+        layout.addWidget(self.progress)
+
+        layout.addWidget(self.status)
+
+        self.setStyleSheet("""
+            QWidget { background: #23272f; color: #f8f8f2; }
+        """)
+
+    def add_files(self):
+        files, _ = QtWidgets.QFileDialog.getOpenFileNames(
+            self, "Select PDF files to compress", "", "PDF Files (*.pdf)"
+        )
+        current = set(self.get_current_files())
+        for f in files:
+            if f and f not in current:
+                current.add(f)
+                item = QtWidgets.QListWidgetItem(f)
+                item.setData(QtCore.Qt.UserRole, f)
+                self.file_list.addItem(item)
+
+    def get_current_files(self):
+        return [self.file_list.item(i).data(QtCore.Qt.UserRole) for i in range(self.file_list.count())]
+
+    def remove_selected(self):
+        if self.worker and self.worker.isRunning():
+            return
+        for item in self.file_list.selectedItems():
+            self.file_list.takeItem(self.file_list.row(item))
+
+    def select_output_folder(self):
+        path = QtWidgets.QFileDialog.getExistingDirectory(
+            self, "Select output folder", ""
+        )
+        if path:
+            self.output_path.setText(path)
+
+    def compress_pdfs(self):
+        if self.worker and self.worker.isRunning():
+            # The button reads "Cancel" while a batch runs
+            self.worker.stop()
+            self.compress_btn.setEnabled(False)
+            self.status.setText("Cancelling, finishing files in progress...")
+            return
+        files = self.get_current_files()
+        outdir = self.output_path.text().strip()
+        if not files:
+            self.status.setText("Please add PDFs.")
+            return
+        if not outdir or not os.path.isdir(outdir):
+            self.status.setText("Please select a valid output folder.")
+            return
+        try:
+            engine = PdfCompressEngine(self.workers_spin.value(), self.backend_combo.currentData())
+        except ValueError as e:
+            self.status.setText(str(e))
+            return
+        self.items = {}
+        for i in range(self.file_list.count()):
+            item = self.file_list.item(i)
+            item.setText(item.data(QtCore.Qt.UserRole))
+            item.setForeground(QtCore.Qt.white)
+            self.items[item.data(QtCore.Qt.UserRole)] = item
+        self.progress.setValue(0)
+        self.compress_btn.setText("Cancel")
+        self.status.setText(f"Compressing {len(files)} PDFs with {BACKEND_LABELS[engine.backend]}...")
+        self.worker = CompressWorker(files, outdir, self.preset_combo.currentData(), engine)
+        self.worker.page_signal.connect(self.on_page_done)
+        self.worker.progress_signal.connect(self.on_progress)
+        self.worker.result_signal.connect(self.on_file_done)
+        self.worker.finished_signal.connect(self.on_compress_finished)
+        self.worker.start()
+
+    def on_page_done(self, src, page, pages):
+        item = self.items.get(src)
+        if item:
+            unit = "page" if self.worker.engine.backend == "ghostscript" else "image"
+            item.setText(f"{src}  —  {unit} {page}" + (f"/{pages}" if pages else ""))
+
+    def on_progress(self, done, total):
+        if total:
+            self.progress.setValue(min(100, int(done / total * 100)))
+
+    def on_file_done(self, result):
+        item = self.items.get(result["src"])
+        if item is None:
+            return
+        if not result["ok"]:
+            item.setText(f"{result['src']}  —  {result['error']}")
+            item.setForeground(QtCore.Qt.red)
+            return
+        in_mb, out_mb = result["in_bytes"] / 1048576, result["out_bytes"] / 1048576
+        if result["kept_original"]:
+            how = "already compact, copied as is"
+        else:
+            how = f"{100 - result['out_bytes'] * 100 // max(1, result['in_bytes'])}% smaller"
+        item.setText(f"{result['src']}  —  {in_mb:.2f} MB -> {out_mb:.2f} MB ({how}) in {result['seconds']:.1f}s")
+        item.setToolTip(result["out"])
+        item.setForeground(QtCore.Qt.green)
+
+    def on_compress_finished(self, ok, msg):
+        self.compress_btn.setText("Compress PDFs")
+        self.compress_btn.setEnabled(True)
+        self.status.setText(msg)
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        super().closeEvent(event)
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    app = QtWidgets.QApplication(sys.argv)
+    win = PDFCompressorUI()
+    win.show()
+    sys.exit(app.exec_())
@@ -0,0 +1,1014 @@
+import io
+import os
+import re
+import time
+import zlib
+import queue
+import shutil
+import hashlib
+import subprocess
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject,
+                            TextStringObject, read_object)
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+# Qt-free PDF engines for the PDF tools. The merge engine copies one input at a
+# time straight into the output file: only object offsets, content hashes and
+# the bookmark tree stay in memory, so thousands of inputs merge in about the
+# memory the largest one needs.
+
+# Page attributes that may be inherited from the page tree. The merged file has
+# one flat tree, so they are copied onto each page.
+INHERITABLE = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+# Objects per compressed object stream in compact output
+OBJSTM_SIZE = 200
+
+def pdf_temp_path(output):
+    """Temp file next to output, so the final rename never crosses filesystems."""
+    folder, name = os.path.split(os.path.abspath(output))
+    return os.path.join(folder, f".{name}.{os.getpid()}.tmp")
+
+def linearize_pdf(path):
+    """Rewrite path in place as a linearized ("fast web view") file, keeping its object streams."""
+    if pikepdf is None:
+        raise ValueError("Fast web view output needs the pikepdf package (pip install pikepdf)")
+    tmp = path + ".lin"
+    try:
+        with pikepdf.open(path) as pdf:
+            pdf.save(tmp, linearize=True)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+class StreamingPdfWriter:
+    """Writes numbered objects to a file as they come; keeps only their offsets.
+
+    compact=True packs every non-stream object into compressed object streams
+    of OBJSTM_SIZE and ends with a compressed xref stream instead of a table.
+
+    update=size appends an incremental update instead: f is positioned at the
+    end of an existing PDF whose trailer /Size is size, new objects are
+    numbered from there, and the xref lists only the objects written here.
+    """
+
+    def __init__(self, f, compact=False, update=None):
+        self.f = f
+        self.compact = compact
+        # object number -> file offset, or (object stream, index) when packed; None is not written here.
+        # In a new file 0 is the free-list head; an update leaves the existing numbers alone
+        self.offsets = [None] * (update or 1)
+        self.update = update is not None
+        self._packed = []  # (number, body) for the object stream being filled
+        if not self.update:
+            f.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def reserve(self):
+        """Allocate an object number to be written later (for forward references)."""
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def write_object(self, num, body):
+        if self.compact and not body.endswith(b"endstream"):
+            self._packed.append((num, body))
+            if len(self._packed) >= OBJSTM_SIZE:
+                self._write_object_stream()
+            return
+        self.offsets[num] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    def _write_object_stream(self):
+        header, bodies, pos = [], [], 0
+        for num, body in self._packed:
+            header.append(b"%d %d" % (num, pos))
+            bodies.append(body)
+            pos += len(body) + 1
+        header = b" ".join(header) + b"\n"
+        data = zlib.compress(header + b"\n".join(bodies) + b"\n")
+        stm = self.reserve()
+        self.offsets[stm] = self.f.tell()
+        self.f.write(b"%d 0 obj\n<</Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d>>\nstream\n"
+                     % (stm, len(self._packed), len(header), len(data)) + data + b"\nendstream\nendobj\n")
+        for index, (num, _) in enumerate(self._packed):
+            self.offsets[num] = (stm, index)
+        self._packed = []
+
+    def add_object(self, body):
+        num = self.reserve()
+        self.write_object(num, body)
+        return num
+
+    def write_page_tree(self, root, kids):
+        self.write_object(root, b"<</Type /Pages /Count %d /Kids [%s]>>" % (
+            len(kids), b" ".join(b"%d 0 R" % k for k in kids)))
+
+    def _xref_runs(self):
+        # (first number, entries) per run of consecutive numbers written here
+        if not self.update:
+            return [(0, self.offsets)]
+        runs = []
+        for num, entry in enumerate(self.offsets):
+            if entry is None:
+                continue
+            if runs and runs[-1][0] + len(runs[-1][1]) == num:
+                runs[-1][1].append(entry)
+            else:
+                runs.append((num, [entry]))
+        return runs
+
+    def finish(self, root, trailer=b""):
+        """Write the xref and trailer; trailer holds extra entries, such as an update's /Prev."""
+        if self.compact:
+            return self._finish_xref_stream(root, trailer)
+        xref = self.f.tell()
+        self.f.write(b"xref\n")
+        for first, entries in self._xref_runs():
+            self.f.write(b"%d %d\n" % (first, len(entries)))
+            self.f.write(b"".join(b"0000000000 65535 f \n" if offset is None else b"%010d 00000 n \n" % offset
+                                  for offset in entries))
+        self.f.write(b"trailer\n<< /Size %d /Root %d 0 R%s >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (len(self.offsets), root, trailer, xref))
+
+    def _finish_xref_stream(self, root, trailer=b""):
+        if self._packed:
+            self._write_object_stream()
+        num = self.reserve()
+        xref = self.offsets[num] = self.f.tell()
+        # Field widths: type, offset (or object stream number), generation (or index)
+        width = max(4, (xref.bit_length() + 7) // 8)
+        rows, index = [], []
+        for first, entries in self._xref_runs():
+            index.append(b"%d %d" % (first, len(entries)))
+            for entry in entries:
+                if entry is None:
+                    rows.append(b"\x00" + bytes(width) + b"\xff\xff")
+                elif isinstance(entry, tuple):
+                    rows.append(b"\x02" + entry[0].to_bytes(width, "big") + entry[1].to_bytes(2, "big"))
+                else:
+                    rows.append(b"\x01" + entry.to_bytes(width, "big") + b"\x00\x00")
+        data = zlib.compress(b"".join(rows))
+        self.f.write(b"%d 0 obj\n<</Type /XRef /Size %d /Index [%s] /W [1 %d 2] /Root %d 0 R%s /Filter /FlateDecode "
+                     b"/Length %d>>\nstream\n" % (num, len(self.offsets), b" ".join(index), width, root, trailer,
+                                                   len(data)) + data
+                     + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref)
+
+def _pdf_bytes(obj):
+    # An object read from an existing file, with its references as they are there
+    out = io.BytesIO()
+    obj.write_to_stream(out, None)
+    return out.getvalue()
+
+def serialize(obj, ref):
+    """PDF bytes for a direct object; ref maps each IndirectObject to an output number (or None for null)."""
+    out = io.BytesIO()
+    _serialize(obj, ref, out)
+    return out.getvalue()
+
+def _serialize(obj, ref, out):
+    if isinstance(obj, IndirectObject):
+        num = ref(obj)
+        out.write(b"null" if num is None else b"%d 0 R" % num)
+    elif isinstance(obj, StreamObject):
+        data = obj._data if isinstance(obj._data, bytes) else obj._data.encode("latin-1")
+        out.write(b"<<")
+        for key, value in obj.items():
+            if key != "/Length":  # may be an indirect number in the source; rewritten below
+                key.write_to_stream(out, None)
+                out.write(b" ")
+                _serialize(value, ref, out)
+        out.write(b"/Length %d>>\nstream\n" % len(data))
+        out.write(data)
+        out.write(b"\nendstream")
+    elif isinstance(obj, DictionaryObject):
+        out.write(b"<<")
+        for key, value in obj.items():
+            key.write_to_stream(out, None)
+            out.write(b" ")
+            _serialize(value, ref, out)
+        out.write(b">>")
+    elif isinstance(obj, ArrayObject):
+        out.write(b"[")
+        for i, value in enumerate(obj):
+            if i:
+                out.write(b" ")
+            _serialize(value, ref, out)
+        out.write(b"]")
+    else:
+        obj.write_to_stream(out, None)
+
+class _DocumentCopy:
+    """Copies the objects one input's pages reach, renumbered into the output.
+
+    Objects are written children first, so an object's bytes already hold its
+    children's output numbers and identical subgraphs (the same font or logo
+    in many inputs) hash the same. Objects on a reference cycle get their
+    number before their bytes are known and are never shared. Without a
+    shared dict nothing is hashed: every object is written once, as is.
+    """
+
+    def __init__(self, writer, pages_root, page_nums, shared=None, shadowed=()):
+        self.writer = writer
+        self.pages_root = pages_root
+        self.page_nums = page_nums  # (idnum, generation) of each source page -> output number
+        self.shared = shared  # content hash -> output number, across documents
+        # Inheritable keys the output's page tree sets above pages_root: each page states its own
+        self.shadowed = shadowed
+        self.shared_objects = 0
+        self.shared_bytes = 0
+        self.done = {}
+        self.active = {}
+
+    def ref(self, indirect):
+        key = (indirect.idnum, indirect.generation)
+        if key in self.page_nums:
+            return self.page_nums[key]
+        if key in self.done:
+            return self.done[key]
+        if key in self.active:
+            if self.active[key] is None:
+                self.active[key] = self.writer.reserve()
+            return self.active[key]
+        obj = indirect.get_object()
+        if isinstance(obj, DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages"):
+            # Page tree nodes are rebuilt; a page the output does not include has no place
+            return self.pages_root if obj.get("/Type") == "/Pages" else None
+        self.active[key] = None
+        body = serialize(obj, self.ref)
+        num = self.active.pop(key)
+        if num is not None:
+            self.writer.write_object(num, body)
+        elif self.shared is None:
+            num = self.writer.add_object(body)
+        else:
+            digest = hashlib.sha1(body).digest()
+            num = self.shared.get(digest)
+            if num is None:
+                num = self.writer.add_object(body)
+                self.shared[digest] = num
+            else:
+                self.shared_objects += 1
+                self.shared_bytes += len(body)
+        self.done[key] = num
+        return num
+
+    def copy_page(self, page, num):
+        flat = DictionaryObject()
+        flat.update((k, v) for k, v in page.items() if k != "/Parent")
+        node = page.get("/Parent")
+        while node is not None:
+            node = node.get_object()
+            for key in INHERITABLE:
+                if key not in flat and key in node:
+                    flat[NameObject(key)] = node.raw_get(key)
+            node = node.get("/Parent")
+        for key in self.shadowed:
+            if key not in flat:
+                default = {"/CropBox": flat.raw_get("/MediaBox"), "/Rotate": NumberObject(0)}
+                flat[NameObject(key)] = default.get(key, DictionaryObject())
+        body = serialize(flat, self.ref)
+        self.writer.write_object(num, body[:-2] + b"/Parent %d 0 R>>" % self.pages_root)
+
+def open_pdf(path):
+    reader = PdfReader(path, strict=False)
+    if reader.is_encrypted and not reader.decrypt(""):
+        raise ValueError(f"{os.path.basename(path)} is password protected")
+    return reader
+
+def page_key(page):
+    ref = page.indirect_reference
+    return ref.idnum, ref.generation
+
+class PdfMergeEngine:
+    """Merges PDFs into one file, streaming one input at a time, and yields a result per input."""
+
+    def __init__(self, compact=False, linearize=False):
+        self.compact = compact
+        self.linearize = linearize
+        self._stop_requested = False
+        self.writer = None
+        self.pages_root = None
+        self.shared = {}
+        self.shared_objects = 0
+        self.shared_bytes = 0
+        self.shadowed = ()
+        self.current = None  # the file being read, for error messages
+        self.pages = 0
+        self.bytes_written = 0
+
+    def stop(self):
+        self._stop_requested = True
+
+    def run(self, files, output, progress=None):
+        """Yields {"src", "pages", "seconds"} per input; output appears only once every input is in.
+
+        progress(pages) is called as pages are copied. stop() takes effect at the next page,
+        and stopping or an unreadable input leaves any existing output untouched.
+        """
+        self._stop_requested = False
+        self.shared = {}
+        self.shared_objects = self.shared_bytes = self.pages = 0
+        self.shadowed = ()
+        tmp = pdf_temp_path(output)
+        try:
+            with open(tmp, "wb") as f:
+                self.writer = StreamingPdfWriter(f, self.compact)
+                self.pages_root = self.writer.reserve()
+                kids = []
+                outline = []
+                for src in files:
+                    if self._stop_requested:
+                        return
+                    start = time.perf_counter()
+                    page_nums, items = self._append(src, progress)
+                    if self._stop_requested:
+                        return
+                    kids.extend(page_nums)
+                    outline.extend(items)
+                    self.pages += len(page_nums)
+                    yield {"src": src, "pages": len(page_nums), "seconds": time.perf_counter() - start}
+                self.writer.write_page_tree(self.pages_root, kids)
+                catalog = b"<</Type /Catalog /Pages %d 0 R" % self.pages_root
+                if outline:
+                    catalog += b" /Outlines %d 0 R /PageMode /UseOutlines" % self._write_outline(outline)
+                self.writer.finish(self.writer.add_object(catalog + b">>"))
+                self.bytes_written = f.tell()
+            if self.linearize:
+                linearize_pdf(tmp)
+            os.replace(tmp, output)
+        finally:
+            self.writer = None
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def append(self, target, files, progress=None):
+        """Appends the pages of files to target in place, as an incremental update; yields like run().
+
+        Only the copied objects, target's page tree root and a new xref section
+        chained to the old one with /Prev are written after target's existing
+        bytes, so the cost follows the pages added, not the size of target.
+        Bookmarks of the inputs are not carried over, and a linearized target
+        loses its fast web view. Stopping or an error truncates target back to
+        its old length.
+        """
+        self._stop_requested = False
+        self.shared = {}
+        self.shared_objects = self.shared_bytes = self.pages = self.bytes_written = 0
+        name = os.path.basename(target)
+        self.current = target
+        with open(target, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            probe = _XrefProbe(f, size)
+            probe.info()
+            trailer = probe.trailer
+            if "/Encrypt" in trailer:
+                raise ValueError(f"{name} is encrypted and can't be appended to in place")
+            catalog_ref = trailer.raw_get("/Root")
+            pages_ref = probe.resolve(catalog_ref).raw_get("/Pages")
+            if catalog_ref.generation or pages_ref.generation:
+                raise ValueError(f"{name} has reused object numbers; merge into a new file instead")
+            pages_root = probe.resolve(pages_ref)
+            kids = list(probe.resolve(pages_root["/Kids"]))
+            count = int(probe.resolve(pages_root["/Count"]))
+            f.seek(size - 1)
+            complete = False
+            try:
+                if f.read(1) not in b"\r\n":
+                    f.write(b"\n")
+                # The update's xref takes the form of the newest one in target: a table, or a stream
+                self.writer = StreamingPdfWriter(f, isinstance(trailer, StreamObject), int(trailer["/Size"]))
+                # The new pages hang off one new node under target's root, so the root's /Kids grows by one
+                self.pages_root = self.writer.reserve()
+                self.shadowed = tuple(key for key in INHERITABLE if key in pages_root)
+                added = []
+                for src in files:
+                    if self._stop_requested:
+                        return
+                    start = time.perf_counter()
+                    page_nums, _ = self._append(src, progress)
+                    if self._stop_requested:
+                        return
+                    added.extend(page_nums)
+                    self.pages += len(page_nums)
+                    yield {"src": src, "pages": len(page_nums), "seconds": time.perf_counter() - start}
+                self.writer.write_object(self.pages_root, b"<</Type /Pages /Parent %d 0 R /Count %d /Kids [%s]>>" % (
+                    pages_ref.idnum, len(added), b" ".join(b"%d 0 R" % k for k in added)))
+                root = DictionaryObject(pages_root)
+                root[NameObject("/Kids")] = ArrayObject(kids + [IndirectObject(self.pages_root, 0, None)])
+                root[NameObject("/Count")] = NumberObject(count + len(added))
+                self.writer.write_object(pages_ref.idnum, _pdf_bytes(root))
+                extra = b" /Prev %d" % probe.startxref
+                for key in ("/Info", "/ID"):
+                    if key in trailer:
+                        extra += b" " + key.encode() + b" " + _pdf_bytes(trailer.raw_get(key))
+                self.writer.finish(catalog_ref.idnum, extra)
+                self.bytes_written = f.tell() - size
+                f.flush()
+                os.fsync(f.fileno())
+                complete = True
+            finally:
+                self.writer = None
+                self.shadowed = ()
+                if not complete:
+                    f.truncate(size)
+
+    def _append(self, src, progress=None):
+        self.current = src
+        reader = open_pdf(src)
+        nums = [self.writer.reserve() for _ in reader.pages]
+        copy = _DocumentCopy(self.writer, self.pages_root, dict(zip(map(page_key, reader.pages), nums)), self.shared,
+                             self.shadowed)
+        for page, num in zip(reader.pages, nums):
+            if self._stop_requested:
+                break
+            copy.copy_page(page, num)
+            if progress:
+                progress(1)
+        self.shared_objects += copy.shared_objects
+        self.shared_bytes += copy.shared_bytes
+        return nums, self._outline_items(reader, reader.outline, nums)
+
+    def _outline_items(self, reader, entries, nums):
+        # Bookmarks as (title, page number, destination arguments, children); named targets are resolved
+        items = []
+        for entry in entries:
+            if isinstance(entry, list):
+                if items:
+                    items[-1][3].extend(self._outline_items(reader, entry, nums))
+                continue
+            index = reader.get_destination_page_number(entry)
+            page = nums[index] if 0 <= index < len(nums) else None
+            args = [serialize(a, lambda r: None) for a in entry.dest_array[1:]]
+            items.append((str(entry.title), page, args, []))
+        return items
+
+    def _write_outline(self, items):
+        root = self.writer.reserve()
+        first, last, count = self._write_outline_level(items, root)
+        self.writer.write_object(root, b"<</Type /Outlines /First %d 0 R /Last %d 0 R /Count %d>>"
+                                 % (first, last, count))
+        return root
+
+    def _write_outline_level(self, items, parent):
+        nums = [self.writer.reserve() for _ in items]
+        count = len(items)
+        for i, (title, page, args, children) in enumerate(items):
+            body = b"<</Title " + serialize(TextStringObject(title), None) + b" /Parent %d 0 R" % parent
+            if i > 0:
+                body += b" /Prev %d 0 R" % nums[i - 1]
+            if i < len(items) - 1:
+                body += b" /Next %d 0 R" % nums[i + 1]
+            if page is not None:
+                body += b" /Dest [%d 0 R %s]" % (page, b" ".join(args))
+            if children:
+                first, last, sub = self._write_outline_level(children, nums[i])
+                # Negative count: the bookmark starts collapsed
+                body += b" /First %d 0 R /Last %d 0 R /Count -%d" % (first, last, sub)
+            self.writer.write_object(nums[i], body + b">>")
+        return nums[0], nums[-1], count
+
+def parse_page_groups(spec, total):
+    """"1-10;11-25;26-" -> one sorted list of 0-based pages per ";" group.
+
+    Groups take "1,3,5-7" lists; an open end ("26-" or "-5") runs to the last
+    or from the first page. Out-of-range pages are dropped; raises ValueError
+    on anything that is not a page number.
+    """
+    groups = []
+    for part in spec.split(";"):
+        pages = set()
+        for item in part.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if "-" in item:
+                start, end = (v.strip() for v in item.split("-", 1))
+                start, end = int(start) if start else 1, int(end) if end else total
+                pages.update(range(min(start, end), max(start, end) + 1))
+            else:
+                pages.add(int(item))
+        pages = sorted(p - 1 for p in pages if 1 <= p <= total)
+        if pages:
+            groups.append(pages)
+    return groups
+
+def every_n_groups(total, n):
+    return [list(range(start, min(start + n, total))) for start in range(0, total, n)]
+
+def bookmark_groups(reader):
+    """(title, pages) per top-level bookmark, each running to the next one; pages before the first are kept too."""
+    starts = {}
+    for entry in reader.outline:
+        if not isinstance(entry, list):
+            index = reader.get_destination_page_number(entry)
+            if index >= 0:
+                starts.setdefault(index, str(entry.title))
+    total = len(reader.pages)
+    if starts and 0 not in starts:
+        starts[0] = "Front matter"
+    bounds = sorted(starts) + [total]
+    return [(starts[a], list(range(a, b))) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def split_output_path(output, index, title=None):
+    """output "book.pdf" -> "book_001.pdf", or "book_001_<title>.pdf" for bookmark splits."""
+    stem, ext = os.path.splitext(output)
+    name = f"{stem}_{index:03d}"
+    if title:
+        name += "_" + re.sub(r'[\\/:*?"<>|\s]+', "_", title).strip("_")[:60]
+    return name + (ext or ".pdf")
+
+def write_pages(reader, pages, output, compact=False, linearize=False, progress=None, stopped=None):
+    """Write the given 0-based pages of reader to output, through a temp file.
+
+    progress(pages) is called as pages are copied; once stopped() is true the temp file is
+    dropped and False returned, leaving output as it was.
+    """
+    tmp = pdf_temp_path(output)
+    try:
+        with open(tmp, "wb") as f:
+            writer = StreamingPdfWriter(f, compact)
+            root = writer.reserve()
+            src = [reader.pages[i] for i in pages]
+            nums = [writer.reserve() for _ in src]
+            copy = _DocumentCopy(writer, root, dict(zip(map(page_key, src), nums)))
+            for page, num in zip(src, nums):
+                if stopped and stopped():
+                    return False
+                copy.copy_page(page, num)
+                if progress:
+                    progress(1)
+            writer.write_page_tree(root, nums)
+            writer.finish(writer.add_object(b"<</Type /Catalog /Pages %d 0 R>>" % root))
+        if linearize:
+            linearize_pdf(tmp)
+        os.replace(tmp, output)
+        return True
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+# Each split worker process parses the source once and reuses it for every output it writes
+_split_reader = None
+
+def _open_split_source(path, reader=None):
+    global _split_reader
+    _split_reader = reader or open_pdf(path)
+
+def _split_job(pages, output, compact=False, linearize=False, progress=None, stopped=None):
+    start = time.perf_counter()
+    result = {"out": output, "pages": len(pages), "ok": False, "error": "", "seconds": 0.0}
+    try:
+        if write_pages(_split_reader, pages, output, compact, linearize, progress, stopped):
+            result["ok"] = True
+        else:
+            result["error"] = "cancelled"
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+class PdfSplitEngine:
+    """Writes many page selections of one PDF, from a process pool; yields a result per output as it finishes."""
+
+    def __init__(self, workers=None, compact=False, linearize=False):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.options = (compact, linearize)
+        self._stop_requested = False
+
+    def stop(self):
+        self._stop_requested = True
+
+    def run(self, src, jobs, progress=None, reader=None):
+        # jobs is a list of (0-based pages, output path). progress(pages) is called per page
+        # when writing in this process, and per finished output from the pool. reader is src
+        # already parsed (to read its bookmarks); writing in this process reuses it
+        self._stop_requested = False
+        if self.workers == 1 or len(jobs) == 1:
+            # No pool for a single worker or output: avoids process spawn cost
+            _open_split_source(src, reader)
+            stopped = lambda: self._stop_requested
+            for pages, output in jobs:
+                if self._stop_requested:
+                    break
+                yield _split_job(pages, output, *self.options, progress, stopped)
+            return
+        workers = min(self.workers, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_split_source, initargs=(src,)) as pool:
+            pending = {pool.submit(_split_job, pages, output, *self.options) for pages, output in jobs}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if not fut.cancelled():
+                        result = fut.result()
+                        if progress:
+                            progress(result["pages"])
+                        yield result
+                if self._stop_requested:
+                    # Outputs not started yet are dropped; the ones being written finish
+                    for fut in pending:
+                        fut.cancel()
+
+# Page-count probe for the splitter's file picker. PdfReader reads the whole
+# file and walks every page to count them; the probe follows the xref chain
+# from the trailer and reads only the catalog and the page tree root, so it
+# costs the same for a 1 MB and a 1 GB file.
+
+PROBE_TAIL = 4096
+PROBE_CHUNK = 16384
+PROBE_MAX_READ = 16 * 1048576
+PROBE_CACHE_SIZE = 64
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_XREF_HEAD = re.compile(rb"\s*(\d+)[ \t]+(\d+)[ \t]*(?:\r\n|\r|\n)")
+_XREF_ENTRY = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_OBJ_HEAD = re.compile(rb"\s*\d+\s+\d+\s+obj")
+_SPACE = re.compile(rb"\s*")
+
+_probe_cache = OrderedDict()
+
+class _XrefProbe:
+    """Just enough of a PDF reader to find the page count: the xref chain, the trailer and single objects.
+
+    It is handed to PyPDF2's read_object as the pdf, so indirect stream lengths
+    resolve here and a short read raises instead of returning a partial object.
+    """
+
+    strict = True
+
+    def __init__(self, f, size):
+        self.f = f
+        self.size = size
+        self.sections = []  # newest first; each maps an object number to an xref entry or None
+        self.trailer = None
+        self.startxref = None
+        self._objstms = {}
+
+    def info(self):
+        self.f.seek(0)
+        m = re.match(rb"%PDF-(\d\.\d)", self.f.read(16))
+        if not m:
+            raise ValueError("no PDF header")
+        self._read_xref_chain()
+        root = self.resolve(self.trailer["/Root"])
+        pages = self.resolve(root["/Pages"])
+        count = self.resolve(pages.get("/Count"))
+        if not isinstance(count, int) or count < 0:
+            raise ValueError("page tree has no /Count")
+        encrypted = "/Encrypt" in self.trailer
+        title = ""
+        if "/Info" in self.trailer and not encrypted:
+            title = str(self.resolve(self.resolve(self.trailer["/Info"]).get("/Title", "")))
+        version = root.get("/Version")
+        return {"pages": int(count), "version": str(version)[1:] if version else m[1].decode(),
+                "title": title.strip(), "encrypted": encrypted, "probe": "xref"}
+
+    def _read_xref_chain(self):
+        self.f.seek(max(0, self.size - PROBE_TAIL))
+        found = _STARTXREF.findall(self.f.read(PROBE_TAIL))
+        if not found:
+            raise ValueError("no startxref")
+        offset, seen = int(found[-1]), set()
+        self.startxref = offset
+        # Incremental updates and linearized files chain their sections through /Prev
+        while offset is not None and offset not in seen:
+            seen.add(offset)
+            self.f.seek(offset)
+            if self.f.read(4) == b"xref":
+                lookup, trailer = self._classic_section(offset + 4)
+                self.sections.append(lookup)
+                if "/XRefStm" in trailer:
+                    # Hybrid file: objects in object streams are listed in a separate xref stream
+                    self.sections.append(self._stream_section(int(trailer["/XRefStm"]))[0])
+            else:
+                lookup, trailer = self._stream_section(offset)
+                self.sections.append(lookup)
+            if self.trailer is None:
+                self.trailer = trailer
+            offset = int(trailer["/Prev"]) if "/Prev" in trailer else None
+
+    def _classic_section(self, pos):
+        # Entries are fixed 20-byte lines, so only subsection headers are read
+        # here and an entry is looked up by seeking straight to it
+        subsections = []
+        while True:
+            self.f.seek(pos)
+            head = self.f.read(64)
+            m = _XREF_HEAD.match(head)
+            if not m:
+                break
+            start, count = int(m[1]), int(m[2])
+            subsections.append((start, count, pos + m.end()))
+            pos += m.end() + 20 * count
+        m = re.match(rb"\s*trailer", head)
+        if not m:
+            raise ValueError("xref table without trailer")
+        trailer = self._read_at(pos + m.end(), header=False)
+
+        def lookup(num):
+            for start, count, base in subsections:
+                if start <= num < start + count:
+                    self.f.seek(base + 20 * (num - start))
+                    entry = _XREF_ENTRY.match(self.f.read(20))
+                    if not entry:
+                        raise ValueError("malformed xref entry")
+                    return (1, int(entry[1])) if entry[3] == b"n" else (0,)
+            return None
+        return lookup, trailer
+
+    def _stream_section(self, offset):
+        xref = self._read_at(offset)
+        if xref.get("/Type") != "/XRef":
+            raise ValueError(f"no xref at {offset}")
+        data = xref.get_data()
+        widths = [int(w) for w in xref["/W"]]
+        index = [int(v) for v in xref.get("/Index", [0, xref["/Size"]])]
+        row = sum(widths)
+
+        def lookup(num):
+            first = 0
+            for start, count in zip(index[::2], index[1::2]):
+                if start <= num < start + count:
+                    at = (first + num - start) * row
+                    fields, pos = [], at
+                    for w in widths:
+                        fields.append(int.from_bytes(data[pos:pos + w], "big"))
+                        pos += w
+                    kind = fields[0] if widths[0] else 1
+                    return (kind, fields[1], fields[2])
+                first += count
+            return None
+        return lookup, xref
+
+    def _read_at(self, offset, header=True):
+        size = PROBE_CHUNK
+        while True:
+            self.f.seek(offset)
+            data = self.f.read(size)
+            at_eof = len(data) < size
+            if at_eof or b"endobj" in data or not header:
+                start = 0
+                if header:
+                    m = _OBJ_HEAD.match(data)
+                    if not m:
+                        raise ValueError(f"no object at {offset}")
+                    start = m.end()
+                try:
+                    return read_object(io.BytesIO(data[_SPACE.match(data, start).end():]), self)
+                except Exception:
+                    if at_eof:
+                        raise
+            if size >= PROBE_MAX_READ:
+                raise ValueError(f"object at {offset} is too large to probe")
+            size *= 8
+
+    def _compressed(self, stm, index):
+        if stm not in self._objstms:
+            objstm = self.object(stm)
+            data = objstm.get_data()
+            first = int(objstm["/First"])
+            nums = [int(v) for v in data[:first].split()]
+            self._objstms[stm] = (data, first, nums[1::2])
+        data, first, offsets = self._objstms[stm]
+        return read_object(io.BytesIO(data[_SPACE.match(data, first + offsets[index]).end():]), self)
+
+    def object(self, num):
+        for lookup in self.sections:
+            entry = lookup(num)
+            if entry is None:
+                continue
+            if entry[0] == 1:
+                return self._read_at(entry[1])
+            if entry[0] == 2:
+                return self._compressed(entry[1], entry[2])
+            break
+        raise ValueError(f"object {num} is missing")
+
+    def resolve(self, obj):
+        return self.object(obj.idnum) if isinstance(obj, IndirectObject) else obj
+
+    def get_object(self, ref):
+        # Called by PyPDF2 for indirect /Length values
+        return self.resolve(ref)
+
+def _full_probe(path):
+    reader = open_pdf(path)
+    info = reader.metadata
+    return {"pages": len(reader.pages), "version": reader.pdf_header[5:],
+            "title": str(info.title or "").strip() if info else "",
+            "encrypted": reader.is_encrypted, "probe": "full"}
+
+def probe_pdf(path):
+    """Page count, PDF version and title, cached by path, mtime and size.
+
+    Falls back to a full PyPDF2 parse when the xref is damaged or unusual;
+    raises ValueError for password-protected files that need a full parse.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if key in _probe_cache:
+        _probe_cache.move_to_end(key)
+        return dict(_probe_cache[key], cached=True)
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            info = _XrefProbe(f, st.st_size).info()
+    except Exception:
+        info = _full_probe(path)
+    info["seconds"] = time.perf_counter() - start
+    _probe_cache[key] = info
+    if len(_probe_cache) > PROBE_CACHE_SIZE:
+        _probe_cache.popitem(last=False)
+    return dict(info, cached=False)
+
+# PDF compression. Ghostscript rewrites the whole document (what the PDF
+# Compressor page asks users to install); without it, pikepdf recompresses the
+# embedded images and streams in place. Either way each file is one job in a
+# process pool, so a batch keeps every core busy.
+
+# Presets: label, Ghostscript -dPDFSETTINGS, and for the pikepdf path the JPEG
+# quality and image resolution cap (None leaves images alone)
+COMPRESS_PRESETS = {
+    "screen": ("Smallest (72 dpi, screen)", "/screen", 40, 72),
+    "ebook": ("Balanced (150 dpi, ebook)", "/ebook", 60, 150),
+    "printer": ("High (300 dpi, print)", "/printer", 80, 300),
+    "prepress": ("Maximum (keep images, prepress)", "/prepress", None, None),
+}
+GHOSTSCRIPT_NAMES = ("gswin64c", "gswin32c", "gs")
+
+def find_ghostscript():
+    for name in GHOSTSCRIPT_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+def compress_backends():
+    """Backends usable on this machine, best first."""
+    backends = []
+    if find_ghostscript():
+        backends.append("ghostscript")
+    if pikepdf is not None:
+        backends.append("pikepdf")
+    return backends
+
+def compressed_output_paths(files, outdir):
+    """One output per input: "report.pdf" -> "<outdir>/report_compressed.pdf".
+
+    Inputs with the same name from different folders get "_2", "_3", ... so
+    no output overwrites another.
+    """
+    paths, taken = [], set()
+    for src in files:
+        stem, ext = os.path.splitext(os.path.basename(src))
+        path = os.path.join(outdir, f"{stem}_compressed{ext or '.pdf'}")
+        n = 1
+        while os.path.normcase(path) in taken:
+            n += 1
+            path = os.path.join(outdir, f"{stem}_compressed_{n}{ext or '.pdf'}")
+        taken.add(os.path.normcase(path))
+        paths.append(path)
+    return paths
+
+# Progress hook, pages for Ghostscript and resampled images for pikepdf: the
+# engine's callback in-process, a queue put in pool workers
+_compress_progress = None
+
+def _init_compress_worker(progress_queue):
+    global _compress_progress
+    _compress_progress = lambda src, page, pages: progress_queue.put((src, page, pages))
+
+def _report_page(src, page, pages):
+    if _compress_progress is not None:
+        _compress_progress(src, page, pages)
+
+def _ghostscript_compress(gs, src, tmp, preset):
+    cmd = [gs, "-sDEVICE=pdfwrite", "-dCompatibilityLevel=1.5", f"-dPDFSETTINGS={COMPRESS_PRESETS[preset][1]}",
+           "-dNOPAUSE", "-dBATCH", "-dSAFER", f"-sOutputFile={tmp}", os.path.abspath(src)]
+    # No console window flashing up per file on Windows
+    flags = subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace",
+                            creationflags=flags)
+    pages, tail = 0, []
+    for line in proc.stdout:
+        m = re.match(r"Processing pages \d+ through (\d+)", line)
+        if m:
+            pages = int(m[1])
+        elif line.startswith("Page ") and line[5:].strip().isdigit():
+            _report_page(src, int(line[5:]), pages)
+        tail = (tail + [line.strip()])[-3:]
+    if proc.wait() != 0:
+        raise RuntimeError("Ghostscript failed: " + " ".join(tail))
+    return pages
+
+def _pikepdf_compress(src, tmp, preset, image_workers=1):
+    from pdf_optimize import optimize_images  # pdf_optimize imports this module
+    _, _, quality, dpi = COMPRESS_PRESETS[preset]
+    try:
+        pdf = pikepdf.open(src)
+    except pikepdf.PasswordError:
+        raise ValueError(f"{os.path.basename(src)} is password protected")
+    with pdf:
+        pages = len(pdf.pages)
+        if quality:
+            optimize_images(pdf, dpi, quality, image_workers,
+                            progress=lambda done, total: _report_page(src, done, total))
+        pdf.save(tmp, compress_streams=True, recompress_flate=True,
+                 object_stream_mode=pikepdf.ObjectStreamMode.generate)
+    return pages
+
+def compress_pdf(src, output, preset, backend, gs=None, image_workers=1):
+    """Compress one PDF to output through a temp file; returns a plain result dict.
+
+    If the compressed file comes out no smaller, the original is copied instead.
+    """
+    start = time.perf_counter()
+    result = {"src": src, "out": output, "ok": False, "error": "", "backend": backend, "pages": 0,
+              "in_bytes": 0, "out_bytes": 0, "kept_original": False, "seconds": 0.0}
+    tmp = pdf_temp_path(output)
+    try:
+        result["in_bytes"] = os.path.getsize(src)
+        if backend == "ghostscript":
+            result["pages"] = _ghostscript_compress(gs, src, tmp, preset)
+        else:
+            result["pages"] = _pikepdf_compress(src, tmp, preset, image_workers)
+        if os.path.getsize(tmp) >= result["in_bytes"]:
+            shutil.copyfile(src, tmp)
+            result["kept_original"] = True
+        os.replace(tmp, output)
+        result["out_bytes"] = os.path.getsize(output)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+class PdfCompressEngine:
+    """Compresses PDFs from a process pool, one job per file; yields a result per file as it finishes."""
+
+    def __init__(self, workers=None, backend="auto"):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        available = compress_backends()
+        if backend == "auto":
+            backend = available[0] if available else None
+        if backend not in available:
+            raise ValueError("PDF compression needs Ghostscript in PATH or the pikepdf package"
+                             if backend is None else f"{backend} is not available")
+        self.backend = backend
+        self.gs = find_ghostscript() if backend == "ghostscript" else None
+        self._stop_requested = False
+
+    def stop(self):
+        self._stop_requested = True
+
+    def run(self, jobs, preset="ebook", progress=None):
+        # jobs is a list of (src, output); progress(src, page, pages) is called from this thread
+        global _compress_progress
+        self._stop_requested = False
+        args = (preset, self.backend, self.gs)
+        if self.workers == 1 or len(jobs) == 1:
+            _compress_progress = progress
+            try:
+                for src, output in jobs:
+                    if self._stop_requested:
+                        break
+                    # A lone file gets the workers for its images instead
+                    yield compress_pdf(src, output, *args, image_workers=self.workers)
+            finally:
+                _compress_progress = None
+            return
+        progress_queue = multiprocessing.Queue()
+        workers = min(self.workers, len(jobs))
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_compress_worker,
+                                     initargs=(progress_queue,)) as pool:
+                pending = {pool.submit(compress_pdf, src, output, *args) for src, output in jobs}
+                while pending:
+                    done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    while True:
+                        try:
+                            page = progress_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if progress:
+                            progress(*page)
+                    for fut in done:
+                        if not fut.cancelled():
+                            yield fut.result()
+                    if self._stop_requested:
+                        # Files not started yet are dropped; the ones being compressed finish
+                        for fut in pending:
+                            fut.cancel()
+        finally:
+            # The pool has shut down, so no worker writes to the queue any more
+            progress_queue.close()
+            progress_queue.join_thread()
@@ -0,0 +1,66 @@
+import abc
+import time
+from PyQt5 import QtCore
+
+# Shared off-GUI-thread runner for the PDF tools. Each tool subclasses
+# PdfJobWorker to drive one pdf_core engine; progress reaches the GUI at most
+# PROGRESS_HZ times a second however fast the engine goes, so the event loop
+# keeps drawing through a many-thousand-page job. The engines write to a temp
+# file and rename it into place, so stopping never leaves a partial output.
+
+PROGRESS_HZ = 60
+
+class _JobWorkerMeta(type(QtCore.QThread), abc.ABCMeta):
+    # QThread's own metaclass plus ABCMeta, so abstract methods are enforced on a QThread subclass
+    pass
+
+class PdfJobWorker(QtCore.QThread, metaclass=_JobWorkerMeta):
+    progress_signal = QtCore.pyqtSignal(int, int)  # units done, total units (0 if unknown)
+    result_signal = QtCore.pyqtSignal(dict)  # one per input or output the engine finishes
+    finished_signal = QtCore.pyqtSignal(bool, str)
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self.cancelled = False
+        self.total = 0
+        self.done = 0
+        self.seconds = 0.0
+        self._last_progress = 0.0
+
+    def advance(self, units=1):
+        """Count finished units (pages, or files for the compressor); called from this thread."""
+        self.done += units
+        now = time.perf_counter()
+        if now - self._last_progress >= 1 / PROGRESS_HZ:
+            self._last_progress = now
+            self.progress_signal.emit(self.done, self.total)
+
+    @abc.abstractmethod
+    def results(self):
+        """Drive the engine, yielding its result dicts and calling advance() as work completes."""
+
+    @abc.abstractmethod
+    def summary(self):
+        """(ok, message) once results() is exhausted."""
+
+    def error_message(self, error):
+        return str(error)
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            for result in self.results():
+                self.result_signal.emit(result)
+            self.seconds = time.perf_counter() - start
+            self.progress_signal.emit(self.done, self.total)
+            ok, msg = self.summary()
+        except Exception as e:
+            self.seconds = time.perf_counter() - start
+            ok, msg = False, self.error_message(e)
+        self.finished_signal.emit(ok, msg)
+
+    def stop(self):
+        """Cooperative cancel: the engine stops at its next page or file boundary."""
+        self.cancelled = True
+        self.engine.stop()
@@ -1,13 +1,61 @@
 import sys
 import os
 from PyQt5 import QtWidgets, QtCore
-from PyPDF2 import PdfMerger
+import pdf_core
+from pdf_core import PdfMergeEngine, probe_pdf
+from pdf_jobs import PdfJobWorker
+
+class MergeWorker(PdfJobWorker):
+    # append=True adds files[1:] to files[0] in place instead of writing output
+    def __init__(self, files, output, compact=False, linearize=False, append=False):
+        super().__init__(PdfMergeEngine(compact, linearize))
+        self.files = files
+        self.output = files[0] if append else output
+        self.append = append
+        self.merged = 0
+
+    def results(self):
+        inputs = self.files[1:] if self.append else self.files
+        # Page counts come from the xref probe, so the bar can move per page rather than per file
+        for f in inputs:
+            try:
+                self.total += probe_pdf(f)["pages"]
+            except Exception:
+                pass  # the merge itself reports unreadable inputs
+        if self.append:
+            self.merged = 1
+            results = self.engine.append(self.output, inputs, progress=self.advance)
+        else:
+            results = self.engine.run(self.files, self.output, progress=self.advance)
+        for result in results:
+            self.merged += 1
+            yield result
+
+    def error_message(self, error):
+        current = self.engine.current
+        if self.append and current == self.output:
+            return f"Failed to append to {os.path.basename(current)}: {error}"
+        return f"Failed to merge {os.path.basename(current or '')}: {error}"
+
+    def summary(self):
+        if self.cancelled:
+            return False, "Merge cancelled; the output file was not changed."
+        if self.append:
+            return True, (f"Appended {len(self.files) - 1} files ({self.engine.pages} pages) in {self.seconds:.1f}s, "
+                          f"adding {self.engine.bytes_written / (1024 * 1024):.1f} MB to:\n{self.output}")
+        msg = (f"Successfully merged {len(self.files)} files ({self.engine.pages} pages) "
+               f"in {self.seconds:.1f}s to:\n{self.output}")
+        if self.engine.shared_objects:
+            msg += (f"\nShared {self.engine.shared_objects} duplicate fonts/images/objects "
+                    f"({self.engine.shared_bytes / (1024 * 1024):.1f} MB).")
+        return True, msg
 
 class PDFMergeUI(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Coke PDF Merger")
         self.resize(800, 600)
+        self.worker = None
 
         main_layout = QtWidgets.QVBoxLayout(self)
         main_layout.setContentsMargins(32, 32, 32, 32)
@@ -106,12 +154,42 @@ class PDFMergeUI(QtWidgets.QWidget):
         output_row.addWidget(browse_btn)
         main_layout.addLayout(output_row)
 
+        # Output options
+        options_row = QtWidgets.QHBoxLayout()
+        self.compact_check = QtWidgets.QCheckBox("Compact output (object streams)")
+        self.compact_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        options_row.addWidget(self.compact_check)
+        self.linearize_check = QtWidgets.QCheckBox("Fast web view (linearized)")
+        self.linearize_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        if pdf_core.pikepdf is None:
+            self.linearize_check.setEnabled(False)
+            self.linearize_check.setToolTip("Install pikepdf to enable fast web view (pip install pikepdf).")
+        options_row.addWidget(self.linearize_check)
+        self.append_check = QtWidgets.QCheckBox("Append to first file in place")
+        self.append_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        self.append_check.setToolTip("Adds the other files' pages to the end of the first file as an incremental "
+                                     "update, without rewriting it. Bookmarks of the added files are not kept.")
+        self.append_check.toggled.connect(self.on_append_toggled)
+        options_row.addWidget(self.append_check)
+        options_row.addStretch(1)
+        main_layout.addLayout(options_row)
+
         # Merge button
-        merge_btn = QtWidgets.QPushButton("Merge PDFs")
-        merge_btn.setStyleSheet(button_style2)
-        merge_btn.setFixedHeight(52)
-        merge_btn.clicked.connect(self.merge_pdfs)
-        main_layout.addWidget(merge_btn)
+        self.merge_btn = QtWidgets.QPushButton("Merge PDFs")
+        self.merge_btn.setStyleSheet(button_style2)
+        self.merge_btn.setFixedHeight(52)
+        self.merge_btn.clicked.connect(self.merge_pdfs)
+        main_layout.addWidget(self.merge_btn)
+
+        self.progress = QtWidgets.QProgressBar(self)
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        self.progress.setFixedHeight(25)
+        self.progress.setStyleSheet("""
+            QProgressBar { background: #23272f; border: 1px solid #44475a; border-radius: 8px; color: #d6bfff; font-size: 15px; }
+            QProgressBar::chunk { background: #bd93f9; border-radius: 8px; }
+        """)
+        main_layout.addWidget(self.progress)
 
         # Status label
         self.status = QtWidgets.QLabel("")
@@ -158,7 +236,19 @@ class PDFMergeUI(QtWidgets.QWidget):
         if filename:
             self.output_path.setText(filename)
 
+    def on_append_toggled(self, append):
+        # Appending writes into the first file as it is: no output path or output options
+        self.output_path.setEnabled(not append)
+        self.compact_check.setEnabled(not append)
+        self.linearize_check.setEnabled(not append and pdf_core.pikepdf is not None)
+
     def merge_pdfs(self):
+        if self.worker and self.worker.isRunning():
+            # The button reads "Cancel" while a merge runs
+            self.worker.stop()
+            self.merge_btn.setEnabled(False)
+            self.status.setText("Cancelling...")
+            return
         files = self.get_current_files()
         output = self.output_path.text().strip()
         if not files:
@@ -167,18 +257,42 @@ class PDFMergeUI(QtWidgets.QWidget):
         if len(files) < 2:
             self.status.setText("Need at least two files to merge!")
             return
-        if not output:
+        append = self.append_check.isChecked()
+        if not output and not append:
             self.status.setText("Please select an output file.")
             return
-        try:
-            merger = PdfMerger()
-            for f in files:
-                merger.append(f)
-            merger.write(output)
-            merger.close()
-            self.status.setText(f"Successfully merged to:\n{output}")
-        except Exception as e:
-            self.status.setText(f"Failed to merge: {e}")
+        # Inputs are streamed into the output one at a time, off the GUI thread
+        self.progress.setValue(0)
+        self.merge_btn.setText("Cancel")
+        self.worker = MergeWorker(files, output, self.compact_check.isChecked(), self.linearize_check.isChecked(),
+                                  append)
+        self.worker.progress_signal.connect(self.on_progress)
+        self.worker.result_signal.connect(self.on_file_merged)
+        self.worker.finished_signal.connect(self.on_merge_finished)
+        self.worker.start()
+
+    def on_progress(self, done, total):
+        if total:
+            self.progress.setValue(min(100, int(done / total * 100)))
+
+    def on_file_merged(self, result):
+        w = self.worker
+        if not w.total:
+            self.progress.setValue(int(w.merged / len(w.files) * 100))
+        self.status.setText(f"Merged {w.merged}/{len(w.files)}: {os.path.basename(result['src'])}")
+
+    def on_merge_finished(self, ok, msg):
+        self.merge_btn.setText("Merge PDFs")
+        self.merge_btn.setEnabled(True)
+        if ok:
+            self.progress.setValue(100)
+        self.status.setText(msg)
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
@@ -0,0 +1,235 @@
+import io
+import os
+import math
+import time
+import zlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image
+from pdf_core import pdf_temp_path
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+# Image-only PDF optimizer for scan-heavy files. Content streams are parsed
+# only for their q/Q/cm/Do operators, to learn how large each image is drawn;
+# identical image streams are merged, and only images stored above the target
+# resolution are resampled. Text, vector content and everything else keep
+# their bytes, so the cost is the oversized images and nothing more.
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+# Like Ghostscript's DownsampleThreshold: images within 1.5x of the target are not worth resampling
+RESAMPLE_THRESHOLD = 1.5
+
+def _concat(m, n):
+    """m then n, for PDF's row-vector matrices (what "m cm" does to a CTM n)."""
+    a, b, c, d, e, f = m
+    A, B, C, D, E, F = n
+    return (a * A + b * C, a * B + b * D, c * A + d * C, c * B + d * D, e * A + f * C + E, e * B + f * D + F)
+
+def _image_uses(content, resources, forms, active):
+    """(image, xobject dict, name, matrix) for every image content draws, in content space.
+
+    Form XObjects are walked once and cached in forms, whatever the number of pages using them.
+    """
+    xobjects = resources.get("/XObject") if resources is not None else None
+    uses, ctm, saved = [], IDENTITY, []
+    for operands, op in pikepdf.parse_content_stream(content, "q Q cm Do"):
+        op = str(op)
+        if op == "q":
+            saved.append(ctm)
+        elif op == "Q":
+            ctm = saved.pop() if saved else IDENTITY
+        elif op == "cm" and len(operands) == 6:
+            ctm = _concat(tuple(float(v) for v in operands), ctm)
+        elif op == "Do" and xobjects is not None:
+            name = str(operands[0])
+            xobj = xobjects.get(name)
+            if not isinstance(xobj, pikepdf.Stream):
+                continue
+            if xobj.get("/Subtype") == "/Image":
+                uses.append((xobj, xobjects, name, ctm))
+            elif xobj.get("/Subtype") == "/Form" and xobj.objgen not in active:
+                key = xobj.objgen
+                if key not in forms:
+                    active.add(key)
+                    forms[key] = _image_uses(xobj, xobj.get("/Resources", resources), forms, active)
+                    active.discard(key)
+                m = _concat(tuple(float(v) for v in xobj.get("/Matrix", IDENTITY)), ctm)
+                uses.extend((img, res, n, _concat(um, m)) for img, res, n, um in forms[key])
+    return uses
+
+def _hash_object(h, obj, active):
+    """Feed obj's content to h: streams by raw bytes and dictionary, containers item by item.
+
+    Nested streams (an /SMask, an /Indexed lookup table, an ICC profile) count by
+    content, not by how pikepdf prints them. active holds the indirect objects
+    being hashed, so a reference cycle is hashed by object number instead.
+    """
+    objgen = getattr(obj, "objgen", (0, 0))
+    if objgen in active:
+        h.update(b"R%d %d;" % objgen)
+        return
+    if objgen != (0, 0):
+        active.add(objgen)
+    if isinstance(obj, pikepdf.Stream):
+        data = obj.read_raw_bytes()
+        h.update(b"S%d:" % len(data) + data)
+        _hash_object(h, {k: v for k, v in obj.items() if k != "/Length"}, active)
+    elif isinstance(obj, (pikepdf.Dictionary, dict)):
+        h.update(b"<<")
+        for k in sorted(obj.keys()):
+            h.update(k.encode() + b" ")
+            _hash_object(h, obj[k], active)
+        h.update(b">>")
+    elif isinstance(obj, pikepdf.Array):
+        h.update(b"[")
+        for v in obj:
+            _hash_object(h, v, active)
+        h.update(b"]")
+    else:
+        h.update(repr(obj).encode() + b";")
+    active.discard(objgen)
+
+def _image_key(image):
+    # Identical bytes and identical image dictionary (minus /Length, nested streams
+    # included) draw the same pixels
+    h = hashlib.sha1()
+    _hash_object(h, image, set())
+    return h.digest()
+
+def _pixel_mode(image):
+    """Pillow mode of a plain 8-bit gray/RGB image, or None for anything else."""
+    if image.get("/ImageMask") or "/Decode" in image or "/Mask" in image or image.get("/BitsPerComponent") != 8:
+        return None
+    cs = image.get("/ColorSpace")
+    if isinstance(cs, pikepdf.Array) and len(cs) == 2 and cs[0] == "/ICCBased":
+        return {1: "L", 3: "RGB"}.get(int(cs[1].get("/N", 0)))
+    return {"/DeviceGray": "L", "/DeviceRGB": "RGB"}.get(str(cs) if cs is not None else "")
+
+def _resample(data, dct, mode, size, new_size, quality):
+    # Runs in the worker threads; Pillow releases the GIL while decoding, resizing and encoding
+    if dct:
+        img = Image.open(io.BytesIO(data))
+        # libjpeg decodes straight at 1/2, 1/4 or 1/8 scale when that still covers new_size
+        img.draft(img.mode, new_size)
+        if img.mode != mode:
+            return None  # CMYK/YCCK JPEG behind a gray/RGB colour space: leave it
+    else:
+        img = Image.frombytes(mode, size, data)
+    img = img.resize(new_size, Image.LANCZOS, reducing_gap=3.0)
+    if dct:
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=quality, optimize=True)
+        return buf.getvalue()
+    # Lossless sources stay lossless
+    return zlib.compress(img.tobytes(), 6)
+
+def optimize_images(pdf, target_dpi=150, quality=75, workers=None, progress=None):
+    """Merge duplicate images and resample the ones drawn above target_dpi, in an open pikepdf.Pdf.
+
+    progress(done, total) is called as resampled images finish. Returns a stats dict.
+    """
+    stats = {"images": 0, "duplicates": 0, "resampled": 0, "kept": 0, "skipped": 0,
+             "bytes_before": 0, "bytes_after": 0}
+    forms, drawn = {}, {}
+    for page in pdf.pages:
+        for image, xobjects, name, ctm in _image_uses(page, page.get("/Resources"), forms, set()):
+            entry = drawn.setdefault(image.objgen, {"image": image, "refs": [], "width": 0.0, "height": 0.0})
+            entry["refs"].append((xobjects, name))
+            # Drawn size in points: the CTM maps the image's unit square
+            entry["width"] = max(entry["width"], math.hypot(ctm[0], ctm[1]))
+            entry["height"] = max(entry["height"], math.hypot(ctm[2], ctm[3]))
+    stats["images"] = len(drawn)
+
+    # One copy per distinct image: every reference is pointed at it, the rest are dropped on save
+    unique = {}
+    for entry in drawn.values():
+        key = _image_key(entry["image"])
+        first = unique.get(key)
+        if first is None:
+            unique[key] = entry
+            continue
+        stats["duplicates"] += 1
+        for xobjects, name in entry["refs"]:
+            xobjects[name] = first["image"]
+        first["width"] = max(first["width"], entry["width"])
+        first["height"] = max(first["height"], entry["height"])
+
+    jobs = []
+    for entry in unique.values():
+        image = entry["image"]
+        filters = image.get("/Filter")
+        filters = [str(f) for f in filters] if isinstance(filters, pikepdf.Array) else [str(filters or "")]
+        mode = _pixel_mode(image)
+        if mode is None or filters not in (["/DCTDecode"], ["/FlateDecode"], [""]):
+            stats["skipped"] += 1
+            continue
+        size = int(image.Width), int(image.Height)
+        want = entry["width"] / 72 * target_dpi, entry["height"] / 72 * target_dpi
+        scale = max(want[0] / size[0], want[1] / size[1])
+        if scale * RESAMPLE_THRESHOLD >= 1:
+            stats["kept"] += 1
+            continue
+        new_size = max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+        jobs.append((image, filters == ["/DCTDecode"], mode, size, new_size))
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    todo, pending, done = iter(jobs), {}, 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # At most two images per worker are held in memory, so huge scans stream through
+            while len(pending) < workers * 2:
+                job = next(todo, None)
+                if job is None:
+                    break
+                image, dct, mode, size, new_size = job
+                # pikepdf objects stay on this thread: the workers get plain bytes
+                data = image.read_raw_bytes() if dct else image.read_bytes()
+                if not dct and len(data) != size[0] * size[1] * len(mode):
+                    stats["skipped"] += 1
+                    done += 1
+                    continue
+                pending[pool.submit(_resample, data, dct, mode, size, new_size, quality)] = (image, dct, new_size)
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                image, dct, new_size = pending.pop(fut)
+                old = len(image.read_raw_bytes())
+                try:
+                    data = fut.result()
+                except Exception:
+                    data = None  # damaged stream: leave the image as it is
+                if data is None or len(data) >= old:
+                    stats["skipped"] += 1
+                else:
+                    image.write(data, filter=pikepdf.Name.DCTDecode if dct else pikepdf.Name.FlateDecode)
+                    if "/DecodeParms" in image:
+                        del image.DecodeParms
+                    image.Width, image.Height = new_size
+                    stats["resampled"] += 1
+                    stats["bytes_before"] += old
+                    stats["bytes_after"] += len(data)
+                done += 1
+                if progress:
+                    progress(done, len(jobs))
+    return stats
+
+def optimize_pdf(src, output, target_dpi=150, quality=75, workers=None, progress=None):
+    """optimize_images on a file, written to output through a temp file; returns the stats plus sizes and time."""
+    start = time.perf_counter()
+    tmp = pdf_temp_path(output)
+    try:
+        with pikepdf.open(src) as pdf:
+            stats = optimize_images(pdf, target_dpi, quality, workers, progress)
+            pdf.save(tmp)
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    stats.update(in_bytes=os.path.getsize(src), out_bytes=os.path.getsize(output),
+                 seconds=time.perf_counter() - start)
+    return stats
@@ -1,13 +1,100 @@
 import sys
 import os
+import multiprocessing
 from PyQt5 import QtWidgets, QtCore
-from PyPDF2 import PdfReader, PdfWriter
+import pdf_core
+from pdf_core import (PdfSplitEngine, open_pdf, parse_page_groups, every_n_groups, bookmark_groups,
+                      split_output_path, probe_pdf)
+from pdf_jobs import PdfJobWorker
+
+SPLIT_MODES = [
+    # (combo text, label, placeholder)
+    ("One file: pages to keep", "Pages to keep (e.g. 1,3,5-7):", "e.g. 2-4 or 1,5,7-8"),
+    ("One file per range", "Ranges (one file each):", "e.g. 1-10;11-25;26-"),
+    ("Every N pages", "Pages per file:", "e.g. 10"),
+    ("One file per bookmark", "Top-level bookmarks:", "no input needed"),
+]
+
+class ProbeWorker(QtCore.QThread):
+    # Reads the page count off the UI thread; a damaged file falls back to a full parse, which can take a while
+    finished_signal = QtCore.pyqtSignal(str, object, str)
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def run(self):
+        try:
+            self.finished_signal.emit(self.path, probe_pdf(self.path), "")
+        except Exception as e:
+            self.finished_signal.emit(self.path, None, str(e))
+
+class SplitWorker(PdfJobWorker):
+    def __init__(self, src, mode, spec, output, page_count, pages=None, compact=False, linearize=False):
+        super().__init__(PdfSplitEngine(compact=compact, linearize=linearize))
+        self.src = src
+        self.mode = mode
+        self.spec = spec
+        self.output = output
+        self.page_count = page_count
+        self.pages = pages
+        self.job_list = []
+        self.reader = None
+        self.written = 0
+        self.errors = []
+
+    def jobs(self):
+        # (0-based pages, output path) per file to write
+        if self.mode == 0:
+            return [(self.pages, self.output)]
+        if self.mode == 1:
+            groups = parse_page_groups(self.spec, self.page_count)
+            return [(g, split_output_path(self.output, i + 1)) for i, g in enumerate(groups)]
+        if self.mode == 2:
+            groups = every_n_groups(self.page_count, int(self.spec))
+            return [(g, split_output_path(self.output, i + 1)) for i, g in enumerate(groups)]
+        # Kept for the engine, so the bookmarks and the pages come from one parse
+        self.reader = open_pdf(self.src)
+        groups = bookmark_groups(self.reader)
+        return [(g, split_output_path(self.output, i + 1, title)) for i, (title, g) in enumerate(groups)]
+
+    def results(self):
+        try:
+            jobs = self.jobs()
+        except Exception as e:
+            raise ValueError(f"Failed to split: {e}") from e
+        if not jobs:
+            raise ValueError("No valid pages in the given ranges." if self.mode != 3
+                             else "This PDF has no bookmarks.")
+        self.job_list = jobs
+        self.total = sum(len(pages) for pages, _ in jobs)
+        for result in self.engine.run(self.src, jobs, progress=self.advance, reader=self.reader):
+            if result["ok"]:
+                self.written += result["pages"]
+            elif not self.cancelled:
+                self.errors.append(f"{os.path.basename(result['out'])}: {result['error']}")
+            yield result
+
+    def summary(self):
+        jobs, errors, pages = self.job_list, self.errors, self.written
+        if self.cancelled:
+            return False, f"Split cancelled; {pages} pages were written before stopping."
+        if len(jobs) == 1 and not errors:
+            msg = f"Split and saved:\n{self.output}"
+        else:
+            msg = f"Wrote {len(jobs) - len(errors)} of {len(jobs)} files, starting with:\n{jobs[0][1]}"
+        msg += f"\n{pages} pages in {self.seconds:.1f}s ({pages / max(self.seconds, 1e-6):.0f} pages/s)."
+        if errors:
+            msg += "\n" + "\n".join(errors)
+        return not errors, msg
 
 class PDFSplitterUI(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Coke PDF Splitter")
         self.resize(800, 600)
+        self.worker = None
+        self.probes = []
         self.pdf_path = None
         self.total_pages = 0
 
@@ -79,9 +166,17 @@ class PDFSplitterUI(QtWidgets.QWidget):
 
         # Page selection row
         select_row = QtWidgets.QHBoxLayout()
-        select_label = QtWidgets.QLabel("Pages to keep (e.g. 1,3,5-7):")
-        select_label.setStyleSheet("font-size: 17px; color: #f8f8f2;")
-        select_row.addWidget(select_label)
+        self.mode_combo = QtWidgets.QComboBox()
+        self.mode_combo.addItems([m[0] for m in SPLIT_MODES])
+        self.mode_combo.setStyleSheet("""
+            QComboBox { background: #282a36; color: #b4aaff; font-size: 16px; border-radius: 7px; padding: 4px 10px; }
+            QComboBox QAbstractItemView { background: #282a36; color: #b4aaff; }
+        """)
+        self.mode_combo.currentIndexChanged.connect(self.on_mode_changed)
+        select_row.addWidget(self.mode_combo)
+        self.select_label = QtWidgets.QLabel("Pages to keep (e.g. 1,3,5-7):")
+        self.select_label.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        select_row.addWidget(self.select_label)
         self.page_input = QtWidgets.QLineEdit()
         self.page_input.setStyleSheet("background: #181a20; color: #b4aaff; font-size: 17px; border-radius: 7px; border: 1.5px solid #bd93f9; padding-left: 10px;")
         self.page_input.setPlaceholderText("e.g. 2-4 or 1,5,7-8")
@@ -102,12 +197,36 @@ class PDFSplitterUI(QtWidgets.QWidget):
         output_row.addWidget(browse_btn)
         layout.addLayout(output_row)
 
+        # Output options
+        options_row = QtWidgets.QHBoxLayout()
+        self.compact_check = QtWidgets.QCheckBox("Compact output (object streams)")
+        self.compact_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        options_row.addWidget(self.compact_check)
+        self.linearize_check = QtWidgets.QCheckBox("Fast web view (linearized)")
+        self.linearize_check.setStyleSheet("font-size: 17px; color: #f8f8f2;")
+        if pdf_core.pikepdf is None:
+            self.linearize_check.setEnabled(False)
+            self.linearize_check.setToolTip("Install pikepdf to enable fast web view (pip install pikepdf).")
+        options_row.addWidget(self.linearize_check)
+        options_row.addStretch(1)
+        layout.addLayout(options_row)
+
         # Split button
-        split_btn = QtWidgets.QPushButton("Split PDF")
-        split_btn.setStyleSheet(button_style2)
-        split_btn.setFixedHeight(52)
-        split_btn.clicked.connect(self.split_pdf)
-        layout.addWidget(split_btn)
+        self.split_btn = QtWidgets.QPushButton("Split PDF")
+        self.split_btn.setStyleSheet(button_style2)
+        self.split_btn.setFixedHeight(52)
+        self.split_btn.clicked.connect(self.split_pdf)
+        layout.addWidget(self.split_btn)
+
+        self.progress = QtWidgets.QProgressBar(self)
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        self.progress.setFixedHeight(25)
+        self.progress.setStyleSheet("""
+            QProgressBar { background: #23272f; border: 1px solid #44475a; border-radius: 8px; color: #d6bfff; font-size: 15px; }
+            QProgressBar::chunk { background: #bd93f9; border-radius: 8px; }
+        """)
+        layout.addWidget(self.progress)
 
         # Status label
         self.status = QtWidgets.QLabel("")
@@ -125,21 +244,34 @@ class PDFSplitterUI(QtWidgets.QWidget):
         if path:
             self.pdf_path = path
             self.file_label.setText(os.path.basename(path))
-            try:
-                with open(path, 'rb') as f:
-                    pdf = PdfReader(f)
-                    self.total_pages = len(pdf.pages)
-                self.pages_info.setText(f"Total pages: {self.total_pages}")
-            except Exception as e:
-                self.status.setText(f"Failed to open PDF: {e}")
-                self.total_pages = 0
-                self.pages_info.setText("")
+            self.total_pages = 0
+            self.pages_info.setText("Reading page count...")
+            self.status.setText("")
+            probe = ProbeWorker(path)
+            probe.finished_signal.connect(self.on_probe_finished)
+            self.probes = [p for p in self.probes if p.isRunning()] + [probe]
+            probe.start()
         else:
             self.pdf_path = None
             self.file_label.setText("No PDF selected")
             self.total_pages = 0
             self.pages_info.setText("")
 
+    def on_probe_finished(self, path, info, error):
+        if path != self.pdf_path:
+            return  # another file was picked while this one was being read
+        if info is None:
+            self.status.setText(f"Failed to open PDF: {error}")
+            self.pages_info.setText("")
+            return
+        self.total_pages = info["pages"]
+        text = f"Total pages: {self.total_pages}  ·  PDF {info['version']}"
+        if info["title"]:
+            text += f"  ·  {info['title']}"
+        if info["encrypted"]:
+            text += "  ·  encrypted"
+        self.pages_info.setText(text)
+
     def select_output_path(self):
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(
             self, "Save split PDF as...", "split.pdf", "PDF Files (*.pdf)"
@@ -166,8 +298,24 @@ class PDFSplitterUI(QtWidgets.QWidget):
         except Exception:
             return []
 
+    def on_mode_changed(self, index):
+        _, label, placeholder = SPLIT_MODES[index]
+        self.select_label.setText(label)
+        self.page_input.setPlaceholderText(placeholder)
+        self.page_input.setEnabled(index != 3)
+        self.status.setText("")
+
     def split_pdf(self):
+        if self.worker and self.worker.isRunning():
+            # The button reads "Cancel" while a split runs
+            self.worker.stop()
+            self.split_btn.setEnabled(False)
+            self.status.setText("Cancelling...")
+            return
         self.status.setText("")
+        if self.pdf_path and any(p.isRunning() and p.path == self.pdf_path for p in self.probes):
+            self.status.setText("Still reading the PDF, try again in a moment.")
+            return
         if not self.pdf_path or self.total_pages == 0:
             self.status.setText("Please select a valid PDF.")
             return
@@ -175,32 +323,61 @@ class PDFSplitterUI(QtWidgets.QWidget):
         if not output:
             self.status.setText("Please select output file.")
             return
+        mode = self.mode_combo.currentIndex()
         page_str = self.page_input.text().strip()
-        if not page_str:
-            self.status.setText("Please enter pages to keep (e.g. 2-5 or 1,3,8-12).")
-            return
-        pages = self.parse_pages(page_str)
-        if not pages:
-            self.status.setText("Invalid page input.")
-            return
-        # Ensure all in range
-        valid = [p for p in pages if 1 <= p <= self.total_pages]
-        if not valid:
-            self.status.setText("No valid pages in the given range.")
+        valid = None
+        if mode == 0:
+            if not page_str:
+                self.status.setText("Please enter pages to keep (e.g. 2-5 or 1,3,8-12).")
+                return
+            pages = self.parse_pages(page_str)
+            if not pages:
+                self.status.setText("Invalid page input.")
+                return
+            # Ensure all in range
+            valid = [p - 1 for p in pages if 1 <= p <= self.total_pages]
+            if not valid:
+                self.status.setText("No valid pages in the given range.")
+                return
+        elif mode == 1:
+            try:
+                if not page_str or not parse_page_groups(page_str, self.total_pages):
+                    self.status.setText("Please enter ranges within the document (e.g. 1-10;11-25;26-).")
+                    return
+            except ValueError:
+                self.status.setText("Invalid page input.")
+                return
+        elif mode == 2 and (not page_str.isdigit() or int(page_str) < 1):
+            self.status.setText("Please enter how many pages go in each file.")
             return
-        try:
-            with open(self.pdf_path, 'rb') as f:
-                pdf = PdfReader(f)
-                writer = PdfWriter()
-                for p in valid:
-                    writer.add_page(pdf.pages[p-1])
-                with open(output, 'wb') as out:
-                    writer.write(out)
-            self.status.setText(f"Split and saved:\n{output}")
-        except Exception as e:
-            self.status.setText(f"Failed to split: {e}")
+        self.progress.setValue(0)
+        self.split_btn.setText("Cancel")
+        self.status.setText("Splitting...")
+        self.worker = SplitWorker(self.pdf_path, mode, page_str, output, self.total_pages, valid,
+                                  self.compact_check.isChecked(), self.linearize_check.isChecked())
+        self.worker.progress_signal.connect(self.on_progress)
+        self.worker.finished_signal.connect(self.on_split_finished)
+        self.worker.start()
+
+    def on_progress(self, done, total):
+        if total:
+            self.progress.setValue(min(100, int(done / total * 100)))
+
+    def on_split_finished(self, ok, msg):
+        self.split_btn.setText("Split PDF")
+        self.split_btn.setEnabled(True)
+        self.status.setText(msg)
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        for probe in self.probes:
+            probe.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QtWidgets.QApplication(sys.argv)
     win = PDFSplitterUI()
     win.show()